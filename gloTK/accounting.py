@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""title: accounting.py
+authr: darrin schultz
+
+This module:
+  - keeps a record of what every Meraculous assembly and wrapped command
+    cost: wall time, user and system CPU time, peak memory and exit status
+  - stores the records in gloTK_info/resource_usage.yaml of the project or
+    sweep, so that --simultaneous and --maxProcs can be tuned from how the
+    last runs actually used the machine
+  - summarizes the records, for example how much of the processor time that
+    the runs were given they really used
+"""
+
+import fcntl
+import os
+import sys
+import threading
+import time
+
+import yaml
+
+#the store that wrappers write to when they aren't given one
+_defaultStore = None
+
+def set_default_store(store):
+    """sets the UsageStore that wrappers.BaseWrapper records to by default"""
+    global _defaultStore
+    _defaultStore = store
+
+def default_store():
+    return _defaultStore
+
+def rusage_record(rusage, wallTime, returncode, peakRss=None):
+    """Returns a dict of the resource usage from os.wait4. The peak memory is
+    ru_maxrss, which is the largest single process, unless the peak of the
+    whole process tree (peakRss, in bytes) is known. The CPU times and peak
+    memory are None if there is no rusage, like for a batch queue job."""
+    if rusage is None:
+        return {"wall_s": round(float(wallTime), 3),
+                "user_s": None, "sys_s": None,
+                "peak_rss_gb": round(peakRss / 1024**3, 4) if peakRss else None,
+                "returncode": int(returncode)}
+    #ru_maxrss is in KB on linux but in bytes on macOS
+    maxrss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return {"wall_s": round(float(wallTime), 3),
+            "user_s": round(float(rusage.ru_utime), 3),
+            "sys_s": round(float(rusage.ru_stime), 3),
+            "peak_rss_gb": round(max(maxrss, peakRss or 0) / 1024**3, 4),
+            "returncode": int(returncode)}
+
+class UsageStore:
+    """
+    This class keeps the resource usage records of a project.
+
+    Useage example:
+    store = UsageStore("gloTK_info/resource_usage.yaml")
+    start = time.time()
+    ...run something and get its rusage with os.wait4...
+    store.record("meraculous", runName, rusage_record(rusage,
+                 time.time() - start, returncode), procs=8)
+    print(store.summary())
+
+    The yaml file is a list of records, each with the kind and name of what
+    ran, when it started, the numbers from rusage_record() and anything else
+    passed to record(). Records can be added from several threads and
+    processes at once, since the file is locked and re-read before every
+    change.
+    """
+    def __init__(self, storePath):
+        self.storePath = storePath
+        self.records = []
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.storePath):
+            with open(self.storePath) as f:
+                self.records = yaml.safe_load(f) or []
+
+    def record(self, kind, name, usage, **info):
+        """adds a record and saves the store"""
+        record = {"kind": kind, "name": name,
+                  "finished": time.strftime("%Y-%m-%d %H:%M:%S")}
+        record.update(usage)
+        record.update(info)
+        with self._lock:
+            with open(self.storePath + ".lock", "w") as lockFile:
+                fcntl.flock(lockFile, fcntl.LOCK_EX)
+                self.load()
+                self.records.append(record)
+                self.save()
+        return record
+
+    def save(self):
+        """writes the store, replacing the old file only once it is complete"""
+        tmpPath = "{}.tmp{}".format(self.storePath, os.getpid())
+        with open(tmpPath, "w") as f:
+            f.write(yaml.safe_dump(self.records, default_flow_style=False))
+        os.replace(tmpPath, self.storePath)
+
+    def summary(self, kind=None):
+        """Returns a dict of totals for the records of one kind, or all of
+        them. cpu_efficiency is the CPU time used over the processor time
+        the runs were given (wall time times procs), for the records that
+        know their procs and CPU time."""
+        records = [x for x in self.records if kind in (None, x["kind"])]
+        #batch queue jobs have no CPU time or peak memory
+        cpu = sum((x["user_s"] or 0) + (x["sys_s"] or 0) for x in records)
+        given = [x for x in records
+                 if x.get("procs") and (x["user_s"] is not None)]
+        givenTime = sum(x["wall_s"] * x["procs"] for x in given)
+        return {"runs": len(records),
+                "failed": len([x for x in records if x["returncode"] != 0]),
+                "wall_hours": sum(x["wall_s"] for x in records) / 3600,
+                "cpu_hours": cpu / 3600,
+                "cpu_efficiency": (sum(x["user_s"] + x["sys_s"] for x in given)
+                                   / givenTime) if givenTime else None,
+                "max_peak_rss_gb": max([x["peak_rss_gb"] or 0 for x in records] or [0])}
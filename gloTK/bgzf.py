@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: bgzf.py
+authr: darrin schultz
+
+This module:
+  - writes BGZF, the blocked gzip format from samtools/htslib. A BGZF file is
+    a series of gzip members that each hold at most 64 KB of data and record
+    their own compressed size in a 'BC' extra field. It is still a valid
+    gzip file, so Meraculous and everything else can read it as usual.
+  - compresses and decompresses the blocks in a pool of threads (zlib
+    releases the GIL). Since the size of every block is in its header, a
+    reader can find the block boundaries without decompressing anything, so
+    a BGZF file can be decompressed in parallel and read from any block.
+  - recompresses read files to BGZF, for example after importing them into
+    a project
+
+fastq.line_chunks reads BGZF files with read_blocks(), so every gloTK pass
+over a BGZF read file decompresses it in parallel.
+"""
+
+import gzip
+import os
+import struct
+import zlib
+from multiprocessing.pool import ThreadPool
+
+from gloTK import utils
+
+#the most data in one block. htslib uses this so the compressed block always
+# fits in 64 KB.
+BLOCK_DATA_SIZE = 65280
+
+#the number of blocks compressed or decompressed in one task
+BLOCKS_PER_TASK = 64
+
+#the header of a block, up to the BSIZE field
+HEADER = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+
+#the empty block that marks the end of a BGZF file
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+def compress_block(data, compresslevel=6):
+    """returns one BGZF block holding at most BLOCK_DATA_SIZE bytes of data"""
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    size = len(HEADER) + 2 + len(compressed) + 8
+    return b"".join([HEADER, struct.pack("<H", size - 1), compressed,
+                     struct.pack("<II", zlib.crc32(data), len(data))])
+
+def compress(data, compresslevel=6):
+    """returns data as a series of BGZF blocks, without the EOF block"""
+    data = memoryview(data)
+    return b"".join([compress_block(data[i:i + BLOCK_DATA_SIZE], compresslevel)
+                     for i in range(0, len(data), BLOCK_DATA_SIZE)])
+
+def block_size(data, pos):
+    """returns the size of the BGZF block starting at data[pos], or None if
+    the header isn't all there yet. Raises an error if it isn't BGZF."""
+    if len(data) - pos < 18:
+        return None
+    if data[pos:pos + 4] != b"\x1f\x8b\x08\x04":
+        raise ValueError("ERROR: this is not a BGZF block")
+    xlen = struct.unpack_from("<H", data, pos + 10)[0]
+    if len(data) - pos < 12 + xlen:
+        return None
+    extra = pos + 12
+    while extra < pos + 12 + xlen:
+        subfield, length = struct.unpack_from("<2sH", data, extra)
+        if subfield == b"BC":
+            return struct.unpack_from("<H", data, extra + 4)[0] + 1
+        extra += 4 + length
+    raise ValueError("ERROR: this gzip member has no BGZF block size")
+
+def decompress_blocks(data):
+    """decompresses a bytes object of whole BGZF blocks, checking the CRC of
+    each"""
+    out = []
+    pos = 0
+    while pos < len(data):
+        size = block_size(data, pos)
+        xlen = struct.unpack_from("<H", data, pos + 10)[0]
+        block = zlib.decompress(data[pos + 12 + xlen:pos + size - 8], -15)
+        crc, length = struct.unpack_from("<II", data, pos + size - 8)
+        if (zlib.crc32(block) != crc) or (len(block) != length):
+            raise ValueError("ERROR: a BGZF block failed its CRC check")
+        out.append(block)
+        pos += size
+    return b"".join(out)
+
+def is_bgzf(path):
+    """returns True if the file starts with a BGZF block"""
+    with open(path, "rb") as handle:
+        head = handle.read(1024)
+    try:
+        return block_size(head, 0) is not None
+    except (ValueError, struct.error):
+        return False
+
+def task_splits(path):
+    """yields the compressed data of a BGZF file in runs of whole blocks,
+    using only the block headers"""
+    readSize = BLOCKS_PER_TASK * 65536
+    with open(path, "rb") as handle:
+        data = b""
+        while True:
+            new = handle.read(readSize)
+            data = data + new
+            pos = 0
+            while True:
+                size = block_size(data, pos)
+                if (size is None) or (pos + size > len(data)):
+                    break
+                pos += size
+            if pos:
+                yield data[:pos]
+                data = data[pos:]
+            if not new:
+                if data:
+                    raise ValueError("""ERROR: {} ends in the middle of a BGZF
+                    block. Is the file truncated?""".format(path))
+                break
+
+def read_blocks(path, threads=4):
+    """yields the decompressed data of a BGZF file in order, decompressing
+    runs of blocks in a pool of threads"""
+    with ThreadPool(threads) as pool:
+        for data in utils.bounded_imap(pool, decompress_blocks,
+                                       task_splits(path), 2 * threads):
+            yield data
+
+def write_blocks(chunks, outPath, threads=4, compresslevel=6):
+    """compresses an iterable of bytes objects to a BGZF file in a pool of
+    threads, and adds the EOF block"""
+    with open(outPath, "wb") as out, ThreadPool(threads) as pool:
+        for data in utils.bounded_imap(pool, lambda x: compress(x, compresslevel),
+                                       chunks, 2 * threads):
+            out.write(data)
+        out.write(EOF_BLOCK)
+
+def recompress(inPath, outPath=None, threads=4, compresslevel=6):
+    """Rewrites a gzipped or plain file as BGZF. If outPath is not given, the
+    file is replaced, and a symlink is replaced by a real file so the original
+    file is left alone. The new file is written next to the old one and only
+    renamed once it is complete."""
+    outPath = outPath or inPath
+    partPath = outPath + ".part"
+    def chunks():
+        opener = gzip.open if inPath.endswith(".gz") else open
+        with opener(inPath, "rb") as handle:
+            while True:
+                data = handle.read(BLOCKS_PER_TASK * BLOCK_DATA_SIZE)
+                if not data:
+                    break
+                yield data
+    write_blocks(chunks(), partPath, threads, compresslevel)
+    os.replace(partPath, outPath)
+    return outPath
+
+def recompress_config(config, threads=4, compresslevel=6, finished=None):
+    """recompresses every read file of a ConfigParse object to BGZF in place,
+    skipping the files that already are. finished is called with the path of
+    each file as soon as it is recompressed. Returns the list of files that
+    were recompressed."""
+    done = []
+    for lib_seq in config.params["lib_seq"]:
+        for pair in lib_seq["pairs"]:
+            for path in pair:
+                if path.endswith(".gz") and not is_bgzf(path):
+                    recompress(path, threads=threads, compresslevel=compresslevel)
+                    done.append(path)
+                    if finished:
+                        finished(path)
+    return done
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: contaminants.py
+authr: darrin schultz
+
+This module:
+  - builds a k-mer Bloom filter from a fasta file of contaminant sequences
+    (PhiX, adapters, E. coli, etc.). The filter only has to be built once and
+    can be saved next to the fasta file.
+  - screens read pairs against the filter in the ReadPipeline worker
+    processes, and either drops or tags the pairs that match
+  - reports the fraction of contaminated pairs for each library
+
+A read matches if at least minFraction of its k-mers are in the filter.
+Requiring a fraction of the k-mers, rather than a single k-mer, keeps the
+false positives of the Bloom filter from flagging clean reads.
+"""
+
+import math
+
+import numpy as np
+
+from gloTK import fastq
+from gloTK.dedup import mix64
+from gloTK.diginorm import kmer_codes
+from gloTK.readprep import PrepRunner, prep_config
+
+#contaminant sequences are split into windows of this many bases to keep the
+# k-mer matrices small
+WINDOW_SIZE = 100000
+
+def read_fasta(path):
+    """yields the (name, sequence) of each record in a fasta file as bytes"""
+    name = None
+    seq = []
+    with fastq.fastq_open(path) as handle:
+        for line in handle:
+            line = line.strip()
+            if line.startswith(b">"):
+                if name is not None:
+                    yield (name, b"".join(seq))
+                name = line[1:]
+                seq = []
+            elif line:
+                seq.append(line)
+    if name is not None:
+        yield (name, b"".join(seq))
+
+def sequence_blocks(sequence, k):
+    """yields one-read fastq.ReadBlocks that cover a long sequence in windows
+    overlapping by k - 1 bases, so every k-mer is in one window"""
+    for start in range(0, max(len(sequence) - k + 1, 1), WINDOW_SIZE - k + 1):
+        window = sequence[start:start + WINDOW_SIZE].upper()
+        seq = np.frombuffer(window, dtype=np.uint8)[None, :]
+        yield fastq.ReadBlock([b""], seq, np.zeros_like(seq),
+                              np.array([len(window)], dtype=np.int64))
+
+class BloomFilter:
+    """This class is a Bloom filter of canonical k-mers (see
+    diginorm.kmer_codes) stored as a numpy bit array. The numHashes positions
+    for a k-mer come from two 64-bit hashes with double hashing.
+
+    Useage example:
+    bloom = BloomFilter.from_fasta("contaminants.fa", ksize=31)
+    bloom.save("contaminants.bloom.npz")
+    bloom = BloomFilter.load("contaminants.bloom.npz")
+    """
+    def __init__(self, numBits, numHashes, ksize=31):
+        self.numBits = int(numBits)
+        self.numHashes = int(numHashes)
+        self.ksize = ksize
+        self.bits = np.zeros((self.numBits + 7) // 8, dtype=np.uint8)
+
+    @classmethod
+    def for_capacity(cls, numItems, fpRate=0.001, ksize=31):
+        """makes an empty filter with the optimal size for numItems k-mers and
+        a false positive rate of fpRate"""
+        numItems = max(int(numItems), 1)
+        numBits = math.ceil(-numItems * math.log(fpRate) / math.log(2) ** 2)
+        numHashes = max(1, round(numBits / numItems * math.log(2)))
+        return cls(numBits, numHashes, ksize)
+
+    @classmethod
+    def from_fasta(cls, path, ksize=31, fpRate=0.001):
+        """builds a filter of every k-mer in a (optionally gzipped) fasta
+        file. The number of bases is used as the number of k-mers."""
+        records = list(read_fasta(path))
+        if not records:
+            raise ValueError("""ERROR: there are no sequences in the contaminant
+            fasta file {}""".format(path))
+        bloom = cls.for_capacity(sum(len(seq) for name, seq in records),
+                                 fpRate, ksize)
+        for name, seq in records:
+            for block in sequence_blocks(seq, ksize):
+                kmers, valid = kmer_codes(block, ksize)
+                bloom.add(kmers[valid])
+        return bloom
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        bloom = cls(int(data["numBits"]), int(data["numHashes"]),
+                    int(data["ksize"]))
+        bloom.bits = data["bits"]
+        return bloom
+
+    def save(self, path):
+        np.savez(path, bits=self.bits, numBits=self.numBits,
+                 numHashes=self.numHashes, ksize=self.ksize)
+
+    def positions(self, kmers):
+        """yields the bit position of the k-mers for every hash function"""
+        first = mix64(kmers)
+        second = mix64(kmers ^ np.uint64(0x9e3779b97f4a7c15)) | np.uint64(1)
+        for i in range(self.numHashes):
+            yield (first + np.uint64(i) * second) % np.uint64(self.numBits)
+
+    def add(self, kmers):
+        """adds an array of k-mers to the filter"""
+        for pos in self.positions(kmers):
+            np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.int64),
+                             (1 << (pos & np.uint64(7))).astype(np.uint8))
+
+    def contains(self, kmers):
+        """returns a boolean array, the same shape as kmers, of whether each
+        k-mer is (probably) in the filter"""
+        found = np.ones(kmers.shape, dtype=bool)
+        for pos in self.positions(kmers):
+            byte = self.bits[(pos >> np.uint64(3)).astype(np.int64)]
+            found &= ((byte >> (pos & np.uint64(7)).astype(np.uint8)) & 1).astype(bool)
+        return found
+
+def contaminant_fractions(bloom, block):
+    """returns the fraction of the valid k-mers in each read of a ReadBlock
+    that are in the filter"""
+    kmers, valid = kmer_codes(block, bloom.ksize)
+    hits = (bloom.contains(kmers) & valid).sum(axis=1)
+    return hits / np.maximum(valid.sum(axis=1), 1)
+
+class ContaminantFilter:
+    """This stage drops pairs in which either mate matches the contaminant
+    filter. If tag is True the pairs are kept instead, and " contaminant" is
+    added to the end of both of their names."""
+    def __init__(self, bloom, minFraction=0.5, tag=False):
+        self.bloom = bloom
+        self.minFraction = minFraction
+        self.tag = tag
+
+    def __call__(self, pair):
+        matched = (contaminant_fractions(self.bloom, pair.forward) >= self.minFraction) | \
+                  (contaminant_fractions(self.bloom, pair.reverse) >= self.minFraction)
+        pair.count("contaminantPairs", np.sum(matched))
+        if self.tag:
+            for block in [pair.forward, pair.reverse]:
+                for i in np.flatnonzero(matched):
+                    block.names[i] = block.names[i] + b" contaminant"
+        else:
+            pair.keep(~matched)
+
+class ContaminantScreen(PrepRunner):
+    """
+    usage: ContaminantScreen(required_args, other_args)
+
+    Screens one pair of read files for contaminants. The screen runs as soon
+    as the class is instantiated.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      forwardOutFile <first read output fastq filename>
+      reverseOutFile <second read output fastq filename>
+      outDir         <directory where files will be saved>
+      bloom          <a BloomFilter, or the path to a contaminant fasta file
+                       or a saved BloomFilter (.npz)>
+
+    Optional Arguments:
+      ksize          <k-mer size when building from fasta; default = 31>
+      fpRate         <false positive rate when building from fasta;
+                       default = 0.001>
+      minFraction    <fraction of a read's k-mers that must be in the filter
+                       for it to match; default = 0.5>
+      tag            <keep and tag matching pairs instead of dropping them;
+                       default = False>
+      procs          <number of worker processes; default = 1>
+      batchSize      <number of read pairs given to a worker at once;
+                       default = 20000>
+
+    The fraction of contaminated pairs is saved in
+    outDir/glotk_contaminants.log and in the contaminantFraction attribute.
+    """
+    def __init__(self, **kwargs):
+        self.init("glotk_contaminants", **kwargs)
+        self.bloom = load_bloom(kwargs["bloom"], kwargs.get("ksize", 31),
+                                kwargs.get("fpRate", 0.001))
+        self.stages.append(ContaminantFilter(self.bloom,
+                                             kwargs.get("minFraction", 0.5),
+                                             kwargs.get("tag", False)))
+        self.contaminantFraction = None
+        self.run()
+
+    def report(self):
+        pairsIn = self.stats.get("pairsIn", 0)
+        self.contaminantFraction = self.stats.get("contaminantPairs", 0) / pairsIn \
+            if pairsIn else 0.0
+        return {"contaminantFraction": "{:.6f}".format(self.contaminantFraction)}
+
+def load_bloom(bloom, ksize=31, fpRate=0.001):
+    """returns a BloomFilter from a BloomFilter, a saved filter or a fasta
+    file"""
+    if isinstance(bloom, BloomFilter):
+        return bloom
+    if bloom.endswith(".npz"):
+        return BloomFilter.load(bloom)
+    return BloomFilter.from_fasta(bloom, ksize, fpRate)
+
+def screen_config(config, bloom, newDir, yamlOut=None, **kwargs):
+    """Screens every read pair in a ConfigParse object for contaminants with
+    readprep.prep_config. The filter is only built once.
+
+    Returns (newConfig, fractions) where fractions is a dict of the fraction
+    of contaminated pairs in each library. Any keyword arguments are passed
+    on to ContaminantScreen.
+    """
+    bloom = load_bloom(bloom, kwargs.get("ksize", 31), kwargs.get("fpRate", 0.001))
+    def run_pair(lib_seq, **files):
+        files.update(kwargs)
+        return ContaminantScreen(bloom=bloom, **files)
+    newConfig, runs = prep_config(config, newDir, run_pair, yamlOut)
+    fractions = {}
+    for name in runs:
+        pairsIn = sum(run.stats.get("pairsIn", 0) for run in runs[name])
+        contaminated = sum(run.stats.get("contaminantPairs", 0) for run in runs[name])
+        fractions[name] = contaminated / pairsIn if pairsIn else 0.0
+    return newConfig, fractions
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: dedup.py
+authr: darrin schultz
+
+This module:
+  - removes exact duplicate read pairs (PCR duplicates) in one pass over the
+    reads. Each pair is hashed to a 64-bit fingerprint and only the first pair
+    with each fingerprint is kept.
+  - keeps the fingerprints in memory for small libraries. Once more than
+    maxPairs distinct pairs have been seen, the fingerprints seen so far are
+    saved to disk in partitions and the rest of the pairs are written to the
+    same partitions. At the end each partition is deduplicated on its own, so
+    only one partition has to fit in memory at a time and the input files are
+    still only read once.
+
+Pairs are only duplicates if both mates are identical. The read names and
+qualities are not part of the fingerprint.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+from gloTK import fastq
+from gloTK.readprep import PrepRunner
+
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+
+#the fingerprints are partitioned on their top bits when spilling to disk
+PARTITION_BITS = 6
+
+def mix64(h):
+    """the splitmix64 finalizer, so that similar reads get unrelated hashes"""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return h ^ (h >> np.uint64(31))
+
+def block_hashes(block):
+    """returns the 64-bit FNV-1a hash of the bases of every read in a
+    fastq.ReadBlock. The hash is built one column at a time for the whole
+    block, skipping the padding past the end of each read."""
+    n, width = block.seq.shape
+    h = np.full(n, FNV_OFFSET, dtype=np.uint64)
+    for col in range(width):
+        live = col < block.lengths
+        h = np.where(live, (h ^ block.seq[:, col]) * FNV_PRIME, h)
+    return mix64(h)
+
+def pair_fingerprints(pair):
+    """returns one 64-bit fingerprint for each read pair"""
+    return mix64(block_hashes(pair.forward) ^
+                 mix64(block_hashes(pair.reverse) + np.uint64(1)))
+
+def first_seen(fingerprints, seen):
+    """returns a boolean mask of the fingerprints not already in the set
+    `seen`, and adds them to it. Only the first copy of a fingerprint that
+    appears more than once in this batch is marked."""
+    keep = np.zeros(len(fingerprints), dtype=bool)
+    for i, fingerprint in enumerate(fingerprints.tolist()):
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            keep[i] = True
+    return keep
+
+class Deduplicator:
+    """This stage drops read pairs that are exact copies of an earlier pair.
+    It runs in the ReadPipeline parent process since it has to see every pair.
+    See the module docstring for how memory is bounded."""
+    parallel = False
+
+    def __init__(self, maxPairs=20000000, tmpDir=None):
+        self.maxPairs = maxPairs
+        self.tmpDir = tmpDir
+        self.seen = set()
+        self.spillDir = None
+        self.handles = {}
+
+    def __call__(self, pair):
+        fingerprints = pair_fingerprints(pair)
+        if self.spillDir:
+            self._spill(pair, fingerprints)
+            pair.keep(np.zeros(len(pair), dtype=bool))
+            return
+        keep = first_seen(fingerprints, self.seen)
+        pair.count("duplicatePairs", len(keep) - np.sum(keep))
+        pair.keep(keep)
+        if len(self.seen) > self.maxPairs:
+            self._start_spill()
+
+    def _partitions(self, fingerprints):
+        return (fingerprints >> np.uint64(64 - PARTITION_BITS)).astype(np.int64)
+
+    def _start_spill(self):
+        """saves the fingerprints seen so far to disk, one file per partition"""
+        self.spillDir = tempfile.mkdtemp(prefix="glotk_dedup_", dir=self.tmpDir)
+        seen = np.fromiter(self.seen, dtype=np.uint64, count=len(self.seen))
+        self.seen = set()
+        parts = self._partitions(seen)
+        for p in range(2 ** PARTITION_BITS):
+            np.save(os.path.join(self.spillDir, "seen_{}.npy".format(p)),
+                    seen[parts == p])
+
+    def _spill(self, pair, fingerprints):
+        """appends the pairs of a batch to their partition files"""
+        parts = self._partitions(fingerprints)
+        for p in np.unique(parts).tolist():
+            idx = np.flatnonzero(parts == p)
+            if p not in self.handles:
+                self.handles[p] = open(os.path.join(
+                    self.spillDir, "pairs_{}.pkl".format(p)), "wb")
+            sub = fastq.PairBlock(pair.forward.subset(idx),
+                                  pair.reverse.subset(idx))
+            pickle.dump((fingerprints[idx], sub), self.handles[p],
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    def flush(self):
+        """deduplicates the partitions one at a time and yields the pairs that
+        were held back"""
+        if not self.spillDir:
+            return
+        for handle in self.handles.values():
+            handle.close()
+        try:
+            for p in sorted(self.handles):
+                seen = set(np.load(os.path.join(
+                    self.spillDir, "seen_{}.npy".format(p))).tolist())
+                with open(os.path.join(self.spillDir,
+                                       "pairs_{}.pkl".format(p)), "rb") as f:
+                    while True:
+                        try:
+                            fingerprints, sub = pickle.load(f)
+                        except EOFError:
+                            break
+                        keep = first_seen(fingerprints, seen)
+                        sub.count("duplicatePairs", len(keep) - np.sum(keep))
+                        sub.keep(keep)
+                        yield sub
+        finally:
+            shutil.rmtree(self.spillDir)
+            self.spillDir = None
+            self.handles = {}
+
+class Dedup(PrepRunner):
+    """
+    usage: Dedup(required_args, other_args)
+
+    Removes exact duplicate read pairs from one pair of read files. The
+    deduplication runs as soon as the class is instantiated.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      forwardOutFile <first read output fastq filename>
+      reverseOutFile <second read output fastq filename>
+      outDir         <directory where files will be saved>
+
+    Optional Arguments:
+      maxPairs       <number of distinct pairs to keep in memory before
+                       spilling to disk; default = 20000000>
+      tmpDir         <directory for the spilled partitions; default = outDir>
+      procs          <number of worker processes; default = 1>
+      batchSize      <number of read pairs given to a worker at once;
+                       default = 20000>
+
+    The number of pairs read, the number of duplicates and the duplication
+    rate are saved in outDir/glotk_dedup.log. Pairs are written in their
+    original order unless the run spilled to disk, in which case the pairs
+    read after the spill are written at the end, grouped by partition.
+    """
+    def __init__(self, **kwargs):
+        self.init("glotk_dedup", **kwargs)
+        self.stages.append(Deduplicator(kwargs.get("maxPairs", 20000000),
+                                        kwargs.get("tmpDir", self.outDir)))
+        self.duplicationRate = None
+        self.run()
+
+    def report(self):
+        pairsIn = self.stats.get("pairsIn", 0)
+        self.duplicationRate = self.stats.get("duplicatePairs", 0) / pairsIn \
+            if pairsIn else 0.0
+        return {"duplicationRate": "{:.6f}".format(self.duplicationRate)}
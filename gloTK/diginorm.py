@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: diginorm.py
+authr: darrin schultz
+
+This module:
+  - does digital normalization (like khmer's normalize-by-median) to remove
+    redundant reads from high coverage libraries before assembly. A read pair
+    is kept only if the median abundance of the k-mers in one of its reads,
+    counted over the pairs kept so far, is below the cutoff C. Regions of the
+    genome that are already covered C times are skipped, and the k-mer counts
+    are held in a fixed size count-min sketch so memory doesn't grow with the
+    number of reads.
+  - writes a new read config pointing at the normalized reads so the reduced
+    read set can be assembled like any other
+
+The k-mers are canonical (the smaller of the k-mer and its reverse
+complement), so both strands of the genome count towards the same coverage.
+"""
+
+import numpy as np
+
+from gloTK.dedup import mix64
+from gloTK.readprep import PrepRunner, prep_config
+
+#2-bit codes for the bases. Anything else, including the zero padding at the
+# end of the rows of a ReadBlock, is 4 and ends every k-mer that contains it.
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _base, _code in zip(b"ACGTacgt", [0, 1, 2, 3, 0, 1, 2, 3]):
+    BASE_CODES[_base] = _code
+
+def kmer_codes(block, k):
+    """returns (kmers, valid) for a fastq.ReadBlock. kmers is a (reads x
+    starts) uint64 matrix of the canonical 2-bit encoded k-mer starting at
+    every position, and valid is False for k-mers that run past the end of
+    the read or contain a base that isn't ACGT."""
+    if not 0 < k <= 32:
+        raise ValueError("""ERROR: the k-mer size for digital normalization
+        must be between 1 and 32. It was {}""".format(k))
+    codes = BASE_CODES[block.seq]
+    n, width = codes.shape
+    starts = max(width - k + 1, 0)
+    forward = np.zeros((n, starts), dtype=np.uint64)
+    reverse = np.zeros((n, starts), dtype=np.uint64)
+    for j in range(k):
+        code = (codes[:, j:j + starts] & 3).astype(np.uint64)
+        forward = (forward << np.uint64(2)) | code
+        reverse = reverse | ((np.uint64(3) - code) << np.uint64(2 * j))
+    #count the bad bases in every window with a cumulative sum
+    bad = np.zeros((n, width + 1), dtype=np.int64)
+    np.cumsum(codes == 4, axis=1, out=bad[:, 1:])
+    valid = (bad[:, k:k + starts] - bad[:, :starts] == 0) & \
+            (np.arange(starts) + k <= block.lengths[:, None])
+    return np.minimum(forward, reverse), valid
+
+def sketch_columns(kmers, seed, width):
+    """returns the columns of the k-mers in the sketch row with this seed"""
+    return (mix64(kmers ^ seed) % np.uint64(width)).astype(np.int64)
+
+def column_counts(kmers, seeds, width):
+    """returns a list of (columns, counts) for each row of a sketch, which is
+    everything needed to add a flat array of k-mers to the sketch. This can be
+    done in a worker process that doesn't have the whole table."""
+    #unique first so that repeated k-mers are counted more than once
+    return [np.unique(sketch_columns(kmers, seed, width), return_counts=True)
+            for seed in seeds]
+
+class CountMinSketch:
+    """This class counts k-mers in a `depth` x `width` table of counters. Each
+    row hashes the k-mers with a different seed, and the estimated count of a
+    k-mer is its smallest counter, which can only overestimate the true
+    count."""
+    def __init__(self, width=2**22, depth=4):
+        self.width = int(width)
+        self.counts = np.zeros((depth, self.width), dtype=np.uint32)
+        self.seeds = mix64(np.arange(1, depth + 1, dtype=np.uint64) *
+                           np.uint64(0x9e3779b97f4a7c15))
+
+    def indices(self, kmers):
+        """yields the column of every k-mer in each row of the table"""
+        for row, seed in enumerate(self.seeds):
+            yield row, sketch_columns(kmers, seed, self.width)
+
+    def add(self, kmers):
+        """counts a flat array of k-mers"""
+        self.add_counts(column_counts(kmers, self.seeds, self.width))
+
+    def add_counts(self, columnCounts):
+        """adds the output of column_counts() to the table"""
+        for row, (cols, counts) in enumerate(columnCounts):
+            self.counts[row, cols] += counts.astype(np.uint32)
+
+    def query(self, kmers):
+        """returns the estimated count of every k-mer in an array of any shape"""
+        estimate = None
+        for row, cols in self.indices(kmers):
+            counts = self.counts[row, cols]
+            estimate = counts if estimate is None else np.minimum(estimate, counts)
+        return estimate
+
+def median_abundance(sketch, kmers, valid):
+    """returns the median estimated count of the valid k-mers in each row.
+    Like khmer, the upper median is used for an even number of k-mers. Reads
+    without any valid k-mers have a median of zero."""
+    n = len(kmers)
+    if kmers.shape[1] == 0:
+        return np.zeros(n, dtype=np.int64)
+    counts = np.where(valid, sketch.query(kmers), np.iinfo(np.uint32).max)
+    counts.sort(axis=1)
+    numValid = valid.sum(axis=1)
+    medians = counts[np.arange(n), np.minimum(numValid // 2, kmers.shape[1] - 1)]
+    return np.where(numValid > 0, medians, 0).astype(np.int64)
+
+class DigitalNormalizer:
+    """This stage keeps a read pair only if the median k-mer abundance of
+    either mate is below `cutoff`, then adds the k-mers of the kept pairs to
+    the sketch. It runs in the ReadPipeline parent process since every pair
+    depends on the pairs kept before it.
+
+    The pairs are tested `chunkSize` at a time. The pairs in a chunk are tested
+    against the sketch before any of them are counted, so a region can end up
+    with up to `chunkSize` more pairs than the cutoff allows. Smaller chunks
+    are closer to normalizing one pair at a time, but slower. Merged reads are
+    passed through untouched.
+    """
+    parallel = False
+
+    def __init__(self, cutoff=20, ksize=20, sketchWidth=2**22, sketchDepth=4,
+                 chunkSize=500):
+        self.cutoff = cutoff
+        self.ksize = ksize
+        self.chunkSize = chunkSize
+        self.sketch = CountMinSketch(sketchWidth, sketchDepth)
+
+    def __call__(self, pair):
+        forward = kmer_codes(pair.forward, self.ksize)
+        reverse = kmer_codes(pair.reverse, self.ksize)
+        keep = np.zeros(len(pair), dtype=bool)
+        for start in range(0, len(pair), self.chunkSize):
+            chunk = slice(start, start + self.chunkSize)
+            below = np.zeros(len(keep[chunk]), dtype=bool)
+            for kmers, valid in [forward, reverse]:
+                below |= median_abundance(self.sketch, kmers[chunk],
+                                          valid[chunk]) < self.cutoff
+            for kmers, valid in [forward, reverse]:
+                self.sketch.add(kmers[chunk][below][valid[chunk][below]])
+            keep[chunk] = below
+        pair.count("pairsNormalized", len(keep) - np.sum(keep))
+        pair.keep(keep)
+
+class Normalizer(PrepRunner):
+    """
+    usage: Normalizer(required_args, other_args)
+
+    Digitally normalizes one pair of read files. The normalization runs as
+    soon as the class is instantiated.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      forwardOutFile <first read output fastq filename>
+      reverseOutFile <second read output fastq filename>
+      outDir         <directory where files will be saved>
+
+    Optional Arguments:
+      cutoff         <keep pairs with a median k-mer abundance below this;
+                       default = 20>
+      ksize          <k-mer size, at most 32; default = 20>
+      sketchWidth    <number of counters in each row of the count-min sketch;
+                       default = 4194304>
+      sketchDepth    <number of rows in the count-min sketch; default = 4>
+      chunkSize      <number of pairs tested against the sketch at once;
+                       default = 500>
+      normalizer     <a DigitalNormalizer to use instead of making a new one,
+                       so that several files can share one sketch>
+      procs          <number of worker processes; default = 1>
+      batchSize      <number of read pairs given to a worker at once;
+                       default = 20000>
+
+    The sketch uses 4 * sketchWidth * sketchDepth bytes of memory. It should
+    have several times more counters per row than there are distinct k-mers in
+    the genome, or the counts will be overestimated and too many pairs will be
+    dropped. The fraction of pairs kept is saved in outDir/glotk_normalize.log.
+    """
+    def __init__(self, **kwargs):
+        self.init("glotk_normalize", **kwargs)
+        self.normalizer = kwargs.get("normalizer")
+        if self.normalizer is None:
+            self.normalizer = DigitalNormalizer(kwargs.get("cutoff", 20),
+                                                kwargs.get("ksize", 20),
+                                                kwargs.get("sketchWidth", 2**22),
+                                                kwargs.get("sketchDepth", 4),
+                                                kwargs.get("chunkSize", 500))
+        self.stages.append(self.normalizer)
+        self.keptFraction = None
+        self.run()
+
+    def report(self):
+        pairsIn = self.stats.get("pairsIn", 0)
+        self.keptFraction = self.stats.get("pairsOut", 0) / pairsIn \
+            if pairsIn else 0.0
+        return {"keptFraction": "{:.6f}".format(self.keptFraction)}
+
+def normalize_config(config, newDir, yamlOut=None, **kwargs):
+    """Normalizes every read pair in a ConfigParse object with
+    readprep.prep_config and returns the new ConfigParse object. All of the
+    files in one lib_seq share one sketch, since they are reads from the same
+    library.
+
+    Any keyword arguments are passed on to Normalizer.
+    """
+    normalizers = {}
+    def run_pair(lib_seq, **files):
+        if id(lib_seq) not in normalizers:
+            normalizers[id(lib_seq)] = DigitalNormalizer(
+                kwargs.get("cutoff", 20), kwargs.get("ksize", 20),
+                kwargs.get("sketchWidth", 2**22), kwargs.get("sketchDepth", 4),
+                kwargs.get("chunkSize", 500))
+        files.update(kwargs)
+        return Normalizer(normalizer=normalizers[id(lib_seq)], **files)
+    return prep_config(config, newDir, run_pair, yamlOut)[0]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""title: earlystop.py
+authr: darrin schultz
+
+This module:
+  - watches the assemblies of a sweep while they run and measures the N50 of
+    the UUtigs.fa that meraculous_contigs writes, which is the first stage
+    output that says how contiguous an assembly is going to be
+  - stops the runs whose UUtig N50 trails the best run of the sweep by more
+    than a margin, so that a bad k doesn't spend days in scaffolding and gap
+    closure. The scheduler gives the processors of a stopped run to the
+    runs that are still waiting.
+"""
+
+import os
+import threading
+
+from gloTK.merrunanalyzer import fasta_lengths, n50
+from gloTK.sweepstate import finished_stages
+
+#the stage whose output is compared, and the output file
+STAGE = "meraculous_contigs"
+STAGE_FILE = "UUtigs.fa"
+
+#the fewest measured runs before any run is stopped. With fewer runs there
+# isn't much of a best run to compare against.
+MIN_RUNS = 3
+
+def stage_n50(assemblyDir):
+    """returns the N50 of the UUtigs of an assembly, or None if
+    meraculous_contigs hasn't finished"""
+    path = os.path.join(assemblyDir, STAGE, STAGE_FILE)
+    if STAGE not in finished_stages(assemblyDir) or not os.path.exists(path):
+        return None
+    return n50(fasta_lengths(path))
+
+class RunWatcher:
+    """
+    This class stops the runs of a sweep that are doing much worse than the
+    others.
+
+    Useage example:
+    watcher = RunWatcher(margin=0.5)
+    watcher.add(runner)   #for every MerRunner of the sweep
+    watcher.start()
+    ...run the sweep...
+    watcher.stop()
+
+    Every `interval` seconds, the watcher measures the runs that have
+    finished meraculous_contigs and calls stop() on the running ones whose
+    UUtig N50 is less than (1 - margin) times the best N50 of all of the
+    measured runs, finished or not. Nothing is stopped until MIN_RUNS runs
+    were measured.
+    """
+    def __init__(self, margin, interval=60, minRuns=MIN_RUNS):
+        if not 0 < margin < 1:
+            raise ValueError("""ERROR: the early stopping margin must be
+            between 0 and 1, not {}.""".format(margin))
+        self.margin = margin
+        self.interval = interval
+        self.minRuns = minRuns
+        self.runners = {}
+        #runName: UUtig N50
+        self.scores = {}
+        #the names of the runs that were stopped
+        self.stopped = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+
+    def add(self, runner):
+        """watches a MerRunner"""
+        with self._lock:
+            self.runners[runner.runName] = runner
+
+    def check(self):
+        """measures the runs and stops the bad ones. Returns the names of the
+        runs that were stopped by this check."""
+        with self._lock:
+            for runName, runner in self.runners.items():
+                if runName not in self.scores:
+                    score = stage_n50(runner.thisAssemblyDir)
+                    if score is not None:
+                        self.scores[runName] = score
+            if len(self.scores) < self.minRuns:
+                return []
+            cutoff = (1 - self.margin) * max(self.scores.values())
+            stopped = []
+            for runName, score in self.scores.items():
+                runner = self.runners[runName]
+                if score < cutoff and runner.is_running() and \
+                   runName not in self.stopped:
+                    print("Stopping {}: its UUtig N50 of {} is less than {:.0f}.".format(
+                        runName, score, cutoff))
+                    runner.stop()
+                    stopped.append(runName)
+            self.stopped.extend(stopped)
+            return stopped
+
+    def _watch(self):
+        while not self._done.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """checks the runs every `interval` seconds in a background thread"""
+        self._done.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """stops the background checks"""
+        self._done.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: errcorrect.py
+authr: darrin schultz
+
+This module:
+  - corrects substitution errors in reads from the k-mer spectrum, in the
+    spirit of BFC. Every k-mer in the library is counted in a
+    diginorm.CountMinSketch first, and k-mers seen at least minCount times are
+    trusted (solid). Then each read is scanned for the first place where a
+    solid k-mer is followed by a weak one, and the base that the weak k-mer
+    adds is replaced by the base that makes the most of the k-mers covering
+    it solid.
+  - counts the k-mers and corrects the reads in a pool of worker processes.
+    The reads are read twice, once to count and once to correct.
+
+Fewer erroneous reads means fewer distinct k-mers for Meraculous to count and
+build contigs from, which saves memory and time in mercount and contigs.
+"""
+
+from multiprocessing import Pool
+
+import numpy as np
+
+from gloTK import fastq
+from gloTK import utils
+from gloTK.diginorm import CountMinSketch, column_counts, kmer_codes
+from gloTK.readprep import PrepRunner, prep_config
+
+BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+#The sketch parameters for the counting workers. This is set once per worker
+# by _init_counter().
+_counterArgs = None
+
+def _init_counter(ksize, seeds, width):
+    global _counterArgs
+    _counterArgs = (ksize, seeds, width)
+
+def _count_chunk(chunk):
+    """returns the sketch columns and counts for the k-mers of a raw batch"""
+    ksize, seeds, width = _counterArgs
+    pair = fastq.PairBlock.from_bytes(*chunk)
+    kmers = []
+    for block in [pair.forward, pair.reverse]:
+        blockKmers, valid = kmer_codes(block, ksize)
+        kmers.append(blockKmers[valid])
+    return column_counts(np.concatenate(kmers), seeds, width)
+
+def count_kmers(pairs, sketch, ksize=25, procs=1, batchSize=fastq.BATCH_SIZE):
+    """counts the k-mers of both mates of every (forwardPath, reversePath) in
+    `pairs` into a CountMinSketch"""
+    args = (ksize, sketch.seeds, sketch.width)
+    for forwardPath, reversePath in pairs:
+        chunks = fastq.paired_chunks(forwardPath, reversePath, batchSize)
+        if procs > 1:
+            with Pool(procs, _init_counter, args) as pool:
+                for counts in utils.bounded_imap(pool, _count_chunk, chunks,
+                                                 2 * procs):
+                    sketch.add_counts(counts)
+        else:
+            _init_counter(*args)
+            for chunk in chunks:
+                sketch.add_counts(_count_chunk(chunk))
+    return sketch
+
+def solid_kmers(sketch, block, k, minCount):
+    """returns (solid, valid) boolean matrices for the k-mers of a ReadBlock"""
+    kmers, valid = kmer_codes(block, k)
+    return valid & (sketch.query(kmers) >= minCount), valid
+
+def error_positions(solid, valid, k):
+    """Finds the next base to try to correct in each read. If the first k-mer
+    is weak and a later one is solid, it is the base just before the first
+    solid k-mer. Otherwise it is the last base of the first weak k-mer after a
+    solid one. Reads without any solid k-mers can't be anchored and are
+    skipped.
+
+    Returns (positions, found)."""
+    weak = valid & ~solid
+    hasSolid = solid.any(axis=1)
+    firstSolid = np.argmax(solid, axis=1)
+    left = hasSolid & weak[:, 0] & (firstSolid > 0)
+    transitions = solid[:, :-1] & weak[:, 1:]
+    right = transitions.any(axis=1)
+    positions = np.where(left, firstSolid - 1,
+                         np.argmax(transitions, axis=1) + k)
+    return positions, left | right
+
+def substitution_scores(sketch, seq, lengths, positions, k, minCount):
+    """Tries all four bases at `positions` in the rows of `seq`. Returns a
+    (reads x 4) matrix of how many of the k-mers covering the position are
+    solid with each of the bases in BASES."""
+    n = len(positions)
+    span = 2 * k - 1
+    lo = np.maximum(positions - k + 1, 0)
+    cols = lo[:, None] + np.arange(span)
+    inWindow = cols < lengths[:, None]
+    cols = np.clip(cols, 0, max(seq.shape[1] - 1, 0))
+    window = np.where(inWindow, np.take_along_axis(seq, cols, axis=1), 0).astype(np.uint8)
+    windowLengths = np.minimum(lengths - lo, span)
+    rel = positions - lo
+    scores = np.zeros((n, len(BASES)), dtype=np.int64)
+    for b, base in enumerate(BASES):
+        trial = window.copy()
+        trial[np.arange(n), rel] = base
+        block = fastq.ReadBlock([b""] * n, trial, trial, windowLengths)
+        solid, valid = solid_kmers(sketch, block, k, minCount)
+        #the k-mers that start at or before the position all contain it
+        covering = np.arange(solid.shape[1]) <= rel[:, None]
+        scores[:, b] = (solid & covering).sum(axis=1)
+    return scores
+
+def correct_block(sketch, block, k=25, minCount=3, maxCorrections=4):
+    """Corrects up to maxCorrections bases in each read of a ReadBlock in
+    place, one position per read per round. A base is only changed if one
+    other base makes strictly more of the covering k-mers solid than any
+    other base, including the original. Returns the number of bases changed in
+    each read."""
+    corrections = np.zeros(len(block), dtype=np.int64)
+    active = np.arange(len(block))
+    while len(active):
+        sub = block.subset(active)
+        solid, valid = solid_kmers(sketch, sub, k, minCount)
+        if solid.shape[1] < 2:
+            break
+        positions, found = error_positions(solid, valid, k)
+        found &= positions < sub.lengths
+        active = active[found]
+        positions = positions[found]
+        if not len(active):
+            break
+        scores = substitution_scores(sketch, block.seq[active],
+                                     block.lengths[active], positions, k,
+                                     minCount)
+        original = block.seq[active, positions]
+        best = np.argmax(scores, axis=1)
+        top = scores[np.arange(len(active)), best]
+        unique = (scores == top[:, None]).sum(axis=1) == 1
+        fixed = unique & (BASES[best] != original)
+        block.seq[active[fixed], positions[fixed]] = BASES[best[fixed]]
+        corrections[active[fixed]] += 1
+        active = active[fixed & (corrections[active] < maxCorrections)]
+    return corrections
+
+class ErrorCorrector:
+    """This stage corrects both mates of every pair against a CountMinSketch
+    of the library's k-mers. It runs in the worker processes, so each worker
+    gets its own copy of the sketch."""
+    def __init__(self, sketch, ksize=25, minCount=3, maxCorrections=4):
+        self.sketch = sketch
+        self.ksize = ksize
+        self.minCount = minCount
+        self.maxCorrections = maxCorrections
+
+    def __call__(self, pair):
+        for key, block in [("forward", pair.forward),
+                           ("reverse", pair.reverse)]:
+            corrections = correct_block(self.sketch, block, self.ksize,
+                                        self.minCount, self.maxCorrections)
+            pair.count("{}ReadsCorrected".format(key), np.sum(corrections > 0))
+            pair.count("{}BasesCorrected".format(key), np.sum(corrections))
+
+class Corrector(PrepRunner):
+    """
+    usage: Corrector(required_args, other_args)
+
+    Corrects the errors in one pair of read files. The k-mers are counted and
+    the reads are corrected as soon as the class is instantiated.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      forwardOutFile <first read output fastq filename>
+      reverseOutFile <second read output fastq filename>
+      outDir         <directory where files will be saved>
+
+    Optional Arguments:
+      ksize          <k-mer size, at most 32; default = 25>
+      minCount       <minimum count for a k-mer to be trusted; default = 3>
+      maxCorrections <maximum number of bases changed in a read; default = 4>
+      sketchWidth    <number of counters in each row of the count-min sketch;
+                       default = 4194304>
+      sketchDepth    <number of rows in the count-min sketch; default = 4>
+      sketch         <a CountMinSketch that already has the k-mers counted,
+                       for example from all of the files in a library>
+      procs          <number of worker processes; default = 1>
+      batchSize      <number of read pairs given to a worker at once;
+                       default = 20000>
+
+    The sketch should have several times more counters per row than there
+    are distinct k-mers in the reads (including the erroneous ones), or weak
+    k-mers will look solid and errors will be missed.
+    """
+    def __init__(self, **kwargs):
+        self.init("glotk_correct", **kwargs)
+        self.ksize = kwargs.get("ksize", 25)
+        self.sketch = kwargs.get("sketch")
+        if self.sketch is None:
+            self.sketch = count_kmers([(self.forwardPath, self.reversePath)],
+                                      CountMinSketch(kwargs.get("sketchWidth", 2**22),
+                                                     kwargs.get("sketchDepth", 4)),
+                                      self.ksize, self.procs, self.batchSize)
+        self.stages.append(ErrorCorrector(self.sketch, self.ksize,
+                                          kwargs.get("minCount", 3),
+                                          kwargs.get("maxCorrections", 4)))
+        self.run()
+
+def correct_config(config, newDir, yamlOut=None, **kwargs):
+    """Corrects every read pair in a ConfigParse object with
+    readprep.prep_config and returns the new ConfigParse object. The k-mers of
+    all of the files in one lib_seq are counted together before any of them
+    are corrected.
+
+    Any keyword arguments are passed on to Corrector.
+    """
+    sketches = {}
+    def run_pair(lib_seq, **files):
+        if id(lib_seq) not in sketches:
+            sketches[id(lib_seq)] = count_kmers(
+                lib_seq["pairs"],
+                CountMinSketch(kwargs.get("sketchWidth", 2**22),
+                               kwargs.get("sketchDepth", 4)),
+                kwargs.get("ksize", 25), kwargs.get("procs", 1),
+                kwargs.get("batchSize", fastq.BATCH_SIZE))
+        files.update(kwargs)
+        return Corrector(sketch=sketches[id(lib_seq)], **files)
+    return prep_config(config, newDir, run_pair, yamlOut)[0]
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""title: executors.py
+authr: darrin schultz
+
+This module:
+  - defines the executors that MerRunner starts run_meraculous.sh with.
+    Every executor has the same three methods:
+      run(name, command, cwd, logs, procs, memGB, started) runs a command to
+        the end and returns (returncode, rusage, peakRss). rusage and
+        peakRss are None if the executor can't measure them.
+      attach(name, jobId, started) waits for a job that an earlier
+        glotk-sweep started and returns like run(), or returns None if
+        there is no such job to wait for
+      cancel(job) kills the job that run() passed to `started`.
+  - LocalExecutor runs the command on this machine, like glotk-sweep always
+    did
+  - SlurmExecutor and SgeExecutor write a job script for the command, submit
+    it with sbatch or qsub, and poll squeue or qstat until the job leaves the
+    queue. The job script writes the exit status of the command to a file
+    next to the script, since the queue forgets finished jobs. Each run of a
+    sweep becomes its own job, so the runs spread over the nodes of the
+    cluster. The sweep directory has to be on a filesystem that the nodes
+    share.
+
+gloTK/tests/fake_slurm has sbatch, squeue and scancel stand-ins that run the
+jobs on this machine, to test SlurmExecutor without a cluster.
+"""
+
+import math
+import os
+import shlex
+import signal
+import subprocess
+import time
+
+from gloTK.utils import call_with_rusage
+
+#the return code of a job that left the queue without writing its exit
+# status, which happens when it is cancelled or killed by the scheduler
+CANCELLED = -signal.SIGTERM
+
+class LocalExecutor:
+    """runs commands on this machine"""
+    name = "local"
+
+    def run(self, name, command, cwd, logs, procs=1, memGB=0, started=None):
+        """Runs a shell command in cwd and streams its stdout and stderr to
+        the (stdoutPath, stderrPath) logs. The command runs in its own session
+        so that cancel() kills every process it started."""
+        p, rusage, peakRss = call_with_rusage(command, shell=True,
+                                              start_new_session=True,
+                                              started=started, logs=logs,
+                                              cwd=cwd)
+        return (p.returncode, rusage, peakRss)
+
+    def attach(self, name, jobId, started=None):
+        """local runs die with the glotk-sweep that started them, so there is
+        never a job to attach to"""
+        return None
+
+    def cancel(self, job):
+        """kills a running Popen object from run()"""
+        if job.returncode is None:
+            try:
+                os.killpg(job.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+class BatchJob:
+    """a job in a batch queue. returncode is None until it leaves the queue"""
+    def __init__(self, jobId):
+        self.jobId = jobId
+        self.returncode = None
+
+class BatchExecutor:
+    """
+    The parts of SlurmExecutor and SgeExecutor that are the same.
+
+    Subclasses set `name`, `directive` (the prefix of the option lines in a
+    job script) and `flags`, the format strings of the options for the job
+    name, working directory, stdout and stderr logs and queue. They extend
+    options() with the options for processors and memory, and define
+      submit(scriptPath) - submits a job script and returns the job id
+      in_queue(jobId)    - True while the job is queued or running
+      cancel(job)        - kills a BatchJob that hasn't left the queue
+
+      - scriptDir    - where the job scripts and exit status files are written
+      - queue        - the partition or queue to submit to
+      - extraArgs    - a string of more options for every job, like
+                       "--account=lab --time=7-00:00:00"
+      - pollInterval - the seconds between checks of the queue
+    """
+    name = None
+    directive = None
+    flags = {}
+
+    def __init__(self, scriptDir, queue=None, extraArgs="", pollInterval=30):
+        self.scriptDir = os.path.abspath(scriptDir)
+        self.queue = queue
+        self.extraArgs = shlex.split(extraArgs) if extraArgs else []
+        self.pollInterval = pollInterval
+
+    def options(self, name, cwd, logs, procs, memGB):
+        """returns the options that every job gets: its name, directory, logs
+        and queue"""
+        options = [self.flags["name"].format(name),
+                   self.flags["cwd"].format(cwd),
+                   self.flags["stdout"].format(logs[0]),
+                   self.flags["stderr"].format(logs[1])]
+        if self.queue:
+            options.append(self.flags["queue"].format(self.queue))
+        return options
+
+    def write_script(self, name, command, cwd, logs, procs=1, memGB=0):
+        """writes the job script and returns (scriptPath, exitPath)"""
+        os.makedirs(self.scriptDir, exist_ok=True)
+        scriptPath = os.path.join(self.scriptDir, "{}.sh".format(name))
+        exitPath = os.path.join(self.scriptDir, "{}.exit".format(name))
+        if os.path.exists(exitPath):
+            os.remove(exitPath)
+        options = self.options(name, cwd, logs, procs, memGB) + self.extraArgs
+        with open(scriptPath, "w") as f:
+            print("#!/bin/sh", file=f)
+            for option in options:
+                print("{} {}".format(self.directive, option), file=f)
+            print("cd {}".format(shlex.quote(cwd)), file=f)
+            #in a subshell so that an exit in the command still gets to the
+            # line that writes its exit status
+            print("(\n{}\n)".format(command), file=f)
+            print("echo $? > {}".format(shlex.quote(exitPath)), file=f)
+        return (scriptPath, exitPath)
+
+    def run(self, name, command, cwd, logs, procs=1, memGB=0, started=None):
+        """Submits the command as a job and waits for it to leave the
+        queue. The stdout and stderr of the job are appended to the logs."""
+        scriptPath, exitPath = self.write_script(name, command, cwd, logs,
+                                                 procs, memGB)
+        job = BatchJob(self.submit(scriptPath))
+        print("submitted {} as job {}".format(name, job.jobId))
+        return self.wait(job, exitPath, started)
+
+    def attach(self, name, jobId, started=None):
+        """Waits for the job jobId of an earlier glotk-sweep, so that a
+        restarted sweep doesn't submit a run that is still queued or
+        running. A job that finished while nobody watched returns the exit
+        status it wrote. Returns None if the job is gone without one."""
+        exitPath = os.path.join(self.scriptDir, "{}.exit".format(name))
+        if not (self.in_queue(jobId) or os.path.exists(exitPath)):
+            return None
+        print("attached to job {} of {}".format(jobId, name))
+        return self.wait(BatchJob(jobId), exitPath, started)
+
+    def wait(self, job, exitPath, started=None):
+        """polls the queue until the job leaves it and returns its
+        (returncode, None, None)"""
+        if started:
+            started(job)
+        while self.in_queue(job.jobId):
+            time.sleep(self.pollInterval)
+        #the exit status can take a moment to show up on a shared filesystem
+        for i in range(5):
+            if os.path.exists(exitPath):
+                break
+            time.sleep(min(1, self.pollInterval))
+        returncode = CANCELLED
+        if os.path.exists(exitPath):
+            with open(exitPath) as f:
+                text = f.read().strip()
+            returncode = int(text) if text else CANCELLED
+        job.returncode = returncode
+        return (returncode, None, None)
+
+    def _call(self, args):
+        return subprocess.run(args, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, universal_newlines=True)
+
+class SlurmExecutor(BatchExecutor):
+    """runs commands as SLURM jobs"""
+    name = "slurm"
+    directive = "#SBATCH"
+    flags = {"name": "--job-name={}",
+             "cwd": "--chdir={}",
+             "stdout": "--output={}",
+             "stderr": "--error={}",
+             "queue": "--partition={}"}
+
+    def options(self, name, cwd, logs, procs, memGB):
+        options = BatchExecutor.options(self, name, cwd, logs, procs, memGB)
+        options += ["--open-mode=append",
+                    "--nodes=1",
+                    "--ntasks=1",
+                    "--cpus-per-task={}".format(procs)]
+        if memGB:
+            options.append("--mem={}M".format(int(math.ceil(memGB * 1024))))
+        return options
+
+    def submit(self, scriptPath):
+        p = self._call(["sbatch", "--parsable", scriptPath])
+        if p.returncode:
+            raise ValueError("""ERROR: sbatch could not submit {}:
+            {}""".format(scriptPath, p.stderr.strip()))
+        #--parsable prints "jobid" or "jobid;cluster"
+        return p.stdout.strip().split(";")[0]
+
+    def in_queue(self, jobId):
+        p = self._call(["squeue", "-h", "-j", jobId, "-o", "%T"])
+        if p.returncode:
+            #slurm forgets finished jobs. Other errors, like the controller
+            # being busy, mean that the job may still be there.
+            return "Invalid job id" not in p.stderr
+        return p.stdout.strip() not in ["", "COMPLETED", "FAILED", "CANCELLED",
+                                        "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL",
+                                        "BOOT_FAIL", "DEADLINE", "PREEMPTED"]
+
+    def cancel(self, job):
+        if job.returncode is None:
+            self._call(["scancel", job.jobId])
+
+class SgeExecutor(BatchExecutor):
+    """
+    runs commands as Sun/Open Grid Engine jobs. peName is the parallel
+    environment that gives a job several slots on one node, which each site
+    names differently.
+    """
+    name = "sge"
+    directive = "#$"
+    flags = {"name": "-N {}",
+             "cwd": "-wd {}",
+             "stdout": "-o {}",
+             "stderr": "-e {}",
+             "queue": "-q {}"}
+
+    def __init__(self, scriptDir, queue=None, extraArgs="", pollInterval=30,
+                 peName="smp"):
+        BatchExecutor.__init__(self, scriptDir, queue, extraArgs, pollInterval)
+        self.peName = peName
+
+    def options(self, name, cwd, logs, procs, memGB):
+        options = BatchExecutor.options(self, name, cwd, logs, procs, memGB)
+        options += ["-S /bin/sh",
+                    "-pe {} {}".format(self.peName, procs)]
+        if memGB:
+            #h_vmem is per slot
+            options.append("-l h_vmem={}M".format(
+                int(math.ceil(memGB * 1024 / max(1, procs)))))
+        return options
+
+    def submit(self, scriptPath):
+        p = self._call(["qsub", "-terse", scriptPath])
+        if p.returncode:
+            raise ValueError("""ERROR: qsub could not submit {}:
+            {}""".format(scriptPath, p.stderr.strip()))
+        return p.stdout.strip().split(".")[0]
+
+    def in_queue(self, jobId):
+        #qstat -j fails once the job is gone
+        return self._call(["qstat", "-j", jobId]).returncode == 0
+
+    def cancel(self, job):
+        if job.returncode is None:
+            self._call(["qdel", job.jobId])
+
+EXECUTORS = {"local": LocalExecutor, "slurm": SlurmExecutor, "sge": SgeExecutor}
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: fastq.py
+authr: darrin schultz
+
+This module:
+  - reads fastq files in batches of raw records that are cheap to send to
+    worker processes
+  - holds a parsed batch as numpy matrices (one row per read) so that the
+    read processing stages can work on a whole batch at once instead of one
+    read at a time
+  - formats batches back into fastq, optionally as BGZF blocks. gzip
+    members can simply be concatenated, so each worker can compress its own
+    batch and the parent process only has to write bytes to disk.
+  - reads BGZF files by decompressing their blocks in parallel (see bgzf.py)
+"""
+
+import gzip
+import itertools
+
+import numpy as np
+
+from gloTK import bgzf
+
+#the number of read pairs in one batch. 20000 pairs of 150bp reads is about
+# 12MB of raw fastq per batch
+BATCH_SIZE = 20000
+
+#the number of bytes read from a fastq file at once
+BUFFER_SIZE = 4 * 1024 * 1024
+
+#fastq quality strings are phred+33
+PHRED_OFFSET = 33
+
+def fastq_open(path, mode="rb"):
+    """opens a fastq file whether or not it is gzipped"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+def data_blocks(path):
+    """yields the decompressed contents of a fastq file in large blocks. BGZF
+    files are decompressed in parallel."""
+    if path.endswith(".gz") and bgzf.is_bgzf(path):
+        yield from bgzf.read_blocks(path)
+        return
+    with fastq_open(path) as handle:
+        while True:
+            data = handle.read(BUFFER_SIZE)
+            if not data:
+                break
+            yield data
+
+def line_chunks(path, numLines):
+    """yields lists of `numLines` lines (without the newlines) at a time. The
+    file is read in large blocks and split into lines all at once, which is
+    much faster than iterating over the lines of a gzip file."""
+    blocks = data_blocks(path)
+    lines = []
+    tail = b""
+    while True:
+        data = next(blocks, b"")
+        if data:
+            lines.extend((tail + data).split(b"\n"))
+            tail = lines.pop()
+        elif tail:
+            lines.append(tail)
+        while len(lines) >= numLines:
+            yield lines[:numLines]
+            del lines[:numLines]
+        if not data:
+            break
+    if lines:
+        yield lines
+
+def raw_chunks(path, batchSize=BATCH_SIZE):
+    """yields the raw bytes of `batchSize` fastq records at a time"""
+    for lines in line_chunks(path, 4 * batchSize):
+        if len(lines) % 4:
+            raise ValueError("""ERROR: {} ends in the middle of a fastq
+            record. Is the file truncated?""".format(path))
+        lines.append(b"")
+        yield b"\n".join(lines)
+
+def paired_chunks(forwardPath, reversePath, batchSize=BATCH_SIZE):
+    """yields (forward, reverse) tuples of raw record bytes. Raises an error if
+    one of the mate files runs out of reads before the other."""
+    forwards = raw_chunks(forwardPath, batchSize)
+    reverses = raw_chunks(reversePath, batchSize)
+    for forward, reverse in itertools.zip_longest(forwards, reverses):
+        if (forward is None) or (reverse is None) or \
+           (forward.count(b"\n") != reverse.count(b"\n")):
+            raise ValueError("""ERROR: the forward and reverse read files do
+            not have the same number of reads:
+              {}
+              {}""".format(forwardPath, reversePath))
+        yield (forward, reverse)
+
+def pack(strings, lengths):
+    """packs a list of byte strings into a (len(strings) x max(lengths)) uint8
+    matrix. Each row is padded on the right with zeros."""
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.zeros((len(strings), width), dtype=np.uint8)
+    mask = np.arange(width) < lengths[:, None]
+    #boolean assignment fills the matrix row by row, which is the same order
+    # as the joined strings
+    matrix[mask] = np.frombuffer(b"".join(strings), dtype=np.uint8)
+    return matrix
+
+def encode(sequence):
+    """returns a sequence string as a uint8 array in the same encoding used by
+    ReadBlock.seq"""
+    return np.frombuffer(sequence.upper().encode(), dtype=np.uint8)
+
+class ReadBlock:
+    """This class holds a batch of fastq records.
+
+      - names   - list of header lines without the leading '@'
+      - seq     - (reads x width) uint8 matrix of bases, zero padded
+      - qual    - (reads x width) uint8 matrix of phred+33 qualities
+      - lengths - int array of the number of bases in each read
+
+    Trimming the 3' end of a read only has to change its entry in lengths.
+    Everything past lengths[i] in a row is ignored when the block is written.
+    """
+    def __init__(self, names, seq, qual, lengths):
+        self.names = names
+        self.seq = seq
+        self.qual = qual
+        self.lengths = lengths
+
+    @classmethod
+    def from_bytes(cls, raw):
+        """parses the raw bytes of complete fastq records"""
+        lines = raw.split(b"\n")
+        if lines and not lines[-1]:
+            lines.pop()
+        if len(lines) % 4:
+            raise ValueError("""ERROR: the fastq records are incomplete. There
+            are {} lines, which is not a multiple of four.""".format(len(lines)))
+        headers = lines[0::4]
+        seqs = lines[1::4]
+        quals = lines[3::4]
+        if not all(x.startswith(b"@") for x in headers) or \
+           not all(x.startswith(b"+") for x in lines[2::4]):
+            raise ValueError("""ERROR: found a fastq record that doesn't start
+            with '@' or is missing its '+' line.""")
+        lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+        qualLengths = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+        if not np.array_equal(lengths, qualLengths):
+            bad = headers[int(np.argmax(lengths != qualLengths))]
+            raise ValueError("""ERROR: the sequence and quality strings are not
+            the same length for the read {}""".format(bad.decode()))
+        return cls([x[1:] for x in headers],
+                   pack(seqs, lengths),
+                   pack(quals, lengths),
+                   lengths)
+
+    def __len__(self):
+        return len(self.names)
+
+    def subset(self, keep):
+        """returns a new ReadBlock with only the reads selected by `keep`, which
+        is a boolean mask or an array of indices"""
+        keep = np.asarray(keep)
+        if keep.dtype == bool:
+            keep = np.flatnonzero(keep)
+        return ReadBlock([self.names[i] for i in keep],
+                         self.seq[keep],
+                         self.qual[keep],
+                         self.lengths[keep])
+
+    def to_bytes(self):
+        """formats the block as fastq text"""
+        mask = np.arange(self.seq.shape[1]) < self.lengths[:, None]
+        seqs = self.seq[mask].tobytes()
+        quals = self.qual[mask].tobytes()
+        ends = np.cumsum(self.lengths).tolist()
+        starts = [0] + ends[:-1]
+        return b"".join([b"@%s\n%s\n+\n%s\n" % (name, seqs[i:j], quals[i:j])
+                         for name, i, j in zip(self.names, starts, ends)])
+
+    def to_output(self, compress=True, compresslevel=6):
+        """formats the block as fastq text, as BGZF blocks if `compress`"""
+        data = self.to_bytes()
+        if compress:
+            return bgzf.compress(data, compresslevel)
+        return data
+
+def add_counts(hists, key, counts):
+    """adds the array `counts` to hists[key], growing it if necessary"""
+    old = hists.get(key)
+    if old is None:
+        hists[key] = np.array(counts, dtype=np.int64)
+        return
+    if len(old) < len(counts):
+        old = np.concatenate([old, np.zeros(len(counts) - len(old), dtype=np.int64)])
+    old[:len(counts)] += counts
+    hists[key] = old
+
+class PairBlock:
+    """This class holds the forward and reverse ReadBlocks for one batch of
+    read pairs. The ith read in forward is the mate of the ith read in reverse.
+
+    `stats` is a dict of counts that the processing stages use to record what
+    they did to this batch and `hists` is a dict of histograms (numpy arrays of
+    counts indexed by value). If a stage merges pairs into single reads it
+    moves them from forward and reverse into the `merged` ReadBlock."""
+    def __init__(self, forward, reverse):
+        if len(forward) != len(reverse):
+            raise ValueError("""ERROR: there are {} forward reads but {}
+            reverse reads in this batch""".format(len(forward), len(reverse)))
+        self.forward = forward
+        self.reverse = reverse
+        self.merged = None
+        self.stats = {}
+        self.hists = {}
+
+    @classmethod
+    def from_bytes(cls, forwardRaw, reverseRaw):
+        return cls(ReadBlock.from_bytes(forwardRaw),
+                   ReadBlock.from_bytes(reverseRaw))
+
+    def __len__(self):
+        return len(self.forward)
+
+    def keep(self, keep):
+        """drops every pair not selected by `keep` from both mates"""
+        self.forward = self.forward.subset(keep)
+        self.reverse = self.reverse.subset(keep)
+
+    def count(self, key, value):
+        """adds `value` to the stats counter `key`"""
+        self.stats[key] = self.stats.get(key, 0) + int(value)
+
+    def histogram(self, key, values):
+        """adds an array of non-negative integers to the histogram `key`"""
+        add_counts(self.hists, key, np.bincount(np.asarray(values, dtype=np.int64)))
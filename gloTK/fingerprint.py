@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: fingerprint.py
+authr: darrin schultz
+
+This module:
+  - computes content fingerprints of read files to use as their identity in
+    caches and provenance records. Files are split into CHUNK_SIZE chunks
+    that are hashed in parallel, and the chunk digests are combined pairwise
+    in a tree, so the fingerprint doesn't depend on how many processes were
+    used.
+  - keeps the fingerprints of a project's read files in
+    gloTK_info/read_fingerprints.yaml, with the size and mtime of each file.
+    A file is only hashed again if its size or mtime changes.
+
+The chunks are hashed with zlib's crc32 and adler32, which together give 64
+bits per chunk at several GB/s. They aren't cryptographic, which is fine for
+telling read files apart but not for security. The tree nodes are combined
+with blake2b since there are only a few of them.
+"""
+
+import hashlib
+import itertools
+import os
+import struct
+import zlib
+from multiprocessing import Pool
+
+import yaml
+
+#the size of the chunks hashed in parallel and the size of each read
+CHUNK_SIZE = 64 * 1024 * 1024
+READ_SIZE = 4 * 1024 * 1024
+
+READ_EXTENSIONS = (".fastq", ".fq", ".fastq.gz", ".fq.gz")
+
+#changes if the fingerprint algorithm changes, so that old fingerprints are
+# never compared to new ones
+ALGORITHM = "crc32adler32-tree-{}M".format(CHUNK_SIZE // (1024 * 1024))
+
+def hash_chunk(args):
+    """returns the 16 byte digest of `length` bytes of a file at `offset`"""
+    path, offset, length = args
+    crc = 0
+    adler = 1
+    with open(path, "rb") as handle:
+        handle.seek(offset)
+        remaining = length
+        while remaining:
+            data = handle.read(min(READ_SIZE, remaining))
+            if not data:
+                raise ValueError("""ERROR: {} got shorter while it was being
+                fingerprinted""".format(path))
+            crc = zlib.crc32(data, crc)
+            adler = zlib.adler32(data, adler)
+            remaining -= len(data)
+    return struct.pack(">IIQ", crc, adler, length)
+
+class ChunkHasher:
+    """This class fingerprints data that is fed to it in order, like a file
+    that is being copied. The result is the same as from fingerprint_files()
+    for a file with the same contents."""
+    def __init__(self):
+        self.digests = []
+        self.crc = 0
+        self.adler = 1
+        self.length = 0
+
+    def update(self, data):
+        data = memoryview(data)
+        while len(data):
+            piece = data[:CHUNK_SIZE - self.length]
+            data = data[len(piece):]
+            self.crc = zlib.crc32(piece, self.crc)
+            self.adler = zlib.adler32(piece, self.adler)
+            self.length += len(piece)
+            if self.length == CHUNK_SIZE:
+                self._end_chunk()
+
+    def _end_chunk(self):
+        self.digests.append(struct.pack(">IIQ", self.crc, self.adler, self.length))
+        self.crc = 0
+        self.adler = 1
+        self.length = 0
+
+    def hexdigest(self):
+        if self.length:
+            self._end_chunk()
+        return combine(self.digests)
+
+def combine(digests):
+    """combines the chunk digests of a file pairwise into one digest"""
+    nodes = list(digests) or [struct.pack(">IIQ", 0, 1, 0)]
+    while len(nodes) > 1:
+        nodes = [hashlib.blake2b(b"".join(nodes[i:i + 2]), digest_size=16).digest()
+                 for i in range(0, len(nodes), 2)]
+    return hashlib.blake2b(nodes[0], digest_size=16).hexdigest()
+
+def chunks(path, size):
+    """returns the (path, offset, length) of every chunk of a file"""
+    return [(path, offset, min(CHUNK_SIZE, size - offset))
+            for offset in range(0, size, CHUNK_SIZE)]
+
+def fingerprint_files(paths, procs=1):
+    """returns a dict of the fingerprint of each file in `paths`. The chunks of
+    all of the files are hashed in one pool, so a few large files still use
+    all of the processes."""
+    paths = [os.path.abspath(x) for x in paths]
+    fileChunks = {path: chunks(path, os.path.getsize(path)) for path in paths}
+    allChunks = list(itertools.chain.from_iterable(fileChunks.values()))
+    if procs > 1 and len(allChunks) > 1:
+        with Pool(min(procs, len(allChunks))) as pool:
+            digests = pool.map(hash_chunk, allChunks)
+    else:
+        digests = [hash_chunk(x) for x in allChunks]
+    results = {}
+    start = 0
+    for path in paths:
+        count = len(fileChunks[path])
+        results[path] = combine(digests[start:start + count])
+        start += count
+    return results
+
+def stat_signature(path):
+    """returns the (size, mtime in ns) of a file, following symlinks"""
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+class FingerprintStore:
+    """
+    This class keeps the fingerprints of files in a yaml file.
+
+    Useage example:
+    store = FingerprintStore("gloTK_info/read_fingerprints.yaml")
+    fingerprints = store.fingerprints(readPaths, procs=8)
+
+    Only the files that are new or whose size or mtime changed since they
+    were last fingerprinted are hashed. The yaml file maps the absolute path of
+    each file to its size, mtime_ns, algorithm and fingerprint.
+    """
+    def __init__(self, storePath):
+        self.storePath = storePath
+        self.records = {}
+        if os.path.exists(storePath):
+            with open(storePath) as f:
+                self.records = yaml.safe_load(f) or {}
+
+    def is_current(self, path):
+        """returns True if the stored fingerprint of the file is up to date"""
+        record = self.records.get(path)
+        if not record or record.get("algorithm") != ALGORITHM:
+            return False
+        return (record["size"], record["mtime_ns"]) == stat_signature(path)
+
+    def fingerprints(self, paths, procs=1):
+        """returns a dict of the fingerprints of `paths`, hashing any that
+        are out of date and saving the store if anything changed"""
+        paths = [os.path.abspath(x) for x in paths]
+        stale = [x for x in sorted(set(paths)) if not self.is_current(x)]
+        changed = []
+        if stale:
+            signatures = {x: stat_signature(x) for x in stale}
+            for path, fingerprint in fingerprint_files(stale, procs).items():
+                #a file that changed while it was hashed has no fingerprint,
+                # not even the one from before it changed
+                if stat_signature(path) != signatures[path]:
+                    changed.append(path)
+                    self.records.pop(path, None)
+                    continue
+                self.records[path] = {"size": signatures[path][0],
+                                      "mtime_ns": signatures[path][1],
+                                      "algorithm": ALGORITHM,
+                                      "fingerprint": fingerprint}
+            self.save()
+        if changed:
+            raise ValueError("""ERROR: these files changed while they were
+            being fingerprinted: {}""".format(changed))
+        return {x: self.records[x]["fingerprint"] for x in paths}
+
+    def save(self):
+        """writes the store, replacing the old file only once it is complete"""
+        tmpPath = self.storePath + ".tmp"
+        with open(tmpPath, "w") as f:
+            f.write(yaml.safe_dump(self.records, default_flow_style=False))
+        os.replace(tmpPath, self.storePath)
+
+def project_fingerprints(projectDir, procs=1):
+    """fingerprints every read file in the gloTK_reads directory of a project
+    and returns the dict of fingerprints. They are stored in
+    gloTK_info/read_fingerprints.yaml."""
+    readsDir = os.path.join(projectDir, "gloTK_reads")
+    paths = []
+    for root, dirs, files in os.walk(readsDir):
+        paths += [os.path.join(root, x) for x in sorted(files)
+                  if x.endswith(READ_EXTENSIONS)]
+    store = FingerprintStore(os.path.join(projectDir, "gloTK_info",
+                                          "read_fingerprints.yaml"))
+    return store.fingerprints(paths, procs)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: insertsize.py
+authr: darrin schultz
+
+This module:
+  - estimates the insertAvg and insertSdev of each lib_seq from the reads
+    instead of trusting the numbers from the sequencing center
+  - maps a subsample of each library to a draft assembly with the Bowtie2
+    wrapper and fits the insert sizes of the concordant, uniquely mapped
+    pairs
+  - falls back to merging the overlapping pairs of the subsample with
+    readmerge.PairMerger if there is no draft assembly. This only works for
+    short insert libraries where most of the pairs overlap, since the longer
+    inserts can't be seen this way.
+  - writes the estimates back into the lib_seqs of a ConfigParse object, so
+    they end up in the read configs and every Meraculous config made from them
+
+The fit is robust to chimeras and repeats. Like Picard's
+CollectInsertSizeMetrics, insert sizes more than `maxDeviations` median
+absolute deviations from the median are dropped before taking the mean and
+standard deviation.
+"""
+
+import os
+
+import numpy as np
+import yaml
+
+from gloTK import fastq
+from gloTK import utils
+from gloTK.readmerge import PairMerger
+from gloTK.wrappers import Bowtie2, Bowtie2Build
+
+#the number of read pairs sampled from each library
+SAMPLE_SIZE = 100000
+
+#the fewest insert sizes needed to make an estimate
+MIN_PAIRS = 100
+
+def sample_pairs(forwardPath, reversePath, sampleSize=SAMPLE_SIZE):
+    """returns the raw bytes of the first `sampleSize` pairs as a (forward,
+    reverse) tuple"""
+    return next(fastq.paired_chunks(forwardPath, reversePath, sampleSize),
+                (b"", b""))
+
+def sam_insert_sizes(samPath, minMapq=20):
+    """returns an array of the insert sizes of the properly paired mates in a
+    SAM file with at least `minMapq` mapping quality. Each pair is counted
+    once, from its first mate. Secondary and supplementary alignments are
+    skipped."""
+    sizes = []
+    with open(samPath, "r") as f:
+        for line in f:
+            if line.startswith("@"):
+                continue
+            fields = line.split("\t", 9)
+            flag = int(fields[1])
+            if (flag & 0x2) and (flag & 0x40) and not (flag & 0x900) and \
+               (int(fields[4]) >= minMapq) and int(fields[8]):
+                sizes.append(abs(int(fields[8])))
+    return np.array(sizes, dtype=np.int64)
+
+def overlap_insert_sizes(forwardRaw, reverseRaw, overlapMin=30):
+    """merges the overlapping pairs in the raw bytes of some pairs, and
+    returns (insertSizes, mergedFraction)"""
+    pair = fastq.PairBlock.from_bytes(forwardRaw, reverseRaw)
+    total = len(pair)
+    if not total:
+        return np.zeros(0, dtype=np.int64), 0.0
+    PairMerger(overlapMin=overlapMin)(pair)
+    return pair.merged.lengths, len(pair.merged) / total
+
+def fit_insert_sizes(sizes, maxDeviations=10):
+    """returns (insertAvg, insertSdev, pairsUsed) for an array of insert
+    sizes, ignoring the outliers"""
+    sizes = np.asarray(sizes, dtype=np.float64)
+    if len(sizes) < 2:
+        raise ValueError("""ERROR: at least two insert sizes are needed to
+        estimate the insert size distribution""")
+    median = np.median(sizes)
+    deviations = np.abs(sizes - median)
+    mad = max(np.median(deviations), 1.0)
+    kept = sizes[deviations <= maxDeviations * mad]
+    return (int(round(kept.mean())),
+            max(1, int(round(kept.std(ddof=1)))),
+            len(kept))
+
+def index_draft(draftPath, outDir, procs=1):
+    """builds a bowtie2 index of the draft assembly in outDir unless it is
+    already there, and returns the index prefix"""
+    utils.safe_mkdir(outDir)
+    indexPrefix = os.path.join(outDir, os.path.basename(draftPath))
+    if not any(os.path.exists(indexPrefix + x) for x in [".1.bt2", ".1.bt2l"]):
+        Bowtie2Build(referencePath = draftPath,
+                     indexPrefix   = indexPrefix,
+                     outDir        = outDir,
+                     procs         = procs)
+    return indexPrefix
+
+def mapped_insert_sizes(lib_seq, indexPrefix, outDir, sampleSize=SAMPLE_SIZE,
+                        procs=1, minMapq=20):
+    """maps a subsample of every pair of a lib_seq to a bowtie2 index and
+    returns the insert sizes"""
+    #let bowtie2 find inserts well past the expected size
+    try:
+        maxInsert = max(2000, 3 * int(float(lib_seq["insertAvg"])))
+    except (KeyError, ValueError):
+        maxInsert = 2000
+    orientation = "--rf" if str(lib_seq.get("isRevComped")) == "1" else "--fr"
+    perPair = max(1, sampleSize // len(lib_seq["pairs"]))
+    sizes = []
+    for j, (forward, reverse) in enumerate(lib_seq["pairs"]):
+        samples = []
+        for mate, raw in zip([1, 2], sample_pairs(forward, reverse, perPair)):
+            samples.append(os.path.join(outDir, "{}_{}_sample_{}.fastq".format(
+                lib_seq["name"], j, mate)))
+            with open(samples[-1], "wb") as f:
+                f.write(raw)
+        bowtie = Bowtie2(forwardPath = samples[0],
+                         reversePath = samples[1],
+                         indexPrefix = indexPrefix,
+                         samOutFile  = "{}_{}.sam".format(lib_seq["name"], j),
+                         outDir      = outDir,
+                         maxInsert   = maxInsert,
+                         orientation = orientation,
+                         procs       = procs)
+        sizes.append(sam_insert_sizes(bowtie.samOutFile, minMapq))
+        for each in samples + [bowtie.samOutFile]:
+            os.remove(each)
+    return np.concatenate(sizes)
+
+def estimate_insert_size(lib_seq, outDir, indexPrefix=None,
+                         sampleSize=SAMPLE_SIZE, procs=1, minMapq=20,
+                         overlapMin=30, minOverlapFraction=0.5,
+                         maxDeviations=10):
+    """Estimates the insert size distribution of one lib_seq. The subsample
+    is mapped to the bowtie2 index at indexPrefix if it is given. Otherwise
+    the overlapping pairs are merged, but only if at least
+    minOverlapFraction of the pairs overlap and the library isn't reverse
+    complemented.
+
+    Returns a dict with insertAvg, insertSdev, pairsUsed and method, or None
+    if there wasn't enough evidence to make an estimate.
+    """
+    utils.safe_mkdir(outDir)
+    if indexPrefix:
+        method = "bowtie2"
+        sizes = mapped_insert_sizes(lib_seq, indexPrefix, outDir, sampleSize,
+                                    procs, minMapq)
+    else:
+        method = "overlap"
+        if str(lib_seq.get("isRevComped")) == "1":
+            return None
+        perPair = max(1, sampleSize // len(lib_seq["pairs"]))
+        sizes = []
+        pairs = 0
+        merged = 0
+        for forward, reverse in lib_seq["pairs"]:
+            forwardRaw, reverseRaw = sample_pairs(forward, reverse, perPair)
+            pairSizes = overlap_insert_sizes(forwardRaw, reverseRaw,
+                                             overlapMin)[0]
+            pairs += forwardRaw.count(b"\n") // 4
+            merged += len(pairSizes)
+            sizes.append(pairSizes)
+        sizes = np.concatenate(sizes)
+        #a library with mostly long inserts only shows us its short tail
+        if (not pairs) or (merged / pairs < minOverlapFraction):
+            return None
+    if len(sizes) < MIN_PAIRS:
+        return None
+    insertAvg, insertSdev, pairsUsed = fit_insert_sizes(sizes, maxDeviations)
+    return {"insertAvg": insertAvg,
+            "insertSdev": insertSdev,
+            "pairsUsed": pairsUsed,
+            "method": method}
+
+def insert_config(config, outDir, draftPath=None, procs=1, **kwargs):
+    """Estimates the insert sizes of every lib_seq in a ConfigParse object and
+    writes them into its lib_seqs. Libraries without an estimate keep the
+    values from the config file. The estimates are also saved to
+    outDir/insert_sizes.yaml. Any keyword arguments are passed on to
+    estimate_insert_size.
+
+    Returns a dict of the estimates for each lib_seq name.
+    """
+    utils.safe_mkdir(outDir)
+    indexPrefix = index_draft(draftPath, outDir, procs) if draftPath else None
+    estimates = {}
+    for lib_seq in config.params["lib_seq"]:
+        estimate = estimate_insert_size(lib_seq, outDir, indexPrefix,
+                                        procs=procs, **kwargs)
+        estimates[lib_seq["name"]] = estimate
+        if estimate is None:
+            print("""Could not estimate the insert size of {}. Keeping
+            insertAvg {} and insertSdev {} from the config file.""".format(
+                lib_seq["name"], lib_seq["insertAvg"], lib_seq["insertSdev"]))
+            continue
+        lib_seq["insertAvg"] = str(estimate["insertAvg"])
+        lib_seq["insertSdev"] = str(estimate["insertSdev"])
+    with open(os.path.join(outDir, "insert_sizes.yaml"), "w") as f:
+        print(yaml.dump(estimates), file=f)
+    return estimates
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: interleave.py
+authr: darrin schultz
+
+This module:
+  - interleaves a pair of fastq files into one file, and splits an
+    interleaved file back into a pair. This replaces
+    wrappers_biolite.Interleave, which needs the BioLite binaries.
+  - pairs the mates by position and checks that their names match. The names
+    of a whole batch are checked with one regular expression, so there is no
+    Python code run per read.
+  - reads each input in a background thread with large buffers, and
+    compresses the output batches in a pool of threads. zlib releases the GIL,
+    so the reading, compressing and writing all run at the same time.
+
+Each compressed batch is written as BGZF blocks, like the output of a
+readprep.ReadPipeline.
+"""
+
+import itertools
+import re
+from multiprocessing.pool import ThreadPool
+
+from gloTK import bgzf
+from gloTK import fastq
+from gloTK import utils
+
+#Turns the header lines of a batch into the part of the name that is the same
+# for both mates: the first word without a /1 or /2 suffix.
+NAME_PATTERN = re.compile(rb"^@(\S*?)(?:/[12])?(?:[ \t].*)?$", re.MULTILINE)
+
+def mate_names(headers):
+    """returns the mate names of a list of header lines as one bytes object"""
+    return NAME_PATTERN.sub(rb"\1", b"\n".join(headers))
+
+def check_names(forwardHeaders, reverseHeaders, firstRecord=0):
+    """raises an error if any of the forward and reverse mates in a batch
+    don't have matching names. firstRecord is the number of pairs before this
+    batch, for the error message."""
+    if mate_names(forwardHeaders) == mate_names(reverseHeaders):
+        return
+    for i, (forward, reverse) in enumerate(zip(forwardHeaders, reverseHeaders)):
+        if mate_names([forward]) != mate_names([reverse]):
+            raise ValueError("""ERROR: the names of the mates of pair {} do not
+            match. Are the reads in the same order in both files?
+              {}
+              {}""".format(firstRecord + i + 1, forward.decode(), reverse.decode()))
+
+def _records(lines, path):
+    if len(lines) % 4:
+        raise ValueError("""ERROR: {} ends in the middle of a fastq
+        record. Is the file truncated?""".format(path))
+
+def _output(lines, compress, compresslevel):
+    lines.append(b"")
+    data = b"\n".join(lines)
+    if compress:
+        return bgzf.compress(data, compresslevel)
+    return data
+
+def interleave(forwardPath, reversePath, outPath, threads=4,
+               batchSize=fastq.BATCH_SIZE, compresslevel=6, checkNames=True):
+    """Writes the pairs in forwardPath and reversePath to outPath as
+    forward, reverse, forward, reverse... The output is gzipped if outPath
+    ends in .gz. Returns the number of pairs written."""
+    compress = outPath.endswith(".gz")
+    def interleave_batch(batch):
+        first, forward, reverse = batch
+        _records(forward, forwardPath)
+        _records(reverse, reversePath)
+        if len(forward) != len(reverse):
+            raise ValueError("""ERROR: the forward and reverse read files do
+            not have the same number of reads:
+              {}
+              {}""".format(forwardPath, reversePath))
+        if checkNames:
+            check_names(forward[0::4], reverse[0::4], first)
+        lines = [None] * (2 * len(forward))
+        for i in range(4):
+            lines[i::8] = forward[i::4]
+            lines[i + 4::8] = reverse[i::4]
+        return (len(forward) // 4, _output(lines, compress, compresslevel))
+    forwards = utils.prefetch(fastq.line_chunks(forwardPath, 4 * batchSize))
+    reverses = utils.prefetch(fastq.line_chunks(reversePath, 4 * batchSize))
+    batches = ((i * batchSize, forward or [], reverse or [])
+               for i, (forward, reverse) in
+               enumerate(itertools.zip_longest(forwards, reverses)))
+    pairs = 0
+    with open(outPath, "wb") as out, ThreadPool(threads) as pool:
+        for count, data in utils.bounded_imap(pool, interleave_batch, batches,
+                                              2 * threads):
+            out.write(data)
+            pairs += count
+        if compress:
+            out.write(bgzf.EOF_BLOCK)
+    return pairs
+
+def deinterleave(inPath, forwardOut, reverseOut, threads=4,
+                 batchSize=fastq.BATCH_SIZE, compresslevel=6, checkNames=True):
+    """Splits an interleaved fastq file into forward and reverse files. The
+    output is gzipped if forwardOut ends in .gz. Returns the number of pairs
+    written."""
+    compress = forwardOut.endswith(".gz")
+    def split_batch(batch):
+        first, lines = batch
+        if len(lines) % 8:
+            raise ValueError("""ERROR: {} does not have an even number of
+            fastq records, so it can't be split into pairs.""".format(inPath))
+        forward = [None] * (len(lines) // 2)
+        reverse = [None] * (len(lines) // 2)
+        for i in range(4):
+            forward[i::4] = lines[i::8]
+            reverse[i::4] = lines[i + 4::8]
+        if checkNames:
+            check_names(forward[0::4], reverse[0::4], first)
+        return (len(forward) // 4, _output(forward, compress, compresslevel),
+                _output(reverse, compress, compresslevel))
+    batches = ((i * batchSize, lines) for i, lines in
+               enumerate(utils.prefetch(fastq.line_chunks(inPath, 8 * batchSize))))
+    pairs = 0
+    with open(forwardOut, "wb") as forwardHandle, \
+         open(reverseOut, "wb") as reverseHandle, \
+         ThreadPool(threads) as pool:
+        for count, forward, reverse in utils.bounded_imap(pool, split_batch,
+                                                          batches, 2 * threads):
+            forwardHandle.write(forward)
+            reverseHandle.write(reverse)
+            pairs += count
+        if compress:
+            forwardHandle.write(bgzf.EOF_BLOCK)
+            reverseHandle.write(bgzf.EOF_BLOCK)
+    return pairs
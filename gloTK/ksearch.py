@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""title: ksearch.py
+authr: darrin schultz
+
+This module:
+  - chooses which mer sizes to assemble in an adaptive mer_size sweep. A grid
+    sweep assembles every k in the list. The search here assumes that the
+    objective (like the scaffold N50 from MerRunAnalyzer.stats()) rises to
+    one peak and falls again over the k range, and only assembles the k
+    values that it needs to find that peak.
+  - works like a golden-section search that is allowed to place several
+    points at a time, so that a batch of assemblies can run in parallel.
+    The bracket is the range between the assembled k values on either side
+    of the best k so far, and each new point goes in the biggest gap in the
+    bracket, at the golden ratio from the side of the best k. With one point
+    per round this is the usual golden-section search on the odd k values.
+  - stops when there are no k values left in the bracket, or when the best
+    objective hasn't improved by minImprovement for `patience` rounds
+"""
+
+#the golden-section fraction, (3 - sqrt(5)) / 2
+GOLDEN = (3 - 5 ** 0.5) / 2
+
+def nearest_odd(x):
+    """rounds a number to the nearest odd integer"""
+    return int(round((x - 1) / 2)) * 2 + 1
+
+class KSearch:
+    """
+    This class keeps track of an adaptive mer_size search.
+
+    Useage example:
+    search = KSearch(21, 91, batchSize=4)
+    batch = search.next_batch()
+    while batch:
+        ...assemble each k in the batch...
+        search.record({21: 1500, 45: 3100, ...})
+        batch = search.next_batch()
+    print(search.best, search.stopReason)
+
+    The results of failed assemblies are recorded as None. They count as
+    assembled points for the bracket but never as the best k.
+    """
+    def __init__(self, kMin, kMax, batchSize=2, minImprovement=0.01,
+                 patience=3, maxAssemblies=None):
+        #only odd k values are allowed by Meraculous
+        self.kMin = kMin if kMin % 2 else kMin + 1
+        self.kMax = kMax if kMax % 2 else kMax - 1
+        if self.kMin > self.kMax:
+            raise ValueError("""ERROR: there are no odd mer sizes between {}
+            and {}.""".format(kMin, kMax))
+        if batchSize < 1:
+            raise ValueError("""ERROR: the batch size of the k search must be at
+            least 1, not {}.""".format(batchSize))
+        self.batchSize = batchSize
+        self.minImprovement = minImprovement
+        self.patience = patience
+        self.maxAssemblies = maxAssemblies
+        #k: objective for every k that was assembled
+        self.results = {}
+        #the best objective after each round
+        self.history = []
+        self.stopReason = None
+
+    @property
+    def best(self):
+        """the k with the highest objective so far, the smaller k on ties"""
+        scored = [(v, -k) for k, v in self.results.items() if v is not None]
+        if not scored:
+            return None
+        return -max(scored)[1]
+
+    def bracket(self):
+        """returns (lo, hi), the smallest range of k that has to contain the
+        peak if the objective only has one"""
+        best = self.best
+        if best is None:
+            return (self.kMin, self.kMax)
+        below = [k for k in self.results if k < best]
+        above = [k for k in self.results if k > best]
+        return (max(below) if below else self.kMin,
+                min(above) if above else self.kMax)
+
+    def stopped(self):
+        """returns True and sets stopReason once the search is done"""
+        if self.stopReason:
+            return True
+        lo, hi = self.bracket()
+        if self.maxAssemblies is not None and \
+           len(self.results) >= self.maxAssemblies:
+            self.stopReason = "reached {} assemblies".format(self.maxAssemblies)
+        elif not [k for k in range(lo, hi + 1, 2) if k not in self.results]:
+            self.stopReason = "every k between {} and {} was assembled".format(lo, hi)
+        elif len(self.history) > self.patience:
+            old = self.history[-self.patience - 1]
+            if old is not None and \
+               self.history[-1] - old < self.minImprovement * abs(old):
+                self.stopReason = """the best objective improved by less than
+                {:.1%} in the last {} rounds""".format(self.minImprovement,
+                                                       self.patience)
+        return bool(self.stopReason)
+
+    def next_batch(self):
+        """returns a sorted list of the next k values to assemble, or an empty
+        list if the search is done"""
+        if self.stopped():
+            return []
+        lo, hi = self.bracket()
+        best = self.best
+        #the ends of the bracket are only fences if they were assembled
+        left = lo if lo in self.results else lo - 2
+        right = hi if hi in self.results else hi + 2
+        points = sorted([left, right] + [k for k in self.results if lo < k < hi])
+        size = self.batchSize
+        if self.maxAssemblies is not None:
+            size = min(size, self.maxAssemblies - len(self.results))
+        batch = []
+        while len(batch) < size:
+            #the gap with the most k values left in it
+            gaps = [(b - a, a, b) for a, b in zip(points, points[1:]) if b - a > 2]
+            if not gaps:
+                break
+            width, a, b = max(gaps, key=lambda x: (x[0], -x[1]))
+            if best is not None and abs(b - best) < abs(a - best):
+                k = nearest_odd(b - GOLDEN * width)
+            else:
+                k = nearest_odd(a + GOLDEN * width)
+            k = min(max(k, a + 2), b - 2)
+            batch.append(k)
+            points = sorted(points + [k])
+        return sorted(batch)
+
+    def record(self, results):
+        """adds a dict of {k: objective} for a finished round"""
+        self.results.update(results)
+        best = self.best
+        self.history.append(None if best is None else self.results[best])
@@ -46,16 +46,11 @@ class LibSeq(UserDict):
                   11: "5p_wiggleRoom",
                   12: "3p_wiggleRoom"}
         self.data = {self.indices.get(x): "" for x in self.indices}
-        if configpath:
-            self.originalPath = os.getcwd()
-            self.configDir = os.path.dirname(configpath)
-            #change the directory to utilize relative links in config files
-            os.chdir(self.configDir)
+        #relative paths in config files are relative to the config file. They
+        # are joined to its directory instead of changing into it, since the
+        # working directory is shared by every thread.
+        self.configDir = os.path.dirname(configpath) if configpath else ""
         self.libseq_parse(line)
-        #print(self.data["pairs"])
-        if configpath:
-            #change the directory back to what it was
-            os.chdir(self.originalPath)
 
     def libseq_parse(self, line):
         """This method parses a line containing a lib_seq string and adds it to
@@ -97,7 +92,8 @@ class LibSeq(UserDict):
 
         for index in self.indices:
             if index == 1:
-                globs = [os.path.abspath(x.strip()) for x in line[1].split(',') if x]
+                globs = [os.path.abspath(os.path.join(self.configDir, x.strip()))
+                         for x in line[1].split(',') if x]
                 #make sure there are only two filepaths to search for globs
                 if len(globs) != 2:
                     raise ValueError("""ERROR: remember to split your glob
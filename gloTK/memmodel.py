@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: memmodel.py
+authr: darrin schultz
+
+This module:
+  - predicts the peak memory of a Meraculous run from its genome_size,
+    mer_size and the number of bases in its reads, so glotk-sweep only starts
+    as many runs at once as fit in memory
+  - learns from the peaks of finished runs. The observed peaks are kept in
+    gloTK_info/memory_history.yaml, and the predictions are scaled by the
+    largest ratio of observed to modeled memory seen so far.
+
+The model assumes the peak is the k-mer hash from mercount. It holds every
+distinct k-mer of the genome plus the k-mers made by sequencing errors, which
+grow with the number of read bases. Each k-mer costs its packed sequence
+(2 bits per base in 64 bit words) plus its count and the hash table overhead.
+"""
+
+import math
+import os
+import threading
+import zlib
+
+import yaml
+
+#the fraction of read bases that are sequencing errors, each of which makes
+# up to mer_size new k-mers
+ERROR_RATE = 0.005
+
+#bytes of count and hash table overhead for each k-mer
+MER_OVERHEAD = 16
+
+#memory used by a run no matter how small
+BASE_GB = 1.0
+
+#predictions are this much larger than the model times what history tells us
+SAFETY = 1.25
+
+#the number of bytes of each read file decompressed to estimate its bases
+SAMPLE_BYTES = 4 * 1024 * 1024
+
+def sample_fastq(path, sampleBytes=SAMPLE_BYTES):
+    """returns (data, consumed), the first `sampleBytes` or so of fastq in a
+    file and the number of bytes of the file they came from. gzip files are
+    decompressed member by member so that `consumed` is exact."""
+    with open(path, "rb") as raw:
+        if not path.endswith(".gz"):
+            data = raw.read(sampleBytes)
+            return data, len(data)
+        out = []
+        outSize = 0
+        consumed = 0
+        decompressor = zlib.decompressobj(31)
+        while outSize < sampleBytes:
+            chunk = raw.read(65536)
+            if not chunk:
+                break
+            while chunk:
+                out.append(decompressor.decompress(chunk))
+                outSize += len(out[-1])
+                if decompressor.eof:
+                    consumed += len(chunk) - len(decompressor.unused_data)
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(31)
+                else:
+                    consumed += len(chunk)
+                    chunk = b""
+        return b"".join(out), consumed
+
+def file_bases(path, sampleBytes=SAMPLE_BYTES):
+    """estimates the number of bases in a fastq file from its size and the
+    bases per byte of its first `sampleBytes` of fastq"""
+    size = os.path.getsize(path)
+    if not size:
+        return 0
+    data, consumed = sample_fastq(path, sampleBytes)
+    #the records at the end of the sample may be cut off
+    lines = data.split(b"\n")
+    lines = lines[:len(lines) - 1 - (len(lines) - 1) % 4]
+    if not lines:
+        return 0
+    bases = sum(len(x) for x in lines[1::4])
+    if consumed >= size:
+        return bases
+    recordBytes = sum(len(x) + 1 for x in lines)
+    return int(bases / recordBytes * len(data) / consumed * size)
+
+def read_bases(lib_seqs, sampleBytes=SAMPLE_BYTES):
+    """estimates the number of read bases in a list of lib_seqs"""
+    return sum(file_bases(path, sampleBytes)
+               for lib_seq in lib_seqs
+               for pair in lib_seq["pairs"]
+               for path in pair)
+
+def model_gb(genomeSize, merSize, readBases):
+    """returns the peak memory of a Meraculous run in GB according to the
+    model. genomeSize is in Gbp, like genome_size in a Meraculous config."""
+    mers = genomeSize * 1e9 + readBases * ERROR_RATE * merSize
+    bytesPerMer = 8 * math.ceil(merSize / 32) + MER_OVERHEAD
+    return BASE_GB + mers * bytesPerMer / 1024**3
+
+class MemoryModel:
+    """
+    This class predicts the peak memory of Meraculous runs and learns from
+    the peaks of the runs that finish.
+
+    Useage example:
+    model = MemoryModel("gloTK_info/memory_history.yaml")
+    mem = model.predict(genomeSize, merSize, readBases)
+    ...
+    model.observe(runName, genomeSize, merSize, readBases, peakGB)
+
+    The history yaml file maps run names to their genome_size, mer_size,
+    read_bases, model_gb and peak_gb. Observations can come from several
+    threads at once.
+    """
+    def __init__(self, historyPath):
+        self.historyPath = historyPath
+        self.history = {}
+        self._lock = threading.Lock()
+        if os.path.exists(historyPath):
+            with open(historyPath) as f:
+                self.history = yaml.safe_load(f) or {}
+
+    def factor(self):
+        """returns the largest ratio of observed to modeled peak memory, or 1
+        if nothing has been observed"""
+        ratios = [x["peak_gb"] / x["model_gb"] for x in self.history.values()
+                  if x.get("model_gb")]
+        return max(ratios) if ratios else 1.0
+
+    def predict(self, genomeSize, merSize, readBases):
+        """returns the predicted peak memory of a run in GB"""
+        return model_gb(genomeSize, merSize, readBases) * self.factor() * SAFETY
+
+    def observe(self, runName, genomeSize, merSize, readBases, peakGB):
+        """records the peak memory of a finished run and saves the history"""
+        if peakGB <= 0:
+            return
+        with self._lock:
+            self.history[runName] = {
+                "genome_size": float(genomeSize),
+                "mer_size": int(merSize),
+                "read_bases": int(readBases),
+                "model_gb": model_gb(genomeSize, merSize, readBases),
+                "peak_gb": float(peakGB)}
+            self.save()
+
+    def save(self):
+        """writes the history, replacing the old file only once it is
+        complete"""
+        tmpPath = self.historyPath + ".tmp"
+        with open(tmpPath, "w") as f:
+            f.write(yaml.safe_dump(self.history, default_flow_style=False))
+        os.replace(tmpPath, self.historyPath)
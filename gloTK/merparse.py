@@ -33,6 +33,7 @@ This program will do a few things:
    parameter range so that the user can find the optimum assembly.
 """
 from .libseq import LibSeq
+from .readimport import import_reads
 from collections import UserDict
 from numbers import Number
 from time import strftime as tfmt
@@ -183,7 +184,7 @@ class MerParse:
         3. return dict of {"<run string>": "<config abs path>"}
         """
         # 1. check if configs directory exists, if not, make it
-        config_dir = os.path.join(os.getcwd(), "configs")
+        config_dir = os.path.join(self.cwd, "configs")
         if not os.path.exists(config_dir):
             os.makedirs(config_dir)
 
@@ -308,32 +309,40 @@ class ConfigParse:
         with open(outFile,'w') as myfile:
             print(yaml.dump(self.params), file=myfile)
 
-    def sym_reads_new_config(self, newDir, sym=False, mv=False):
+    def sym_reads_new_config(self, newDir, sym=False, mv=False, strategy=None,
+                             procs=1, verify=True, skip=()):
         """This moves the read files and renames the glob, outputs a new
-        ConfigParse object with updated values"""
+        ConfigParse object with updated values.
+
+        If sym is True the reads are symlinked into newDir. Otherwise strategy
+        can be "symlink", "hardlink", "reflink" or "copy" to import the reads
+        that way in `procs` processes. Copies are checked against the original
+        if verify is True, and an interrupted import picks up where it
+        stopped when this is called again with the same newDir. The files in
+        newDir that are listed in skip, like reads that were recompressed after
+        they were imported, are left as they are. See readimport.py for
+        details."""
+        if sym and strategy is None:
+            strategy = "symlink"
         newParams = copy.copy(self)
+        jobs = []
         for i in range(0,len(self.params["lib_seq"])):
             lib_seq = self.params["lib_seq"][i]
             #update the glob
             newParams.params["lib_seq"][i]["globs"] = [os.path.join(
                 newDir,os.path.basename(x)) for x in lib_seq["globs"]]
-            #now update the file paths and move/symlink if necessary
+            #now update the file paths and queue them up to be imported
             for j in range(0, len(lib_seq["pairs"])):
                 forward, reverse = lib_seq["pairs"][j]
                 new_forward = os.path.join(newDir, os.path.basename(forward))
                 new_reverse = os.path.join(newDir, os.path.basename(reverse))
-                #move or symlink the files
-                if sym:
-                    for each in [new_forward, new_reverse]:
-                        if os.path.exists(each):
-                            raise ValueError("""Attempted to make a symlink for
-                            a reads file, but it already exists. Chances are
-                            that you used the same reads for two lines in the
-                            Meraculous config file""")
-                    os.symlink(forward, new_forward)
-                    os.symlink(reverse, new_reverse)
+                jobs += [(forward, new_forward), (reverse, new_reverse)]
                 #update the reads in the new config
                 newParams.params["lib_seq"][i]["pairs"][j] = [new_forward, new_reverse]
+        #symlink, link or copy the files all at once
+        if strategy:
+            import_reads([x for x in jobs if x[1] not in skip],
+                         strategy, procs, verify)
         return newParams
 
     def assign(self, dict_name, key, value):
@@ -29,6 +29,34 @@ import shutil
 import markdown
 from mdx_gfm import GithubFlavoredMarkdownExtension
 
+#the fasta files that stats() measures, in the order they are looked for.
+# The final results directory only has the scaffolds once the run finishes.
+ASSEMBLY_FILES = {"scaffold": ["meraculous_final_results/final.scaffolds.fa",
+                               "meraculous_gap_closure/final.scaffolds.fa"],
+                  "contig":   ["meraculous_gap_closure/final.contigs.fa"],
+                  "uutig":    ["meraculous_contigs/UUtigs.fa"]}
+
+def fasta_lengths(path):
+    """returns a list of the lengths of the sequences in a fasta file"""
+    lengths = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith(">"):
+                lengths.append(0)
+            elif lengths:
+                lengths[-1] += len(line.strip())
+    return lengths
+
+def n50(lengths):
+    """returns the length of the sequence that the longest sequences have to
+    reach down to in order to cover half of the total length"""
+    half = sum(lengths) / 2
+    total = 0
+    for length in sorted(lengths, reverse=True):
+        total += length
+        if total >= half:
+            return length
+    return 0
 
 class MerRunAnalyzer:
     """This class generates a report for one meraculous run. It requires a run
@@ -116,6 +144,21 @@ class MerRunAnalyzer:
                 if False not in done.values():
                     break
 
+    def stats(self):
+        """Returns a dict of the N50 and total length of the scaffolds, contigs
+        and UUtigs of the run, like {"scaffold_n50": 200200, ...}. Unlike the
+        fasta_stats in the report these are numbers that the sweep can
+        compare. Files that the run hasn't made yet are left out."""
+        stats = {}
+        for kind, paths in ASSEMBLY_FILES.items():
+            for path in [os.path.join(self.home, x) for x in paths]:
+                if os.path.exists(path):
+                    lengths = fasta_lengths(path)
+                    stats["{}_n50".format(kind)] = n50(lengths)
+                    stats["{}_total".format(kind)] = sum(lengths)
+                    break
+        return stats
+
     def _str_ripper(self, text):
         """Got this code from here:
         http://stackoverflow.com/questions/6116978/python-replace-multiple-strings
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: preflight.py
+authr: darrin schultz
+
+This module:
+  - profiles a sample of read pairs from a library before any preprocessing
+    is done. The profile has the fraction of pairs with adapters, the
+    fraction that overlap enough to be merged, the duplication rate, and how
+    many reads drop off in quality at the 3' end.
+  - turns the profile into a plan of which preprocessing steps are worth
+    running, so that libraries without adapters aren't trimmed, libraries
+    with long inserts aren't merged, and so on
+  - defines Preprocessor, which runs only the steps in a plan in one pass
+
+The sample is the first sampleSize pairs of the files, so it is cheap to
+take. The duplication rate of the sample is a lower bound on that of the
+whole library, since the chance of a pair having a duplicate grows with the
+number of pairs.
+"""
+
+import itertools
+from collections import Counter
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+import yaml
+
+from gloTK import fastq
+from gloTK import utils
+from gloTK.dedup import Deduplicator, pair_fingerprints
+from gloTK.readmerge import best_offsets, PairMerger, reverse_complement
+from gloTK.readprep import adapter_starts, AdapterTrimmer, DEFAULT_FOR_ADAPTER, \
+    DEFAULT_REV_ADAPTER, LengthFilter, PrepRunner, quality_window_ends, \
+    QualityTrimmer
+
+#the default settings for profiling, and the fractions of pairs above which
+# each step is worth running
+DEFAULT_SETTINGS = {"forAdapter": DEFAULT_FOR_ADAPTER,
+                    "revAdapter": DEFAULT_REV_ADAPTER,
+                    "overlapMin": 30,
+                    "mergeMismatch": 0.1,
+                    "windowSize": 4,
+                    "windowQual": 20,
+                    "minAdapterRate": 0.01,
+                    "minOverlapFraction": 0.05,
+                    "minDuplicationRate": 0.02,
+                    "minQualityDropRate": 0.05}
+
+def _profile_chunk(settings, chunk):
+    """profiles one batch of raw pairs. Returns (counts, qualSums, qualCounts,
+    fingerprints)."""
+    pair = fastq.PairBlock.from_bytes(*chunk)
+    counts = Counter(pairs=len(pair))
+    adapter = np.zeros(len(pair), dtype=bool)
+    dropped = np.zeros(len(pair), dtype=bool)
+    for block, sequence in [(pair.forward, settings["forAdapter"]),
+                            (pair.reverse, settings["revAdapter"])]:
+        starts = adapter_starts(block, fastq.encode(sequence))
+        adapter |= starts < block.lengths
+        ends = quality_window_ends(block, settings["windowSize"],
+                                   settings["windowQual"])
+        dropped |= ends < block.lengths
+        block.lengths = starts
+    counts["adapterPairs"] = int(np.sum(adapter))
+    counts["qualityDropPairs"] = int(np.sum(dropped))
+    #the overlaps are found after adapter trimming, like in readprep.Trimmer
+    reverseSeq, reverseQual = reverse_complement(pair.reverse)
+    offsets, found = best_offsets(pair.forward, reverseSeq, pair.reverse.lengths,
+                                  settings["overlapMin"],
+                                  settings["mergeMismatch"])
+    counts["overlapPairs"] = int(np.sum(found))
+    #the mean quality at each position of the untrimmed forward reads
+    raw = fastq.ReadBlock.from_bytes(chunk[0])
+    inRead = np.arange(raw.qual.shape[1]) < raw.lengths[:, None]
+    qualSums = np.where(inRead, raw.qual.astype(np.int64) - fastq.PHRED_OFFSET, 0).sum(axis=0)
+    qualCounts = inRead.sum(axis=0)
+    return (counts, qualSums, qualCounts, pair_fingerprints(fastq.PairBlock(
+        raw, fastq.ReadBlock.from_bytes(chunk[1]))))
+
+class ReadProfile:
+    """
+    This class profiles a sample of the read pairs of one library.
+
+    Useage example:
+    profile = ReadProfile([(forwardPath, reversePath)], sampleSize=1000000, procs=8)
+    profile.plan   -> {"trim": True, "qualityTrim": False, "merge": True,
+                       "dedup": False}
+
+    pairs is a list of (forwardPath, reversePath) tuples for the files of the
+    library. The sample is split evenly between them. Any of the keys of
+    DEFAULT_SETTINGS can be given as keyword arguments.
+
+    After profiling, the attributes are:
+      - sampled          - the number of pairs in the sample
+      - adapterRate      - fraction of pairs where either mate has an adapter
+      - overlapFraction  - fraction of pairs that overlap by at least
+                           overlapMin bases after adapter trimming
+      - duplicationRate  - fraction of pairs that are exact duplicates of an
+                           earlier pair in the sample
+      - qualityDropRate  - fraction of pairs where either mate would be
+                           quality trimmed with windowSize and windowQual
+      - meanQuality      - numpy array of the mean phred quality at each
+                           position of the forward reads
+      - plan             - dict of which steps are worth running
+    """
+    def __init__(self, pairs, sampleSize=1000000, procs=1,
+                 batchSize=fastq.BATCH_SIZE, **kwargs):
+        self.pairs = pairs
+        self.sampleSize = sampleSize
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(kwargs)
+        batchSize = min(batchSize, max(1, sampleSize))
+        perFile = max(1, sampleSize // max(1, len(pairs)))
+        chunks = itertools.chain.from_iterable(
+            itertools.islice(fastq.paired_chunks(forward, reverse, batchSize),
+                             max(1, -(-perFile // batchSize)))
+            for forward, reverse in pairs)
+        func = partial(_profile_chunk, self.settings)
+        if procs > 1:
+            with Pool(procs) as pool:
+                self._collect(utils.bounded_imap(pool, func, chunks, 2 * procs))
+        else:
+            self._collect(map(func, chunks))
+        self.plan = self.make_plan()
+
+    def _collect(self, results):
+        counts = Counter()
+        hists = {"qualSums": np.zeros(0, dtype=np.int64),
+                 "qualCounts": np.zeros(0, dtype=np.int64)}
+        seen = set()
+        duplicates = 0
+        for batchCounts, qualSums, qualCounts, fingerprints in results:
+            counts.update(batchCounts)
+            fastq.add_counts(hists, "qualSums", qualSums)
+            fastq.add_counts(hists, "qualCounts", qualCounts)
+            for fingerprint in fingerprints.tolist():
+                if fingerprint in seen:
+                    duplicates += 1
+                else:
+                    seen.add(fingerprint)
+        self.sampled = counts["pairs"]
+        sampled = max(1, self.sampled)
+        self.adapterRate = counts["adapterPairs"] / sampled
+        self.overlapFraction = counts["overlapPairs"] / sampled
+        self.qualityDropRate = counts["qualityDropPairs"] / sampled
+        self.duplicationRate = duplicates / sampled
+        self.meanQuality = hists["qualSums"] / np.maximum(hists["qualCounts"], 1)
+
+    def make_plan(self):
+        """returns a dict of which preprocessing steps to run"""
+        return {"trim": self.adapterRate >= self.settings["minAdapterRate"],
+                "qualityTrim": self.qualityDropRate >= self.settings["minQualityDropRate"],
+                "merge": self.overlapFraction >= self.settings["minOverlapFraction"],
+                "dedup": self.duplicationRate >= self.settings["minDuplicationRate"]}
+
+    def report(self):
+        """returns the profile as a dict that can be saved as yaml"""
+        return {"files": [list(x) for x in self.pairs],
+                "sampled": self.sampled,
+                "adapterRate": float(self.adapterRate),
+                "overlapFraction": float(self.overlapFraction),
+                "duplicationRate": float(self.duplicationRate),
+                "qualityDropRate": float(self.qualityDropRate),
+                "meanQuality": [round(float(x), 2) for x in self.meanQuality],
+                "plan": {x: bool(self.plan[x]) for x in self.plan}}
+
+    def save_yaml(self, outFile):
+        """saves the profile and plan to a yaml file"""
+        with open(outFile, "w") as f:
+            print(yaml.dump(self.report(), default_flow_style=False), file=f)
+
+def plan_stages(plan, merging=True, **kwargs):
+    """returns the readprep stages for a plan. Deduplication comes first so
+    that exact duplicates are found before trimming changes the reads, and
+    the rest of the stages run in the worker processes after it. PairMerger
+    is only added if `merging` is True, since the merged reads need a file to
+    go to. Keyword arguments are the same as readprep.Trimmer's."""
+    stages = []
+    if plan.get("dedup"):
+        stages.append(Deduplicator(kwargs.get("maxPairs", 20000000),
+                                   kwargs.get("tmpDir")))
+    if plan.get("trim"):
+        stages.append(AdapterTrimmer(kwargs.get("forAdapter", DEFAULT_FOR_ADAPTER),
+                                     kwargs.get("revAdapter", DEFAULT_REV_ADAPTER),
+                                     kwargs.get("qualCutoff", 13),
+                                     kwargs.get("adapterOverlap", 10),
+                                     kwargs.get("adapterMismatch", 0.13)))
+    if plan.get("qualityTrim"):
+        stages.append(QualityTrimmer(kwargs.get("windowSize", 4),
+                                     kwargs.get("windowQual", 20)))
+    if plan.get("merge") and merging:
+        stages.append(PairMerger(kwargs.get("overlapMin", 30),
+                                 kwargs.get("mergeMismatch", 0.1)))
+    if plan.get("trim") or plan.get("qualityTrim"):
+        stages.append(LengthFilter(kwargs.get("lenCutoff", 30)))
+    return stages
+
+class Preprocessor(PrepRunner):
+    """
+    usage: Preprocessor(required_args, other_args)
+
+    Runs only the preprocessing steps that a plan calls for on one pair of
+    read files. If no plan is given the files are profiled first. The
+    preprocessing runs as soon as the class is instantiated.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      forwardOutFile <first read output fastq filename>
+      reverseOutFile <second read output fastq filename>
+      outDir         <directory where files will be saved>
+
+    Optional Arguments:
+      plan           <a dict like ReadProfile.plan>
+      sampleSize     <number of pairs to profile if there is no plan;
+                       default = 1000000>
+      mergedOutFile  <file for the merged reads. Without it pairs are never
+                       merged, even if the plan says to>
+      procs          <number of worker processes; default = 1>
+      batchSize      <number of read pairs given to a worker at once;
+                       default = 20000>
+
+    Any of the trimming, merging and dedup arguments of readprep.Trimmer and
+    dedup.Dedup can also be given, and a missing plan is made by profiling
+    with the same adapters, windowSize, windowQual, overlapMin and
+    mergeMismatch that the steps use. The plan is saved in the log. If the
+    plan doesn't call for any steps the reads still go through the pipeline
+    unchanged and are written as BGZF.
+    """
+    def __init__(self, **kwargs):
+        self.init("glotk_preprocess", **kwargs)
+        self.plan = kwargs.get("plan")
+        if self.plan is None:
+            settings = {x: kwargs[x] for x in DEFAULT_SETTINGS if x in kwargs}
+            self.plan = ReadProfile([(self.forwardPath, self.reversePath)],
+                                    kwargs.get("sampleSize", 1000000),
+                                    self.procs, self.batchSize, **settings).plan
+        self.stages += plan_stages(self.plan, bool(self.mergedOutFile), **kwargs)
+        if not any(isinstance(x, PairMerger) for x in self.stages):
+            self.mergedOutFile = None
+        self.run()
+
+    def report(self):
+        return {"plan": ",".join(x for x in sorted(self.plan) if self.plan[x]) or "none"}
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: readimport.py
+authr: darrin schultz
+
+This module:
+  - imports read files into a gloTK project directory with one of four
+    strategies:
+      - symlink  - link to the original file (the old behavior)
+      - hardlink - another name for the same file. Only works on the same
+                   filesystem.
+      - reflink  - a copy-on-write clone, which is instant on filesystems that
+                   support it (btrfs, XFS). Falls back to copying elsewhere,
+                   like `cp --reflink=auto`.
+      - copy     - copy the data, for example from slow archival storage to
+                   fast local scratch
+  - runs the imports in a pool of processes, so several files are copied at
+    once
+  - verifies copies by fingerprinting the source while it is copied and the
+    copy afterwards (see fingerprint.py)
+  - resumes interrupted imports. Copies are written to <file>.part and only
+    renamed when they are complete and verified. A finished copy has the
+    size and mtime of its source, so it is skipped when the import is run
+    again, and a .part file is continued from where it stopped.
+"""
+
+import errno
+import fcntl
+import os
+import shutil
+from multiprocessing import Pool
+
+from gloTK import fingerprint
+
+STRATEGIES = ["symlink", "hardlink", "reflink", "copy"]
+
+#the Linux ioctl that clones a file, from linux/fs.h
+FICLONE = 0x40049409
+
+def is_imported(source, dest, strategy):
+    """returns True if dest is already a finished import of source"""
+    if strategy == "symlink":
+        return os.path.islink(dest) and \
+            os.path.abspath(os.readlink(dest)) == os.path.abspath(source)
+    if not os.path.exists(dest):
+        return False
+    if strategy == "hardlink":
+        return os.path.samefile(source, dest)
+    sourceStat = os.stat(source)
+    destStat = os.stat(dest)
+    return (sourceStat.st_size, sourceStat.st_mtime_ns) == \
+        (destStat.st_size, destStat.st_mtime_ns)
+
+def reflink(source, dest):
+    """clones source to dest. Returns False if the filesystem can't."""
+    with open(source, "rb") as sourceHandle, open(dest, "wb") as destHandle:
+        try:
+            fcntl.ioctl(destHandle.fileno(), FICLONE, sourceHandle.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL,
+                               errno.ENOTTY, errno.EBADF):
+                raise
+    os.remove(dest)
+    return False
+
+def copy(source, dest, verify=True):
+    """copies source to dest through dest.part, continuing a .part file left
+    by an interrupted copy. Returns the fingerprint of the source if it was
+    computed while copying, or None."""
+    part = dest + ".part"
+    done = os.path.getsize(part) if os.path.exists(part) else 0
+    if done > os.path.getsize(source):
+        os.remove(part)
+        done = 0
+    hasher = fingerprint.ChunkHasher() if (verify and not done) else None
+    with open(source, "rb") as sourceHandle, open(part, "ab") as partHandle:
+        sourceHandle.seek(done)
+        while True:
+            data = sourceHandle.read(fingerprint.READ_SIZE)
+            if not data:
+                break
+            partHandle.write(data)
+            if hasher:
+                hasher.update(data)
+    return hasher.hexdigest() if hasher else None
+
+def import_file(job):
+    """imports one file. job is (source, dest, strategy, verify). Returns
+    (dest, action, error) where action says what was done."""
+    source, dest, strategy, verify = job
+    try:
+        if is_imported(source, dest, strategy):
+            return (dest, "skipped", None)
+        if os.path.lexists(dest):
+            return (dest, None, """ERROR: {} already exists and is not an
+            import of {}""".format(dest, source))
+        if strategy == "symlink":
+            os.symlink(source, dest)
+            return (dest, "symlinked", None)
+        if strategy == "hardlink":
+            os.link(source, dest)
+            return (dest, "hardlinked", None)
+        part = dest + ".part"
+        sourcePrint = None
+        action = "copied"
+        #don't clone over a .part file left by an interrupted copy
+        if (strategy == "reflink") and not os.path.exists(part) and \
+           reflink(source, part):
+            action = "reflinked"
+        else:
+            sourcePrint = copy(source, dest, verify)
+        if verify:
+            if sourcePrint is None:
+                sourcePrint = fingerprint.fingerprint_files([source])[os.path.abspath(source)]
+            partPrint = fingerprint.fingerprint_files([part])[os.path.abspath(part)]
+            if partPrint != sourcePrint:
+                os.remove(part)
+                return (dest, None, """ERROR: the copy of {} did not match the
+                original. It was deleted, so run the import again.""".format(source))
+        shutil.copystat(source, part)
+        os.replace(part, dest)
+        return (dest, action, None)
+    except OSError as e:
+        return (dest, None, "ERROR: could not import {} to {}: {}".format(
+            source, dest, e))
+
+def import_reads(jobs, strategy="symlink", procs=1, verify=True):
+    """Imports a list of (source, dest) files with one strategy in a pool of
+    `procs` processes. Raises a ValueError for the first file that fails.
+    Returns a dict of what was done to each dest."""
+    if strategy not in STRATEGIES:
+        raise ValueError("""ERROR: {} is not a read import strategy. Choose one
+        of {}""".format(strategy, STRATEGIES))
+    dests = [dest for source, dest in jobs]
+    duplicates = sorted(set(x for x in dests if dests.count(x) > 1))
+    if duplicates:
+        raise ValueError("""Attempted to import reads to {} more than once.
+        Chances are that you used the same reads for two lines in the
+        Meraculous config file""".format(duplicates))
+    actions = {}
+    work = [(source, dest, strategy, verify) for source, dest in jobs]
+    with Pool(max(1, min(procs, len(work)))) as pool:
+        for dest, action, error in pool.imap_unordered(import_file, work):
+            if error:
+                pool.terminate()
+                raise ValueError(error)
+            actions[dest] = action
+    return actions
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: readmerge.py
+authr: darrin schultz
+
+This module:
+  - merges overlapping read pairs into single reads, like the mergedOutFile
+    option of SeqPrep2. PairMerger is a readprep stage so it runs on batches
+    of pairs in the ReadPipeline worker processes.
+  - records the insert size of every merged pair as a by-product
+
+All of the coordinates here are in forward read coordinates. If the reverse
+complement of the reverse read starts at `offset` in the forward read, the
+insert is offset + len(reverse) bases long. The offset is negative when the
+insert is shorter than the reverse read (the reads ran into the adapter).
+"""
+
+import numpy as np
+
+from gloTK import fastq
+
+#complement lookup table for the uint8 base encoding in fastq.ReadBlock
+COMPLEMENT = np.arange(256, dtype=np.uint8)
+for _base, _comp in zip(b"ACGTNacgtn", b"TGCANtgcan"):
+    COMPLEMENT[_base] = _comp
+
+N = ord("N")
+
+def reverse_complement(block):
+    """returns the (seq, qual) matrices of a ReadBlock reverse complemented.
+    Each row is reversed within its own length and left aligned."""
+    n, width = block.seq.shape
+    cols = block.lengths[:, None] - 1 - np.arange(width)
+    inRead = cols >= 0
+    cols = np.clip(cols, 0, max(width - 1, 0))
+    seq = np.where(inRead, COMPLEMENT[np.take_along_axis(block.seq, cols, axis=1)], 0)
+    qual = np.where(inRead, np.take_along_axis(block.qual, cols, axis=1), 0)
+    return seq.astype(np.uint8), qual.astype(np.uint8)
+
+def best_offsets(forward, reverseSeq, reverseLengths, overlapMin=30,
+                 maxMismatch=0.1):
+    """Finds the best overlap between every forward read and the reverse
+    complement of its mate.
+
+    Every candidate offset is scanned for the whole batch at once by shifting
+    the reverse complement matrix against the forward matrix and counting the
+    mismatches (the Hamming distance) in the overlap. Ns are not counted as
+    bases of the overlap. The best offset for a pair is the one with the lowest
+    mismatch rate, breaking ties by the longer overlap, among the offsets with
+    at least `overlapMin` bases of overlap and a mismatch rate no more than
+    `maxMismatch`.
+
+    Returns (offsets, found), where found is False for pairs with no
+    acceptable overlap.
+    """
+    n, width1 = forward.seq.shape
+    width2 = reverseSeq.shape[1]
+    bestRate = np.full(n, np.inf)
+    bestOverlap = np.zeros(n, dtype=np.int64)
+    offsets = np.zeros(n, dtype=np.int64)
+    cols = np.arange(width1)
+    for d in range(overlapMin - width2, width1 - overlapMin + 1):
+        lo = max(0, d)
+        hi = min(width1, width2 + d)
+        if hi - lo < overlapMin:
+            continue
+        a = forward.seq[:, lo:hi]
+        b = reverseSeq[:, lo - d:hi - d]
+        c = cols[lo:hi]
+        valid = (c < forward.lengths[:, None]) & \
+                (c - d < reverseLengths[:, None]) & (a != N) & (b != N)
+        overlap = valid.sum(axis=1)
+        mismatches = ((a != b) & valid).sum(axis=1)
+        rate = mismatches / np.maximum(overlap, 1)
+        better = (overlap >= overlapMin) & (rate <= maxMismatch) & \
+                 ((rate < bestRate) | ((rate == bestRate) & (overlap > bestOverlap)))
+        bestRate[better] = rate[better]
+        bestOverlap[better] = overlap[better]
+        offsets[better] = d
+    return offsets, np.isfinite(bestRate)
+
+def consensus(forward, reverseSeq, reverseQual, reverseLengths, offsets):
+    """Builds the merged reads for pairs whose reverse complement starts at
+    `offsets` in the forward read. Where only one read covers a position its
+    base is used. Where both reads agree the higher quality is kept, and where
+    they disagree the higher quality base is kept with the difference of the
+    two qualities as its quality.
+
+    Returns a ReadBlock named after the forward reads.
+    """
+    insertSizes = offsets + reverseLengths
+    width = int(insertSizes.max()) if len(insertSizes) else 0
+    pos = np.arange(width)
+    inMerged = pos < insertSizes[:, None]
+    #the forward read at each merged position
+    in1 = inMerged & (pos < forward.lengths[:, None])
+    cols1 = np.clip(pos, 0, max(forward.seq.shape[1] - 1, 0))[None, :].repeat(len(offsets), 0)
+    base1 = np.where(in1, np.take_along_axis(forward.seq, cols1, axis=1), 0)
+    qual1 = np.where(in1, np.take_along_axis(forward.qual, cols1, axis=1), 0)
+    #the reverse complement at each merged position
+    j = pos - offsets[:, None]
+    in2 = inMerged & (j >= 0) & (j < reverseLengths[:, None])
+    cols2 = np.clip(j, 0, max(reverseSeq.shape[1] - 1, 0))
+    base2 = np.where(in2, np.take_along_axis(reverseSeq, cols2, axis=1), 0)
+    qual2 = np.where(in2, np.take_along_axis(reverseQual, cols2, axis=1), 0)
+    #an N never wins against a called base
+    qual1 = np.where(base1 == N, fastq.PHRED_OFFSET, qual1)
+    qual2 = np.where(base2 == N, fastq.PHRED_OFFSET, qual2)
+    use2 = in2 & (~in1 | (qual2 > qual1))
+    seq = np.where(use2, base2, base1).astype(np.uint8)
+    both = in1 & in2
+    agree = both & (base1 == base2)
+    disagree = both & (base1 != base2)
+    qual = np.where(use2, qual2, qual1).astype(np.int64)
+    qual = np.where(agree, np.maximum(qual1, qual2), qual)
+    qual = np.where(disagree,
+                    np.maximum(np.abs(qual1.astype(np.int64) - qual2), 2) +
+                    fastq.PHRED_OFFSET,
+                    qual)
+    return fastq.ReadBlock(list(forward.names), seq, qual.astype(np.uint8),
+                           insertSizes.astype(np.int64))
+
+class PairMerger:
+    """This stage merges overlapping pairs into single reads. Merged pairs are
+    removed from the forward and reverse blocks and added to pair.merged. The
+    insert size of every merged pair is added to the insertSize histogram."""
+    def __init__(self, overlapMin=30, maxMismatch=0.1):
+        self.overlapMin = overlapMin
+        self.maxMismatch = maxMismatch
+
+    def __call__(self, pair):
+        reverseSeq, reverseQual = reverse_complement(pair.reverse)
+        offsets, found = best_offsets(pair.forward, reverseSeq,
+                                      pair.reverse.lengths, self.overlapMin,
+                                      self.maxMismatch)
+        idx = np.flatnonzero(found)
+        merged = consensus(pair.forward.subset(idx), reverseSeq[idx],
+                           reverseQual[idx], pair.reverse.lengths[idx],
+                           offsets[idx])
+        pair.count("pairsMerged", len(idx))
+        pair.histogram("insertSize", merged.lengths)
+        pair.merged = merged
+        pair.keep(~found)
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: readprep.py
+authr: darrin schultz
+
+This module:
+  - defines ReadPipeline, which streams a pair of fastq files through a list
+    of stages. Batches of read pairs are parsed, processed and gzipped in a
+    pool of worker processes and written back to disk in their original
+    order, so the input is only read once no matter how many stages there are.
+  - defines the read trimming stages: 3' adapter trimming, sliding window
+    quality trimming and length filtering, and the Illumina 8-level quality
+    binning stage
+  - defines Trimmer, an in-process replacement for the wrappers.Seqprep class.
+    It takes the same arguments for trimming and merging and writes the same
+    output files.
+  - defines prep_config, which runs a PrepRunner on every read pair in a
+    Meraculous config and makes a new config that points to the output
+  - defines Binner and bin_config, which only bin the qualities
+
+A stage is any picklable object with a __call__(pair) method that modifies a
+fastq.PairBlock in place. Stages run in the worker processes unless they set
+the class attribute `parallel = False`, in which case they run in the parent
+process on every batch in order. This is for stages that need to see every
+read, like deduplication. A parent side stage can also have a flush() method
+that yields PairBlocks it held back, which is called once all of the input
+has been read.
+"""
+
+import copy
+import os
+from collections import Counter
+from multiprocessing import Pool
+
+import numpy as np
+
+from gloTK import bgzf
+from gloTK import fastq
+from gloTK import utils
+from gloTK.readmerge import PairMerger
+
+#the SeqPrep2 defaults, also used by wrappers.Seqprep
+DEFAULT_FOR_ADAPTER = "AGATCGGAAGAGCACACGTC"
+DEFAULT_REV_ADAPTER = "AGATCGGAAGAGCGTCGTGT"
+
+def adapter_starts(block, adapter, qualCutoff=13, minOverlap=10,
+                   maxMismatch=0.13):
+    """Finds the 3' adapter in every read of a fastq.ReadBlock.
+
+    The adapter is aligned at every offset of every read at once, one adapter
+    base at a time. A read matches at an offset if at least `minOverlap` bases
+    of the adapter overlap the read there (the adapter may run off the 3' end)
+    and no more than `maxMismatch` of the overlapping bases mismatch. Like
+    SeqPrep2, mismatches at bases with a quality below `qualCutoff` are not
+    counted.
+
+    Returns an array with the position of the first match in each read, or
+    the read length if the read has no adapter.
+    """
+    n, width = block.seq.shape
+    m = len(adapter)
+    if (n == 0) or (width == 0) or (m == 0):
+        return block.lengths.copy()
+    #pad the right side so that the adapter can hang off the end of the read
+    seq = np.zeros((n, width + m), dtype=np.uint8)
+    seq[:, :width] = block.seq
+    counted = np.zeros((n, width + m), dtype=bool)
+    counted[:, :width] = (block.qual >= qualCutoff + fastq.PHRED_OFFSET) & \
+        (np.arange(width) < block.lengths[:, None])
+    mismatches = np.zeros((n, width), dtype=np.int32)
+    for j in range(m):
+        mismatches += (seq[:, j:j + width] != adapter[j]) & counted[:, j:j + width]
+    overlap = np.clip(block.lengths[:, None] - np.arange(width), 0, m)
+    hits = (overlap >= min(minOverlap, m)) & \
+        (mismatches <= np.floor(overlap * maxMismatch))
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), block.lengths)
+
+class AdapterTrimmer:
+    """This stage trims the 3' adapter and everything after it from both
+    mates. See adapter_starts() for the matching rules."""
+    def __init__(self, forAdapter=DEFAULT_FOR_ADAPTER,
+                 revAdapter=DEFAULT_REV_ADAPTER, qualCutoff=13,
+                 minOverlap=10, maxMismatch=0.13):
+        self.forAdapter = fastq.encode(forAdapter)
+        self.revAdapter = fastq.encode(revAdapter)
+        self.qualCutoff = qualCutoff
+        self.minOverlap = minOverlap
+        self.maxMismatch = maxMismatch
+
+    def __call__(self, pair):
+        for key, block, adapter in [("forward", pair.forward, self.forAdapter),
+                                    ("reverse", pair.reverse, self.revAdapter)]:
+            starts = adapter_starts(block, adapter, self.qualCutoff,
+                                    self.minOverlap, self.maxMismatch)
+            pair.count("{}AdapterTrimmed".format(key),
+                       np.sum(starts < block.lengths))
+            block.lengths = starts
+
+def quality_window_ends(block, windowSize=4, windowQual=20):
+    """Finds where to cut each read of a fastq.ReadBlock with a sliding window,
+    like Trimmomatic's SLIDINGWINDOW.
+
+    Scanning from the 5' end, the read is cut at the first window of
+    `windowSize` bases whose mean quality is below `windowQual`. The bases at
+    the start of that window are kept up to the first one that is itself below
+    `windowQual`. Window sums for every read come from one cumulative sum over
+    the quality matrix. Windows that would run off the end of a read are not
+    checked, so reads shorter than the window are never trimmed.
+
+    Returns an array with the new length of each read.
+    """
+    n, width = block.qual.shape
+    if (n == 0) or (width < windowSize):
+        return block.lengths.copy()
+    inRead = np.arange(width) < block.lengths[:, None]
+    qual = np.where(inRead, block.qual.astype(np.int32) - fastq.PHRED_OFFSET, 0)
+    csum = np.zeros((n, width + 1), dtype=np.int32)
+    np.cumsum(qual, axis=1, out=csum[:, 1:])
+    #sums[:, s] is the quality sum of the window starting at s
+    sums = csum[:, windowSize:] - csum[:, :-windowSize]
+    starts = np.arange(width - windowSize + 1)
+    fails = (sums < windowQual * windowSize) & \
+            (starts + windowSize <= block.lengths[:, None])
+    hasFail = fails.any(axis=1)
+    first = fails.argmax(axis=1)
+    #keep the good bases at the start of the failing window
+    window = first[:, None] + np.arange(windowSize)
+    low = np.take_along_axis(qual, window, axis=1) < windowQual
+    ends = first + low.argmax(axis=1)
+    return np.where(hasFail, ends, block.lengths)
+
+class QualityTrimmer:
+    """This stage trims the 3' end of both mates with a sliding window. See
+    quality_window_ends() for the trimming rules."""
+    def __init__(self, windowSize=4, windowQual=20):
+        self.windowSize = windowSize
+        self.windowQual = windowQual
+
+    def __call__(self, pair):
+        for key, block in [("forward", pair.forward),
+                           ("reverse", pair.reverse)]:
+            ends = quality_window_ends(block, self.windowSize, self.windowQual)
+            pair.count("{}QualityTrimmed".format(key),
+                       np.sum(ends < block.lengths))
+            pair.count("{}QualityBasesTrimmed".format(key),
+                       np.sum(block.lengths - ends))
+            block.lengths = ends
+
+#The Illumina 8-level binning scheme, as a lookup table from phred+33 quality
+# characters to binned ones. Qualities below 2 are left alone.
+ILLUMINA_BINS = [(2, 9, 6), (10, 19, 15), (20, 24, 22), (25, 29, 27),
+                 (30, 34, 33), (35, 39, 37), (40, 93, 40)]
+BIN_TABLE = np.arange(256, dtype=np.uint8)
+for _low, _high, _binned in ILLUMINA_BINS:
+    BIN_TABLE[_low + fastq.PHRED_OFFSET:_high + fastq.PHRED_OFFSET + 1] = \
+        _binned + fastq.PHRED_OFFSET
+
+class QualityBinner:
+    """This stage replaces the qualities of both mates (and any merged reads)
+    with the Illumina 8-level bins. Meraculous only uses the qualities to
+    compare them to a cutoff, and binned qualities compress much better, so
+    every later pass over the reads has less to decompress."""
+    def __call__(self, pair):
+        for block in [pair.forward, pair.reverse, pair.merged]:
+            if block is not None:
+                binned = BIN_TABLE[block.qual]
+                inRead = np.arange(block.qual.shape[1]) < block.lengths[:, None]
+                pair.count("qualitiesBinned",
+                           np.sum((binned != block.qual) & inRead))
+                block.qual = binned
+
+class LengthFilter:
+    """This stage drops pairs in which either mate is shorter than lenCutoff,
+    and merged reads shorter than lenCutoff"""
+    def __init__(self, lenCutoff=30):
+        self.lenCutoff = lenCutoff
+
+    def __call__(self, pair):
+        keep = (pair.forward.lengths >= self.lenCutoff) & \
+               (pair.reverse.lengths >= self.lenCutoff)
+        pair.count("pairsTooShort", len(pair) - np.sum(keep))
+        pair.keep(keep)
+        if pair.merged is not None:
+            keep = pair.merged.lengths >= self.lenCutoff
+            pair.count("mergedTooShort", len(keep) - np.sum(keep))
+            pair.merged = pair.merged.subset(keep)
+
+#The stages for the worker processes. This is set once per worker by
+# _init_worker() so that the stages aren't pickled along with every batch.
+_workerArgs = None
+
+def _init_worker(headStages, tailStages, compress):
+    global _workerArgs
+    _workerArgs = (headStages, tailStages, compress)
+
+def _worker_head(chunk):
+    return _parse_chunk(_workerArgs[0], chunk)
+
+def _worker_tail(pair):
+    return _format_pair(_workerArgs[1], _workerArgs[2], pair)
+
+def _worker_chunk(chunk):
+    return _format_pair(_workerArgs[1], _workerArgs[2],
+                        _parse_chunk(_workerArgs[0], chunk))
+
+def _parse_chunk(stages, chunk):
+    """parses one batch of raw pairs and runs the stages on it"""
+    pair = fastq.PairBlock.from_bytes(*chunk)
+    pair.count("pairsIn", len(pair))
+    for stage in stages:
+        stage(pair)
+    return pair
+
+def _format_pair(stages, compress, pair):
+    """runs the stages on a batch and returns the formatted forward, reverse and
+    merged output with the stats and histograms for the batch"""
+    for stage in stages:
+        stage(pair)
+    pair.count("pairsOut", len(pair))
+    outputs = [pair.forward.to_output(compress),
+               pair.reverse.to_output(compress)]
+    if pair.merged is not None:
+        pair.count("mergedOut", len(pair.merged))
+        outputs.append(pair.merged.to_output(compress))
+    return (outputs, pair.stats, pair.hists)
+
+class ReadPipeline:
+    """This class streams a pair of fastq files through a list of stages and
+    writes the surviving pairs.
+
+    Useage example:
+    pipeline = ReadPipeline([AdapterTrimmer(), LengthFilter(30)], procs=8)
+    stats = pipeline.run(forwardPath, reversePath, forwardOut, reverseOut)
+
+    The output is gzipped if forwardOut ends in .gz. stats is a Counter of
+    everything the stages recorded, plus pairsIn and pairsOut. If one of the
+    stages merges pairs, pass mergedOut to save the merged reads. After
+    running, the hists attribute holds the histograms the stages recorded,
+    like the insertSize histogram from readmerge.PairMerger.
+
+    The stages are split into three groups. The stages before the first
+    parent side stage run in the workers as each batch is parsed, the parent
+    side stages (and anything between them) run in this process, and the rest
+    run in the workers while each batch is formatted and compressed.
+    """
+    def __init__(self, stages, procs=1, batchSize=fastq.BATCH_SIZE):
+        self.stages = stages
+        self.procs = max(1, int(procs))
+        self.batchSize = batchSize
+        self.hists = {}
+
+    def split_stages(self):
+        """returns the (head, parent, tail) groups of stages"""
+        parent = [i for i, stage in enumerate(self.stages)
+                  if not getattr(stage, "parallel", True)]
+        if not parent:
+            return (self.stages, [], [])
+        return (self.stages[:parent[0]],
+                self.stages[parent[0]:parent[-1] + 1],
+                self.stages[parent[-1] + 1:])
+
+    def run(self, forwardPath, reversePath, forwardOut, reverseOut,
+            mergedOut=None):
+        compress = forwardOut.endswith(".gz")
+        chunks = fastq.paired_chunks(forwardPath, reversePath, self.batchSize)
+        head, parent, tail = self.split_stages()
+        stats = Counter()
+        self.hists = {}
+        handles = [open(forwardOut, "wb"), open(reverseOut, "wb")]
+        if mergedOut:
+            handles.append(open(mergedOut, "wb"))
+        try:
+            if self.procs > 1:
+                with Pool(self.procs, _init_worker,
+                          (head, tail, compress)) as pool:
+                    window = 2 * self.procs
+                    if parent:
+                        pairs = utils.bounded_imap(pool, _worker_head, chunks,
+                                                   window)
+                        results = utils.bounded_imap(
+                            pool, _worker_tail,
+                            self._run_parent(parent, pairs), window)
+                    else:
+                        results = utils.bounded_imap(pool, _worker_chunk,
+                                                     chunks, window)
+                    for result in results:
+                        self._collect(result, handles, stats)
+            else:
+                pairs = (_parse_chunk(head, chunk) for chunk in chunks)
+                for pair in self._run_parent(parent, pairs):
+                    self._collect(_format_pair(tail, compress, pair),
+                                  handles, stats)
+            #the compressed batches are BGZF blocks, so end with the EOF block
+            if compress:
+                for handle in handles:
+                    handle.write(bgzf.EOF_BLOCK)
+        finally:
+            for handle in handles:
+                handle.close()
+        return stats
+
+    def _run_parent(self, stages, pairs):
+        """runs the parent side stages on each batch in order, then yields
+        anything the stages held back until the end of the input"""
+        for pair in pairs:
+            for stage in stages:
+                stage(pair)
+            yield pair
+        for i, stage in enumerate(stages):
+            if hasattr(stage, "flush"):
+                for pair in stage.flush():
+                    for later in stages[i + 1:]:
+                        later(pair)
+                    yield pair
+
+    def _collect(self, result, handles, stats):
+        """writes the output of one batch and adds up its stats"""
+        outputs, batchStats, batchHists = result
+        for handle, data in zip(handles, outputs):
+            handle.write(data)
+        stats.update(batchStats)
+        for key in batchHists:
+            fastq.add_counts(self.hists, key, batchHists[key])
+
+class PrepRunner:
+    """
+    A base class that runs a ReadPipeline on one pair of read files the same
+    way that wrappers.BaseWrapper runs a command line tool.
+
+    Subclasses should call `self.init` with their `name` and the keyword
+    arguments, append their stages to `self.stages` and call `self.run()` as
+    the last line of their `__init__`. The stats for the run are appended to
+    `name`.log in outDir.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      forwardOutFile <first read output fastq filename>
+      reverseOutFile <second read output fastq filename>
+      outDir         <directory where files will be saved>
+
+    Other Arguments (Optional):
+      mergedOutFile  <merged read output fastq filename, if a stage merges>
+      procs          <number of worker processes; default = 1>
+      batchSize      <number of read pairs given to a worker at once;
+                       default = 20000>
+    """
+    def __init__(self, name, **kwargs):
+        self.name = name
+        self.forwardPath = self.check_path(kwargs["forwardPath"])
+        self.reversePath = self.check_path(kwargs["reversePath"])
+        self.outDir = os.path.abspath(kwargs["outDir"])
+        self.forwardOutFile = os.path.join(self.outDir, kwargs["forwardOutFile"])
+        self.reverseOutFile = os.path.join(self.outDir, kwargs["reverseOutFile"])
+        self.mergedOutFile = None
+        if kwargs.get("mergedOutFile"):
+            self.mergedOutFile = os.path.join(self.outDir, kwargs["mergedOutFile"])
+        self.procs = kwargs.get("procs", 1)
+        self.batchSize = kwargs.get("batchSize", fastq.BATCH_SIZE)
+        self.stages = []
+        self.stats = Counter()
+        self.hists = {}
+
+    init = __init__
+    """A shortcut for calling the PrepRunner __init__ from a subclass."""
+
+    def check_path(self, path):
+        """turns path into an absolute path and checks that it exists"""
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            utils.die("input file does not exists:\n  {}".format(path))
+        return path
+
+    def run(self):
+        utils.safe_mkdir(self.outDir)
+        pipeline = ReadPipeline(self.stages, procs=self.procs,
+                                batchSize=self.batchSize)
+        self.stats = pipeline.run(self.forwardPath, self.reversePath,
+                                  self.forwardOutFile, self.reverseOutFile,
+                                  self.mergedOutFile)
+        self.hists = pipeline.hists
+        self.log(self.report())
+
+    def report(self):
+        """returns a dict of anything besides the stage stats that should be
+        saved in the log. Subclasses can override this."""
+        return {}
+
+    def log(self, extra=None):
+        """appends the stats for this run, and anything in the dict `extra`,
+        to `name`.log in outDir"""
+        with open(os.path.join(self.outDir, self.name + ".log"), "a") as log:
+            print("[gloTK] timestamp={}".format(utils.timestamp()), file=log)
+            print("{} {} -> {} {}".format(self.forwardPath, self.reversePath,
+                                          self.forwardOutFile,
+                                          self.reverseOutFile), file=log)
+            for key in sorted(self.stats):
+                print("{}\t{}".format(key, self.stats[key]), file=log)
+            for key in sorted(extra or {}):
+                print("{}\t{}".format(key, extra[key]), file=log)
+
+def prep_config(config, newDir, run_pair, yamlOut=None, done=None,
+                finished=None):
+    """Runs `run_pair` on every read pair in a ConfigParse object and returns a
+    new ConfigParse object that points to the output reads in newDir. The
+    files keep their names.
+
+    run_pair is called as run_pair(lib_seq, **kwargs) with the forwardPath,
+    reversePath, forwardOutFile, reverseOutFile and outDir keyword arguments,
+    and normally just passes them on to a PrepRunner subclass. The new config
+    is saved to yamlOut if it is given, like the read configs in a gloTK
+    project.
+
+    finished is called with the two output paths of each pair once they are
+    written. To pick up an interrupted run, pass the output paths that were
+    finished before as done: those pairs are not run again, and the outputs
+    of a pair that was cut off are written over.
+
+    Returns (newConfig, runs), where runs is a dict of the return values of
+    run_pair for each lib_seq name.
+    """
+    utils.safe_mkdir(newDir)
+    newConfig = copy.deepcopy(config)
+    runs = {}
+    written = set()
+    for lib_seq in newConfig.params["lib_seq"]:
+        lib_seq["globs"] = [os.path.join(newDir, os.path.basename(x))
+                            for x in lib_seq["globs"]]
+        lib_seq["wildcard"] = ",".join(lib_seq["globs"])
+        newPairs = []
+        for forward, reverse in lib_seq["pairs"]:
+            outFiles = [os.path.basename(forward), os.path.basename(reverse)]
+            outPaths = [os.path.join(newDir, x) for x in outFiles]
+            for each in outPaths:
+                if (each in written) or (done is None and os.path.exists(each)):
+                    raise ValueError("""ERROR: Attempted to write reads to {},
+                    but it already exists. Chances are that the same reads are
+                    used for two lines in the Meraculous config
+                    file""".format(each))
+            written.update(outPaths)
+            if (done is None) or not all(x in done for x in outPaths):
+                runs.setdefault(lib_seq["name"], []).append(
+                    run_pair(lib_seq,
+                             forwardPath    = forward,
+                             reversePath    = reverse,
+                             forwardOutFile = outFiles[0],
+                             reverseOutFile = outFiles[1],
+                             outDir         = newDir))
+                if finished:
+                    finished(*outPaths)
+            newPairs.append(tuple(outPaths))
+        lib_seq["pairs"] = newPairs
+    if yamlOut:
+        newConfig.save_yaml(yamlOut)
+    return newConfig, runs
+
+class Trimmer(PrepRunner):
+    """
+    usage: Trimmer(required_args, other_args)
+
+    This is a drop-in replacement for wrappers.Seqprep that trims 3' adapters
+    without calling SeqPrep2. It takes the same arguments for adapter trimming
+    and writes the trimmed pairs to the same files, so anything that reads
+    Seqprep output can read Trimmer output. Like the wrappers, the trimming
+    runs as soon as the class is instantiated.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      forwardOutFile <first read output fastq filename>
+      reverseOutFile <second read output fastq filename>
+      outDir         <directory where files will be saved>
+
+    Arguments for Adapter/Primer Trimming (Optional):
+      qualCutoff     <Quality score cutoff for mismatches to be counted in
+                       the adapter overlap; default = 13>
+      lenCutoff      <Minimum length of a trimmed read to print it;
+                       default = 30>
+      forAdapter     <forward read adapter sequence as it would appear at the
+                       end of a read; default = "AGATCGGAAGAGCACACGTC">
+      revAdapter     <reverse read adapter sequence as it would appear at the
+                       end of a read; default = "AGATCGGAAGAGCGTCGTGT">
+      adapterOverlap <minimum number of adapter bases that must overlap the
+                       3' end of a read to trim it; default = 10>
+      adapterMismatch <maximum fraction of mismatching overlap bases;
+                       default = 0.13>
+
+    Optional Arguments for Merging
+      mergedOutFile  <perform merging and output merged reads to this file>
+      overlapMin     <minimum overall base pair overlap to merge two reads;
+                       default = 30>
+      mergeMismatch  <maximum fraction of mismatching bases in the overlap;
+                       default = 0.1>
+      prettyOutFile  <accepted for compatibility with Seqprep, but pretty
+                       alignments are not written>
+
+    Optional Arguments for Quality Trimming
+      windowQual     <perform sliding window quality trimming after adapter
+                       trimming, cutting reads at the first window with a mean
+                       quality below this value>
+      windowSize     <number of bases in the sliding window; default = 4>
+
+    Other Arguments (Optional):
+      binQualities   <replace the qualities with the Illumina 8-level bins
+                       after trimming; default = False>
+      procs          <number of worker processes; default = 1>
+      batchSize      <number of read pairs given to a worker at once;
+                       default = 20000>
+
+    All of the trimming and merging steps are done in the same pass over the
+    reads, and the output is only written once.
+
+    After running, the stats attribute is a Counter with the number of pairs
+    read, written, trimmed, merged and dropped for length. If merging, the
+    insertSizes attribute is a numpy array of the number of merged pairs with
+    each insert size, which is also saved in outDir as
+    glotk_trim.insert_sizes.txt
+    """
+    def __init__(self, **kwargs):
+        self.init("glotk_trim", **kwargs)
+        self.stages.append(AdapterTrimmer(kwargs.get("forAdapter", DEFAULT_FOR_ADAPTER),
+                                          kwargs.get("revAdapter", DEFAULT_REV_ADAPTER),
+                                          kwargs.get("qualCutoff", 13),
+                                          kwargs.get("adapterOverlap", 10),
+                                          kwargs.get("adapterMismatch", 0.13)))
+        if kwargs.get("windowQual") is not None:
+            self.stages.append(QualityTrimmer(kwargs.get("windowSize", 4),
+                                              kwargs["windowQual"]))
+        if self.mergedOutFile:
+            self.stages.append(PairMerger(kwargs.get("overlapMin", 30),
+                                          kwargs.get("mergeMismatch", 0.1)))
+        self.stages.append(LengthFilter(kwargs.get("lenCutoff", 30)))
+        if kwargs.get("binQualities"):
+            self.stages.append(QualityBinner())
+        self.insertSizes = None
+        self.run()
+
+    def run(self):
+        PrepRunner.run(self)
+        if self.mergedOutFile:
+            self.insertSizes = self.hists.get("insertSize",
+                                              np.zeros(0, dtype=np.int64))
+            with open(os.path.join(self.outDir, self.name + ".insert_sizes.txt"),
+                      "w") as f:
+                print("insertSize\tcount", file=f)
+                for size in np.flatnonzero(self.insertSizes):
+                    print("{}\t{}".format(size, self.insertSizes[size]), file=f)
+
+class Binner(PrepRunner):
+    """
+    usage: Binner(required_args, other_args)
+
+    Bins the qualities of one pair of read files to the Illumina 8 levels
+    without changing anything else. The binning runs as soon as the class is
+    instantiated.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      forwardOutFile <first read output fastq filename>
+      reverseOutFile <second read output fastq filename>
+      outDir         <directory where files will be saved>
+
+    Other Arguments (Optional):
+      procs          <number of worker processes; default = 1>
+      batchSize      <number of read pairs given to a worker at once;
+                       default = 20000>
+    """
+    def __init__(self, **kwargs):
+        self.init("glotk_bin", **kwargs)
+        self.stages.append(QualityBinner())
+        self.run()
+
+def bin_config(config, newDir, yamlOut=None, done=None, finished=None,
+               **kwargs):
+    """Bins the qualities of every read pair in a ConfigParse object with
+    prep_config and returns the new ConfigParse object. done and finished work
+    as in prep_config, and any other keyword arguments are passed on to
+    Binner."""
+    def run_pair(lib_seq, **files):
+        files.update(kwargs)
+        return Binner(**files)
+    return prep_config(config, newDir, run_pair, yamlOut, done, finished)[0]
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: scheduler.py
+authr: darrin schultz
+
+This module:
+  - runs a list of jobs, like the Meraculous runs of a glotk-sweep, within a
+    budget of processors and memory
+  - starts the next job as soon as a running job finishes and frees enough
+    processors and memory, instead of waiting for a whole batch of jobs to
+    finish. If the next job in line doesn't fit in the free memory, a later
+    job that does fit is started first (backfilling).
+  - only starts a job if its memory fits in what the running jobs leave
+    free (admission control). The memory a job needs can be re-estimated
+    while it waits, see memmodel.py.
+  - splits the free processors between the jobs that can still start, so
+    the jobs at the end of the list get more processors each as fewer of
+    them remain
+
+Each job runs in its own thread, so the jobs should spend their time in
+subprocesses like run_meraculous.sh.
+"""
+
+import os
+import threading
+
+#no job is given more processors than this, since Meraculous doesn't get
+# faster past about 50
+MAX_JOB_PROCS = 50
+
+def system_memory():
+    """returns the physical memory of this machine in GB"""
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**3
+
+class Job:
+    """
+    One job for a ResourceScheduler.
+
+      - name     - a unique name for the job
+      - run      - a callable that runs the job. It is called as run(procs)
+                   with the number of processors the job was given.
+      - mem      - the GB of memory the job needs
+      - minProcs - the fewest processors the job can run with
+      - maxProcs - the most processors the job can use
+      - estimate - optional callable that returns the GB of memory the job
+                   needs. It is called again before each try to start the
+                   job, so the estimate can improve while the job waits.
+      - after    - names of jobs that have to finish (or fail) before this
+                   one starts, for example so it can reuse their output
+    """
+    def __init__(self, name, run, mem=0, minProcs=1, maxProcs=MAX_JOB_PROCS,
+                 estimate=None, after=()):
+        self.name = name
+        self.run = run
+        self.estimate = estimate
+        self.after = list(after)
+        self.mem = estimate() if estimate else mem
+        self.minProcs = max(1, int(minProcs))
+        self.maxProcs = max(self.minProcs, int(maxProcs))
+
+class ResourceScheduler:
+    """
+    Runs Jobs with at most maxProcs processors, maxMem GB of memory and
+    maxJobs jobs in use at once. maxMem and maxJobs are not limited if they
+    are None.
+
+    After run(), results holds the return value of each job by name, errors
+    holds the exception raised by each job that failed, and launched is a list
+    of (name, procs) in the order the jobs were started.
+    """
+    def __init__(self, maxProcs, maxMem=None, maxJobs=None):
+        self.maxProcs = max(1, int(maxProcs))
+        self.maxMem = maxMem
+        self.maxJobs = maxJobs if maxJobs else self.maxProcs
+        self.freeProcs = self.maxProcs
+        self.usedMem = 0
+        self.running = 0
+        self.results = {}
+        self.errors = {}
+        self.launched = []
+        self._names = set()
+        self._cond = threading.Condition()
+
+    def fits(self, job):
+        """returns True if there is enough free memory for the job"""
+        return (self.maxMem is None) or (self.usedMem + job.mem <= self.maxMem)
+
+    def ready(self, job):
+        """returns True if the jobs that this job waits for are done"""
+        return all((x in self.results) or (x in self.errors) or
+                   (x not in self._names) for x in job.after)
+
+    def slots(self, pending):
+        """returns how many of the pending jobs could start together right now,
+        so that jobs waiting for memory or other jobs don't hold on to
+        processors"""
+        count = 0
+        mem = self.usedMem
+        for job in pending:
+            if count >= self.maxJobs - self.running:
+                break
+            if not self.ready(job):
+                continue
+            if (self.maxMem is None) or (mem + job.mem <= self.maxMem):
+                count += 1
+                mem += job.mem
+        return max(1, count)
+
+    def allot(self, job, pending):
+        """Returns the number of processors to start the job with now, or 0 if
+        it has to wait. The free processors are split evenly between the
+        pending jobs that could start with it. A job that can never fit is started
+        anyway once nothing else is running, so the sweep can't get stuck."""
+        if self.running >= self.maxJobs:
+            return 0
+        if not self.ready(job):
+            return 0
+        if not self.running:
+            if not self.fits(job):
+                print("""WARNING: {} needs {} GB of memory, but only {} GB is
+                available. Running it by itself.""".format(
+                    job.name, job.mem, self.maxMem))
+            minProcs = min(job.minProcs, self.freeProcs)
+        else:
+            minProcs = job.minProcs
+            if not self.fits(job):
+                return 0
+        slots = self.slots(pending)
+        procs = min(job.maxProcs, max(minProcs, self.freeProcs // slots))
+        if procs > self.freeProcs:
+            return 0
+        return procs
+
+    def run(self, jobs):
+        """runs all of the jobs and returns the results dict once they have
+        all finished"""
+        pending = list(jobs)
+        names = [job.name for job in pending]
+        if len(set(names)) != len(names):
+            raise ValueError("""ERROR: every job given to the scheduler needs
+            a unique name""")
+        self._names = set(names)
+        threads = []
+        with self._cond:
+            while pending or self.running:
+                for job in pending:
+                    if job.estimate:
+                        job.mem = job.estimate()
+                for job in list(pending):
+                    procs = self.allot(job, pending)
+                    if procs:
+                        pending.remove(job)
+                        threads.append(self._start(job, procs))
+                if pending and not self.running:
+                    raise ValueError("""ERROR: these jobs are waiting for each
+                    other and can never start: {}""".format(
+                        [job.name for job in pending]))
+                if pending or self.running:
+                    self._cond.wait()
+        for thread in threads:
+            thread.join()
+        return self.results
+
+    def _start(self, job, procs):
+        """takes the resources for a job and starts it in a thread"""
+        self.freeProcs -= procs
+        self.usedMem += job.mem
+        self.running += 1
+        self.launched.append((job.name, procs))
+        thread = threading.Thread(target=self._run_job, args=(job, procs))
+        thread.start()
+        return thread
+
+    def _run_job(self, job, procs):
+        """runs one job and gives its resources back when it is done"""
+        try:
+            self.results[job.name] = job.run(procs)
+        except Exception as e:
+            self.errors[job.name] = e
+            print("ERROR: {} failed: {}".format(job.name, e))
+        finally:
+            with self._cond:
+                self.freeProcs += procs
+                self.usedMem -= job.mem
+                self.running -= 1
+                self._cond.notify_all()
@@ -224,13 +224,12 @@ class MerRunner:
         After the run is complete, create the meraculous report, passing the
         directory containing the run (aka self.thisAssemblyDir).
         """
-        #set the dir to temp assembly dir
-        os.chdir(self.allAssembliesDir)
-
+        #run in the assembly dir without changing the directory of the
+        # other threads
         print(self.callString)
         p = subprocess.run(self.callString, shell=True, stdout=subprocess.PIPE,
                            stderr=subprocess.PIPE,
-                           universal_newlines=True)
+                           universal_newlines=True, cwd=self.allAssembliesDir)
         output = str(p.stdout)
         err = str(p.stderr)
 
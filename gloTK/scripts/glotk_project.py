@@ -25,6 +25,11 @@ authr: darrin schultz
 This program:
 1. Reads in a meraculous config file and initializes a glotk assembly project in
    the current directory.
+2. Optionally bins the read qualities to the Illumina 8 levels while importing
+   the reads, instead of symlinking them.
+3. Picks up an interrupted project setup when it is run again with the same
+   config in the same directory. The setup is interrupted until
+   gloTK_info/project_init_state.yaml says it is complete.
 
 Usage:
 glotk-project --inputConfig <location of Meraculous config> --genus pleu --species bach
@@ -39,9 +44,16 @@ import os
 import shutil
 import sys
 
+import yaml
 
 #import gloTK stuff
 from gloTK import ConfigParse
+from gloTK.accounting import set_default_store, UsageStore
+from gloTK.bgzf import recompress_config
+from gloTK.fingerprint import project_fingerprints
+from gloTK.insertsize import insert_config
+from gloTK.readprep import bin_config
+from gloTK.verify import verify_reads
 import gloTK.utils
 
 #This class is used in argparse to expand the ~. This avoids errors caused on
@@ -84,10 +96,84 @@ class CommandLine:
                             type=str,
                             help="""The species name for the sample that will be used
                             for naming config files and directory names.""")
+        self.parser.add_argument("-b", "--binQualities",
+                            action="store_true",
+                            help="""Write copies of the reads with the qualities
+                            binned to the Illumina 8 levels instead of symlinking
+                            the reads. The copies are smaller and faster to
+                            decompress in every later step.""")
+        self.parser.add_argument("-m", "--importStrategy",
+                            type=str,
+                            default="symlink",
+                            choices=["symlink", "hardlink", "reflink", "copy"],
+                            help="""How to bring the reads into the project. Copy
+                            or reflink them to move them off of slow storage.
+                            Copies are verified, and an interrupted import can
+                            be resumed by running the same glotk-project
+                            command again in the same directory.""")
+        self.parser.add_argument("-z", "--bgzf",
+                            action="store_true",
+                            help="""Rewrite the imported reads as BGZF. BGZF is
+                            still gzip so Meraculous can read it, but gloTK can
+                            decompress it in parallel. Symlinked reads are
+                            replaced by BGZF copies and the originals are left
+                            alone. Binned reads are always written as BGZF.""")
+        self.parser.add_argument("-I", "--estimateInserts",
+                            action="store_true",
+                            help="""Estimate insertAvg and insertSdev for each
+                            library from a subsample of its reads, and use them
+                            instead of the values in the config file. The reads
+                            are mapped to the --draft assembly with bowtie2, or
+                            the overlapping pairs are merged if there is no
+                            draft. Libraries that can't be estimated keep their
+                            values.""")
+        self.parser.add_argument("-d", "--draft",
+                            type=str,
+                            action=FullPaths,
+                            help="""A draft assembly to map reads to when
+                            estimating insert sizes.""")
+        self.parser.add_argument("-p", "--procs",
+                            type=int,
+                            default=1,
+                            help="""The number of processes to use when importing,
+                            binning, verifying or fingerprinting the reads.""")
+        self.parser.add_argument("-F", "--fingerprint",
+                            action="store_true",
+                            help="""Fingerprint the imported read files and save
+                            the fingerprints in
+                            gloTK_info/read_fingerprints.yaml.""")
+        self.parser.add_argument("-V", "--verifyReads",
+                            action="store_true",
+                            help="""Check that every read file in the config is
+                            intact (gzip integrity, fastq structure and equal
+                            numbers of reads in each pair) before making the
+                            project.""")
     def parse(self):
         self.args = self.parser.parse_args()
         print(self.args)
 
+def init_state(gloTK_info):
+    """returns the state of the project setup saved in gloTK_info, or None if
+    the setup never started"""
+    statePath = os.path.join(gloTK_info, "project_init_state.yaml")
+    if not os.path.exists(statePath):
+        return None
+    with open(statePath) as f:
+        return yaml.safe_load(f)
+
+def save_init_state(gloTK_info, **state):
+    with open(os.path.join(gloTK_info, "project_init_state.yaml"), "w") as f:
+        f.write(yaml.safe_dump(state, default_flow_style=False))
+
+def record_done(gloTK_info, state, step):
+    """returns a callback that adds the files it is called with to the files
+    that finished `step` in the saved project state, so that a resumed setup
+    can skip them"""
+    def finished(*paths):
+        state["done"].setdefault(step, []).extend(paths)
+        save_init_state(gloTK_info, **state)
+    return finished
+
 def main():
     """
     1. Reads in a meraculous config file and outputs glotk project files
@@ -101,9 +187,21 @@ def main():
     myArgs = parser.args
     print(myArgs)
 
-    # 1. Verify that the current directory isn't already a gloTK project
+    # 1. Verify that the current directory isn't already a gloTK project,
+    #    unless it is one whose setup was interrupted
     cwd = os.path.abspath(os.getcwd())
-    if gloTK.utils.dir_is_glotk(cwd):
+    gloTK_info=os.path.join(cwd, "gloTK_info")
+    state = init_state(gloTK_info)
+    resuming = bool(state) and state.get("status") != "complete"
+    if resuming:
+        if state.get("inputConfig") != myArgs.inputConfig:
+            raise ValueError("""ERROR: the setup of this gloTK project was
+            interrupted, but it was started with a different config file:
+              {}
+            Run glotk-project again with that config, or in a new
+            directory.""".format(state.get("inputConfig")))
+        print("Resuming the interrupted setup of this project.")
+    elif gloTK.utils.dir_is_glotk(cwd):
         raise ValueError("""ERROR: Are you in an empty directory? This appears
         to be a gloTK project directory already. Please try again in a new
         directory!""")
@@ -111,8 +209,16 @@ def main():
     # 2. Reads in a meraculous config file and outputs all of the associated config
     #    files to $PWD/glotk_info
     configFile = ConfigParse(myArgs.inputConfig)
-    gloTK_info=os.path.join(cwd, "gloTK_info")
+    if myArgs.verifyReads:
+        verify_reads(configFile.params["lib_seq"], myArgs.procs)
     gloTK.utils.safe_mkdir(gloTK_info)
+    #the files that finished each step before an interruption
+    done = state.get("done", {}) if resuming else {}
+    state = {"inputConfig": myArgs.inputConfig, "status": "importing",
+             "done": done}
+    save_init_state(gloTK_info, **state)
+    #the wrapped programs record what they cost here
+    set_default_store(UsageStore(os.path.join(gloTK_info, "resource_usage.yaml")))
     shutil.copyfile(myArgs.inputConfig, os.path.join(gloTK_info, "project_init.config"))
     configFile.save_yaml(os.path.join(gloTK_info, "input_config.yaml"))
 
@@ -121,12 +227,35 @@ def main():
     gloTK.utils.safe_mkdir(gloTK_reads)
     reads0 = os.path.join(gloTK_reads, "reads0")
     gloTK.utils.safe_mkdir(reads0)
-      # the files get saved in `project_dir/glotk_reads/reads0
-    params_new = configFile.sym_reads_new_config(reads0, sym=True)
       # the yaml config files get saved in `project_dir/glotk_info/read_configs/`
     read_params = os.path.join(gloTK_info, "read_configs")
     gloTK.utils.safe_mkdir(read_params)
-    params_new = configFile.save_yaml(os.path.join(read_params, "reads0.yaml"))
+      # the files get saved in `project_dir/glotk_reads/reads0
+      # a resumed setup skips the files that were binned or recompressed,
+      # since they no longer look like imports of the original reads
+    if myArgs.binQualities:
+        configFile = bin_config(
+            configFile, reads0, procs=myArgs.procs,
+            done=set(done.get("bin", [])) if resuming else None,
+            finished=record_done(gloTK_info, state, "bin"))
+    else:
+        configFile.sym_reads_new_config(
+            reads0, strategy=myArgs.importStrategy, procs=myArgs.procs,
+            skip=set(done.get("bgzf", [])))
+        if myArgs.bgzf:
+            recompress_config(configFile, threads=myArgs.procs,
+                              finished=record_done(gloTK_info, state, "bgzf"))
+      # optionally replace the insert sizes with ones estimated from the reads
+    if myArgs.estimateInserts:
+        insert_config(configFile, os.path.join(gloTK_info, "insert_sizes"),
+                      draftPath=myArgs.draft, procs=myArgs.procs)
+    configFile.save_yaml(os.path.join(read_params, "reads0.yaml"))
+    state["status"] = "complete"
+    save_init_state(gloTK_info, **state)
+
+    # 4. Optionally fingerprint the reads for caching and provenance
+    if myArgs.fingerprint:
+        project_fingerprints(cwd, myArgs.procs)
 
 if __name__ == "__main__":
     sys.exit(main())
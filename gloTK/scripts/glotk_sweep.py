@@ -26,30 +26,52 @@ This program:
 1. Reads in a meraculous config file and outputs all of the associated config
    files to $PWD/configs
 2. The name of each run and the path to the directory is passed to a
-   multiprocessing core that controls which assemblies are executed and when.
-3. Each assembly is executed.
+   scheduler that controls which assemblies are executed and when. A run is
+   started as soon as there are enough free processors and memory for it,
+   and the runs near the end of the sweep get more processors each.
+3. Each assembly is executed. The state of the sweep is kept in
+   gloTK_info/sweep_state.yaml, so running the same command again after the
+   sweep was killed skips the finished assemblies and resumes the partial
+   ones before starting the rest. The output of each assembly goes to
+   logs/<run name>.stdout.log and .stderr.log while it runs. With
+   --executor slurm or sge, each assembly runs as a batch job instead of on
+   this machine (see gloTK/executors.py).
+4. With --kRange, only the mer sizes that an adaptive search picks are
+   assembled, one batch at a time (see gloTK/ksearch.py).
 
 Usage: 
 "--slist 21 23 57 73" to perform assemblies for kmer sizes 21, 23, 57, 73, et cetera
+"--kRange 21 91" to search for the mer size between 21 and 91 with the best
+  scaffold N50
+"--executor slurm --queue long" to run each assembly as a job in the slurm
+  partition long
 """
 
 #import things for rest of program
 import sys
 import argparse
 import os
-
-#stuff for call shell commands
-import subprocess
+import signal
+import time
 
 #multiprocessing stuff
 from functools import partial
 from multiprocessing import cpu_count
-from multiprocessing import Pool
-from multiprocessing.dummy import Pool as ThreadPool
 
 #import gloTK stuff
 from gloTK import MerParse
 from gloTK import MerRunAnalyzer
+from gloTK.memmodel import MemoryModel, read_bases
+from gloTK.accounting import rusage_record, set_default_store, UsageStore
+from gloTK.earlystop import RunWatcher
+from gloTK.executors import EXECUTORS, LocalExecutor
+from gloTK.fingerprint import FingerprintStore
+from gloTK.ksearch import KSearch
+from gloTK.scheduler import Job, MAX_JOB_PROCS, ResourceScheduler, system_memory
+from gloTK.stagecache import StageCache, stage_keys
+from gloTK.sweepstate import SweepState
+from gloTK.utils import safe_mkdir, tail_lines
+from gloTK.verify import verify_reads
 
 #This class is used in argparse to expand the ~. This avoids errors caused on
 # some systems.
@@ -93,6 +115,29 @@ class CommandLine:
                             type=str,
                             nargs='+',
                             help="""The values to sweep through""")
+        self.parser.add_argument("-K", "--kRange",
+                            type=int,
+                            nargs=2,
+                            metavar=("KMIN", "KMAX"),
+                            help="""Search for the best mer_size between KMIN
+                            and KMAX instead of assembling every k in --slist.
+                            The k values are picked a batch of --simultaneous
+                            assemblies at a time, like a golden-section
+                            search, until the --objective stops improving.
+                            Needs --sweep mer_size.""")
+        self.parser.add_argument("--objective",
+                            type=str,
+                            choices=["scaffold_n50", "contig_n50", "uutig_n50",
+                                     "scaffold_total"],
+                            default="scaffold_n50",
+                            help="""The assembly statistic that --kRange
+                            maximizes.""")
+        self.parser.add_argument("--minImprovement",
+                            type=float,
+                            default=0.01,
+                            help="""The --kRange search stops once the best
+                            objective has improved by less than this fraction
+                            for three rounds. Default 0.01.""")
         self.parser.add_argument("-p", "--prefix",
                             type=str,
                             default='as',
@@ -113,12 +158,27 @@ class CommandLine:
         self.parser.add_argument("-n", "--simultaneous",
                             type=int,
                             default=1,
-                            help="""The number of simultaneous assemblies to run.""")
+                            help="""The most assemblies to run at the same time.""")
         self.parser.add_argument("-M", "--maxProcs",
                             type=int,
                             default=cpu_count() - 2,
                             help="""The total number of processers used by all
                             of the assemblies combined.""")
+        self.parser.add_argument("--maxMem",
+                            type=float,
+                            default=system_memory(),
+                            help="""The total GB of memory used by all of the
+                            assemblies combined. Defaults to all of the memory
+                            of this machine.""")
+        self.parser.add_argument("--memPerAssembly",
+                            type=float,
+                            default=0,
+                            help="""The GB of memory that each assembly needs.
+                            An assembly isn't started until there is this much
+                            memory free. By default the memory of each assembly
+                            is predicted from genome_size, mer_size, the size of
+                            the reads and the peaks of earlier assemblies, kept
+                            in gloTK_info/memory_history.yaml.""")
         self.parser.add_argument("-c", "--censor",
                             type=str,
                             nargs='+',
@@ -130,6 +190,12 @@ class CommandLine:
                             action='store_true',
                             help="""This performs diploid modes 0, 1, 2 for
                             every kmer size input""")
+        self.parser.add_argument("-V", "--verifyReads",
+                            action='store_true',
+                            help="""Check that every read file in the config is
+                            intact (gzip integrity, fastq structure and equal
+                            numbers of reads in each pair) before starting any
+                            assemblies.""")
         self.parser.add_argument("-C", "--cleanup",
                             type=int,
                             default=1,
@@ -137,69 +203,265 @@ class CommandLine:
                             help="""The cleanup level to pass along to the
                             run_meraculous.sh program.""")
 
+        self.parser.add_argument("--stopMargin",
+                            type=float,
+                            help="""Stop the assemblies whose UUtig N50 is
+                            less than (1 - STOPMARGIN) times the best one of
+                            the sweep once meraculous_contigs is done, and give
+                            their processors to the other assemblies. For
+                            example, 0.5 stops the runs with less than half of
+                            the best N50. Stopped runs are not resumed when the
+                            sweep is restarted.""")
+        self.parser.add_argument("-k", "--stageCache",
+                            action='store_true',
+                            help="""Share the import, mercount, mergraph, ufx and
+                            contigs stages between runs that have the same
+                            reads and parameters for them, like the diploid
+                            modes of a --triplet sweep. The stages are cached
+                            in gloTK_cache, and runs that can reuse a stage
+                            wait for the first run that makes it. Meraculous
+                            cleans up the stages it caches, so this sets
+                            --cleanup to 0.""")
+        self.parser.add_argument("-x", "--executor",
+                            type=str,
+                            choices=sorted(EXECUTORS),
+                            default="local",
+                            help="""Where to run the assemblies. local runs
+                            them on this machine. slurm and sge submit each
+                            assembly as a batch job with the processors and
+                            memory it was given, and wait for it to finish.
+                            The batch jobs need to see this directory on a
+                            shared filesystem. The job scripts are kept in
+                            gloTK_info/jobs.""")
+        self.parser.add_argument("--queue",
+                            type=str,
+                            help="""The slurm partition or sge queue to submit
+                            the assemblies to.""")
+        self.parser.add_argument("--batchArgs",
+                            type=str,
+                            default="",
+                            help="""More options for every batch job, like
+                            "--account=lab --time=7-00:00:00" for slurm.""")
+
     def parse(self):
         self.args = self.parser.parse_args()
+        if self.args.kRange and self.args.sweep != "mer_size":
+            self.parser.error("--kRange only works with --sweep mer_size")
+        if not self.args.kRange and not self.args.slist:
+            self.parser.error("either --slist or --kRange is required")
+        if self.args.executor == "local" and (self.args.queue or self.args.batchArgs):
+            self.parser.error("--queue and --batchArgs need --executor slurm or sge")
         print(self.args)
 
-def mer_runner_dummy(instance):
-    """This method is a helper method for class MerRunner. It allows
-    multiprocessing module in python to map parallelism to a class method."""
-    instance.meraculous_runner()
-
 class MerRunner:
     """This class has one instance per Meraculous run and is accessed with the
     partial module"""
-    def __init__(self, runName, configPath, cleanup):
-        """The cleanup parameter is what is passed to the run_meraculous script"""
+    def __init__(self, runName, configPath, cleanup, resume=False,
+                 stageCache=None, stageKeys=None, cwd=None, usageStore=None,
+                 executor=None, onStart=None):
+        """The cleanup parameter is what is passed to the run_meraculous script.
+        If resume is True, an interrupted run is picked up from its last
+        finished stage. If a stagecache.StageCache and the stage_keys of this
+        run are given, a new run starts from the cached stages and adds its
+        own stages to the cache when it is done. cwd is the directory of the
+        sweep, the current directory by default. If an accounting.UsageStore
+        is given, the resources used by the run are recorded in it. The
+        executor (see executors.py) starts run_meraculous.sh, on this machine
+        by default or as a job of a batch queue. onStart is called with the
+        runner as soon as run_meraculous.sh has started or been submitted.
+        If jobId is set to the batch job of an earlier sweep, the run waits
+        for that job instead of starting a new one while it is still
+        queued."""
         self.runName = runName
-        self.configPath = configPath
         self.cleanup =  cleanup
-        self.cwd = os.path.abspath(os.getcwd())
+        self.cwd = os.path.abspath(cwd if cwd else os.getcwd())
+        self.configPath = os.path.join(self.cwd, configPath)
         self.allAssembliesDir = os.path.join(self.cwd, "assemblies")
         self.thisAssemblyDir = os.path.join(self.allAssembliesDir, self.runName)
         self.reportsDir = os.path.join(self.cwd, "reports")
-
+        #the output of run_meraculous.sh is streamed to these while it runs
+        self.logsDir = os.path.join(self.cwd, "logs")
+        self.stdoutLog = os.path.join(self.logsDir, "{}.stdout.log".format(self.runName))
+        self.stderrLog = os.path.join(self.logsDir, "{}.stderr.log".format(self.runName))
+
+        self.resume = resume
+        self.stageCache = stageCache
+        self.stageKeys = stageKeys
+        self.usageStore = usageStore
+        self.executor = executor if executor else LocalExecutor()
         self.callString = "run_meraculous.sh -c {0} -dir {1} -cleanup_level {2}".format(
             self.configPath, self.runName, self.cleanup)
-
-    def meraculous_runner(self):
+        #filled in after the run. peakGB is the peak memory in GB, or None if
+        # the executor can't measure it
+        self.returncode = None
+        self.peakGB = None
+        #the running run_meraculous.sh (the Popen or executors.BatchJob), and
+        # whether stop() or interrupt() was called
+        self.process = None
+        self.stopped = False
+        self.interrupted = False
+        self.onStart = onStart
+        self.jobId = None
+
+    def set_procs(self, procs):
+        """sets local_num_procs in the config file of this run"""
+        with open(self.configPath, "r") as f:
+            lines = f.readlines()
+        with open(self.configPath, "w") as f:
+            for line in lines:
+                if line.split()[:1] == ["local_num_procs"]:
+                    line = "local_num_procs {}\n".format(procs)
+                f.write(line)
+
+    def is_running(self):
+        """returns True while run_meraculous.sh is running"""
+        return (self.process is not None) and (self.process.returncode is None)
+
+    def stop(self):
+        """Kills the run. run_meraculous.sh is started in its own session or
+        batch job, so this kills all of the processes of the run and not just
+        the shell."""
+        self.stopped = True
+        if self.is_running():
+            self.executor.cancel(self.process)
+
+    def interrupt(self):
+        """Kills the run because glotk-sweep is exiting. Unlike stop(), the
+        run is resumed when the sweep is started again. A run that hasn't
+        started yet never starts."""
+        self.interrupted = True
+        if self.is_running():
+            self.executor.cancel(self.process)
+
+    def _started(self, process):
+        """keeps the process of the run, killing it if the sweep was
+        interrupted while it was starting"""
+        self.process = process
+        if self.interrupted:
+            self.executor.cancel(process)
+        elif self.onStart:
+            self.onStart(self)
+
+    def meraculous_runner(self, procs=None, memGB=0):
         """
+        If procs is given, the run uses that many processors instead of the
+        local_num_procs in its config file. memGB is the memory to ask a
+        batch queue for, which the local executor ignores.
+
         Check to make sure that the allAssembliesDir has been created, if not,
         make it. This will only execute for the first time an assembly has been
         run in this directory.
 
         Run the directory from allAssembliesDir. The self.callString instance
         attribute tells Meraculous to name the assembly directory self.runName.
+        Only the run_meraculous.sh process starts in allAssembliesDir, so
+        several runners can run in threads of the same process. A batch
+        executor submits it as a job named after the run, unless self.jobId
+        is a job of an earlier sweep to wait for instead.
 
         After the run is complete, create the meraculous report, passing the
-        directory containing the run (aka self.thisAssemblyDir).
+        directory containing the run (aka self.thisAssemblyDir). The exit
+        status and the peak memory of the whole run are kept in
+        self.returncode and self.peakGB. There is no report for a run that
+        was killed with stop() or interrupt().
+
+        The stdout and stderr of the run are appended to self.stdoutLog and
+        self.stderrLog as they are written (see utils.RotatingLog), and the
+        paths of the two logs are returned.
         """
-        #set the dir to temp assembly dir
-        os.chdir(self.allAssembliesDir)
-
-        print(self.callString)
-        p = subprocess.run(self.callString, shell=True, stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE,
-                           universal_newlines=True)
-        output = str(p.stdout)
-        err = str(p.stderr)
+        if self.interrupted:
+            return (self.stdoutLog, self.stderrLog)
+        start = time.time()
+        attached = None
+        if self.jobId:
+            attached = self.executor.attach(self.runName, self.jobId,
+                                            started=self._started)
+        if attached:
+            returncode, rusage, peakRss = attached
+        else:
+            returncode, rusage, peakRss = self._start(procs, memGB)
+        self.returncode = returncode
+        self.peakGB = peakRss / 1024**3 if peakRss else None
+        if self.usageStore:
+            self.usageStore.record("meraculous", self.runName,
+                                   rusage_record(rusage, time.time() - start,
+                                                 returncode, peakRss),
+                                   procs=procs, resumed=self.resume,
+                                   stopped=self.stopped,
+                                   executor=self.executor.name)
+        if self.returncode and not (self.stopped or self.interrupted):
+            print("ERROR: {} exited with {}. The end of {}:".format(
+                self.runName, self.returncode, self.stderrLog))
+            print("\n".join(tail_lines(self.stderrLog)))
+        #the cache only saves time later, so it never fails a run
+        if self.stageCache:
+            try:
+                self.stageCache.store(self.stageKeys, self.thisAssemblyDir)
+            except OSError as e:
+                print("WARNING: could not cache the stages of {}: {}".format(
+                    self.runName, e))
 
         #generate the report for the run
-        self._generate_report()
-
-        #exit, returning the output and err
-        return (output, err)
+        if not (self.stopped or self.interrupted):
+            self._generate_report()
+
+        #exit, returning where the output and err are
+        return (self.stdoutLog, self.stderrLog)
+
+    def _start(self, procs, memGB):
+        """starts run_meraculous.sh with the executor and returns its
+        (returncode, rusage, peakRss)"""
+        if procs:
+            self.set_procs(procs)
+        #start a new run from the stages that other runs already did
+        if self.stageCache and not os.path.exists(self.thisAssemblyDir):
+            restored = self.stageCache.restore(self.stageKeys,
+                                               self.thisAssemblyDir, procs)
+            if restored:
+                print("{} is reusing the cached stages {}".format(
+                    self.runName, restored))
+                self.resume = True
+        callString = self.callString + (" -resume" if self.resume else "")
+        print(callString)
+        os.makedirs(self.logsDir, exist_ok=True)
+        #mark where each attempt starts, since resumed runs append to the logs
+        for logPath in [self.stdoutLog, self.stderrLog]:
+            with open(logPath, "a") as f:
+                print("#### {} {}".format(time.strftime("%Y-%m-%d %H:%M:%S"),
+                                          callString), file=f)
+        print("follow the run with: tail -F {}".format(self.stdoutLog))
+        return self.executor.run(self.runName, callString, self.allAssembliesDir,
+                                 (self.stdoutLog, self.stderrLog),
+                                 procs=procs or 1, memGB=memGB,
+                                 started=self._started)
 
     def _generate_report(self):
         reporter = MerRunAnalyzer(self.thisAssemblyDir, self.cwd, [])
         reporter.generate_report()
 
+def print_usage(usage):
+    """prints how the assemblies of this project used the machine so far"""
+    summary = usage.summary("meraculous")
+    if not summary["runs"]:
+        return
+    efficiency = summary["cpu_efficiency"]
+    print(("{} assemblies so far used {:.1f} CPU hours in {:.1f} hours of run "
+           "time, with at most {:.1f} GB of memory.{}").format(
+        summary["runs"], summary["cpu_hours"], summary["wall_hours"],
+        summary["max_peak_rss_gb"],
+        "" if efficiency is None else
+        " They used {:.0%} of the processors they were given.".format(efficiency)))
+
+def terminate(signum, frame):
+    """stops glotk-sweep on SIGTERM the same way as on Ctrl-C"""
+    sys.exit(128 + signum)
+
 def main():
     """
     1. Reads in a meraculous config file and outputs all of the associated config
        files to $PWD/configs
     2. The name of each run and the path to the directory is passed to a
-       multiprocessing core that controls which assemblies are executed and when.
+       ResourceScheduler that controls which assemblies are executed and when.
 
     """
     parser = CommandLine()
@@ -209,53 +471,258 @@ def main():
         sys.exit(1)
     parser.parse()
     myArgs = parser.args
+    signal.signal(signal.SIGTERM, terminate)
 
-    #Figure out how many processors to give to each assembly since we will be
-    # running some things in parallel. The MerParse class will handle overriding
-    # whatever is found in the config file in the read_config() method.
-    procsPerAssembly = min(50, int(myArgs.maxProcs / myArgs.simultaneous))
-    setattr(myArgs, "maxProcs", procsPerAssembly)
+    #This is how many processors each assembly would get if they all started
+    # at once. The MerParse class will handle overriding whatever is found in
+    # the config file in the read_config() method, and the scheduler sets the
+    # real number for each run when it starts.
+    maxProcs = max(1, myArgs.maxProcs)
+    procsPerAssembly = max(1, min(MAX_JOB_PROCS, int(maxProcs / myArgs.simultaneous)))
 
     # 1. Reads in a meraculous config file and outputs all of the associated config
     #    files to $PWD/configs
 
     merparser = MerParse(myArgs.inputConfig,
                          myArgs.sweep,
-                         myArgs.slist,
-                         myArgs.maxProcs,
+                         myArgs.slist or [],
+                         procsPerAssembly,
                          asPrefix = myArgs.prefix,
                          asSI = myArgs.index,
                          genus = myArgs.genus,
                          species = myArgs.species,
                          triplet = myArgs.triplet)
-    configPaths = merparser.sweeper_output()
+    # 1b. Check the read files before anything is written or scheduled
+    if myArgs.verifyReads:
+        print("Verifying the read files.")
+        verify_reads(merparser.params["lib_seq"], maxProcs)
 
-    #make the assemblies dir ONCE to avoid a race condition for os.makedirs()
+    # 1c. Keep the state of the sweep so that it can be picked up again if it
+    #     is killed. The run names have to have the same date as last time.
     cwd = os.path.abspath(os.getcwd())
+    gloTK_info = os.path.join(cwd, "gloTK_info")
+    safe_mkdir(gloTK_info)
+    state = SweepState(os.path.join(gloTK_info, "sweep_state.yaml"))
+    # 1d. Record what every run costs, to tune --simultaneous and --maxProcs
+    usage = UsageStore(os.path.join(gloTK_info, "resource_usage.yaml"))
+    set_default_store(usage)
+    if state.date:
+        merparser.as_d = state.date
+    else:
+        state.date = merparser.as_d
+        state.save()
+    #make the assemblies dir ONCE to avoid a race condition for os.makedirs()
     allAssembliesDir = os.path.join(cwd, "assemblies")
     if not os.path.exists(allAssembliesDir):
         os.makedirs(allAssembliesDir)
 
-    #instantiate all of the classes that we will be using in parallel processing.
-    # configPaths above returns a dict with the run name and abs path of config
-    # as key:value pairs
-    instances = []
-    for runName in configPaths:
-        configPath = configPaths.get(runName)
-        #strip off the .config off the end of the runName, derived from configPath
-        thisInstance = MerRunner(runName.strip(".config"), configPath, myArgs.cleanup)
-        instances.append(thisInstance)
-
-    if len(instances) == 0:
-        print("There are no meraculous folders in this directory. Exiting")
-    elif len(instances) > 0:
-        print("Using {} processors.".format(procsPerAssembly * myArgs.simultaneous))
-        # run the program for each instance
-        # pool size is the number of simultaneous runs for the server
-        pool = ThreadPool(myArgs.simultaneous)
-        results = pool.map(mer_runner_dummy, instances)
-        pool.close()
-        pool.join()
+    #the stage cache needs the stage directories before Meraculous cleans
+    # them up, and the fingerprints of the reads to know when they change
+    stageCache = None
+    if myArgs.stageCache:
+        if myArgs.cleanup:
+            print("Using --cleanup 0 so that the stages can be cached.")
+            myArgs.cleanup = 0
+        stageCache = StageCache(os.path.join(cwd, "gloTK_cache"))
+        readPaths = [x for lib_seq in merparser.params["lib_seq"]
+                     for pair in lib_seq["pairs"] for x in pair]
+        fingerprints = FingerprintStore(os.path.join(
+            gloTK_info, "read_fingerprints.yaml")).fingerprints(readPaths, maxProcs)
+
+    # the batch queue decides where each run goes, so only the processors of
+    # the runs are limited and their memory is asked for in the job
+    executor = LocalExecutor()
+    maxMem = myArgs.maxMem
+    if myArgs.executor != "local":
+        executor = EXECUTORS[myArgs.executor](os.path.join(gloTK_info, "jobs"),
+                                              queue=myArgs.queue,
+                                              extraArgs=myArgs.batchArgs)
+        maxMem = None
+        print("Submitting the assemblies to {} with {} processors.".format(
+            myArgs.executor, maxProcs))
+    else:
+        print("Using {} processors and {:.1f} GB of memory.".format(
+            maxProcs, myArgs.maxMem))
+    # predict the memory of each run, unless it was given
+    model = None
+    if not myArgs.memPerAssembly:
+        model = MemoryModel(os.path.join(gloTK_info, "memory_history.yaml"))
+        genomeSize = merparser.params["genome_size"]
+        bases = read_bases(merparser.params["lib_seq"])
+
+    # stop the runs that fall far behind the others
+    watcher = None
+    if myArgs.stopMargin:
+        watcher = RunWatcher(myArgs.stopMargin)
+
+    def run(procs, instance, merSize):
+        state.mark(instance.runName, "running", configPath=instance.configPath,
+                   resumed=instance.resume, procs=procs, jobId=instance.jobId,
+                   executor=executor.name)
+        memGB = myArgs.memPerAssembly
+        if model:
+            memGB = model.predict(genomeSize, merSize, bases)
+        #record how the assembly went even if the report fails
+        try:
+            return instance.meraculous_runner(procs, memGB)
+        finally:
+            if instance.stopped:
+                state.mark(instance.runName, "stopped",
+                           returncode=instance.returncode)
+            elif instance.interrupted:
+                state.mark(instance.runName, "interrupted",
+                           returncode=instance.returncode)
+            elif instance.returncode == 0:
+                state.mark(instance.runName, "complete", returncode=0)
+                #batch jobs don't report their peak memory
+                if model and instance.peakGB:
+                    model.observe(instance.runName, genomeSize, merSize,
+                                  bases, instance.peakGB)
+            else:
+                state.mark(instance.runName, "failed",
+                           returncode=instance.returncode)
+
+    def record_job(instance):
+        """keeps the batch job of a run, so a restarted sweep can wait for
+        the job instead of submitting the run again"""
+        jobId = getattr(instance.process, "jobId", None)
+        if jobId:
+            state.mark(instance.runName, "running", jobId=jobId)
+
+    def sweep(configPaths):
+        """runs the assemblies in configPaths, skipping the ones that already
+        finished, and returns a dict of the MerRunner of every run"""
+        merSizes = {x["assem_name"]: x["mer_size"] for x in merparser.subParams}
+        #instantiate all of the classes that we will be using in parallel
+        # processing. configPaths is a dict with the run name and abs path of
+        # config as key:value pairs
+        instances = []
+        for runName in configPaths:
+            configPath = configPaths.get(runName)
+            #strip off the .config off the end of the runName, derived from configPath
+            thisInstance = MerRunner(runName.strip(".config"), configPath,
+                                     myArgs.cleanup, cwd=cwd, usageStore=usage,
+                                     executor=executor, onStart=record_job)
+            if stageCache:
+                runParams = dict(merparser.params)
+                runParams["mer_size"] = merSizes.get(thisInstance.runName,
+                                                     merparser.params["mer_size"])
+                thisInstance.stageCache = stageCache
+                thisInstance.stageKeys = stage_keys(runParams, fingerprints)
+            instances.append(thisInstance)
+            if watcher:
+                watcher.add(thisInstance)
+
+        #skip the finished runs, then resume the partial ones before starting
+        # any new ones
+        byName = {x.runName: x for x in instances}
+        complete, partialRuns, untouched = state.sort({x.runName: x.thisAssemblyDir
+                                                       for x in instances})
+        for runName in complete:
+            if state.runs[runName]["status"] == "stopped":
+                print("Skipping {}, which was stopped early.".format(runName))
+            else:
+                print("Skipping {}, which already finished.".format(runName))
+        for runName in partialRuns:
+            print("Resuming {}.".format(runName))
+            byName[runName].resume = True
+        #a batch job can outlive the sweep that submitted it, even before it
+        # makes the assembly directory
+        for runName in partialRuns + untouched:
+            record = state.runs.get(runName, {})
+            if record.get("status") == "running" and record.get("jobId") and \
+               record.get("executor") == executor.name:
+                print("{} waits for its job {} if it is still there.".format(
+                    runName, record["jobId"]))
+                byName[runName].jobId = record["jobId"]
+        instances = [byName[x] for x in partialRuns + untouched]
+
+        #new runs that can reuse the stages of an earlier new run wait for it
+        after = {}
+        if stageCache:
+            leaders = {}
+            for runName in untouched:
+                lastKey = byName[runName].stageKeys[-1][1]
+                if lastKey in leaders:
+                    after[runName] = [leaders[lastKey]]
+                else:
+                    leaders[lastKey] = runName
+
+        if len(instances) == 0:
+            print("There are no meraculous runs left to do.")
+            return byName
+
+        jobs = []
+        for instance in instances:
+            merSize = merSizes.get(instance.runName, merparser.params["mer_size"])
+            estimate = None
+            if model:
+                estimate = partial(model.predict, genomeSize, merSize, bases)
+            jobs.append(Job(instance.runName,
+                            partial(run, instance=instance, merSize=merSize),
+                            mem=myArgs.memPerAssembly, estimate=estimate,
+                            after=after.get(instance.runName, [])))
+        # run the program for each instance as soon as there is room for it
+        scheduler = ResourceScheduler(maxProcs, maxMem, myArgs.simultaneous)
+        if watcher:
+            watcher.start()
+        try:
+            scheduler.run(jobs)
+        except (KeyboardInterrupt, SystemExit):
+            #the runs are in their own sessions, so they don't get the
+            # Ctrl-C or SIGTERM. Kill them instead of leaving them behind.
+            print("Stopping the running assemblies. They are resumed when the "
+                  "sweep is started again.")
+            for instance in instances:
+                instance.interrupt()
+            raise
+        finally:
+            if watcher:
+                watcher.stop()
+        for runName in scheduler.errors:
+            print("ERROR: the assembly {} failed.".format(runName))
+        print_usage(usage)
+        return byName
+
+    if not myArgs.kRange:
+        sweep(merparser.sweeper_output())
+        return
+
+    # 2b. An adaptive mer_size sweep assembles one batch of k values at a
+    #     time and picks the next batch from the results. The choices only
+    #     depend on the results, so a restarted search makes the same runs and
+    #     skips the finished ones.
+    search = KSearch(myArgs.kRange[0], myArgs.kRange[1],
+                     batchSize=max(1, myArgs.simultaneous),
+                     minImprovement=myArgs.minImprovement)
+    batch = search.next_batch()
+    while batch:
+        print("Assembling k = {}".format(batch))
+        merparser.sList = batch
+        configPaths = merparser.sweeper_output()
+        merparser.as_i += len(merparser.subParams)
+        runs = sweep(configPaths)
+        #the objective of a k is the best of its runs, like the diploid
+        # modes of a --triplet sweep
+        results = {k: None for k in batch}
+        for subPDict in merparser.subParams:
+            runName = subPDict["assem_name"]
+            if state.status(runName, runs[runName].thisAssemblyDir) != "complete":
+                continue
+            value = MerRunAnalyzer(runs[runName].thisAssemblyDir, cwd,
+                                   []).stats().get(myArgs.objective)
+            k = subPDict["mer_size"]
+            if value is not None and (results[k] is None or value > results[k]):
+                results[k] = value
+        print("{}: {}".format(myArgs.objective, results))
+        search.record(results)
+        batch = search.next_batch()
+    print("The k search stopped because {}.".format(" ".join(search.stopReason.split())))
+    if search.best is None:
+        print("ERROR: none of the assemblies finished.")
+    else:
+        print("The best k is {} with a {} of {}.".format(
+            search.best, myArgs.objective, search.results[search.best]))
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: stagecache.py
+authr: darrin schultz
+
+This module:
+  - keeps a cache of finished Meraculous stage directories that runs of a
+    sweep can share. The runs of a bubble_depth_threshold sweep, and the
+    diploid modes of a --triplet sweep, all have the same import, mercount,
+    mergraph, ufx and contigs stages, since those only depend on the reads,
+    mer_size and a few other parameters.
+  - names each cached stage by a hash of everything it depends on (content
+    addressing). The key of a stage is the hash of the key of the stage
+    before it plus the config parameters the stage itself reads, and the key
+    of the first stage covers the lib_seq lines and the fingerprints of the
+    read files (see fingerprint.py).
+  - restores the cached stages into a new assembly directory, with their
+    checkpoints, so that run_meraculous.sh -resume starts at the first stage
+    that isn't cached
+
+Files are hard linked between the cache and the assembly directories when
+they are on the same filesystem, so a cached stage takes no extra space.
+Meraculous writes new files instead of changing old ones, and deleting a
+hard link (like the cleanup at the end of a run) leaves the cached copy
+alone. Stages that Meraculous already cleaned up are never cached.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+#the stages that can be cached, in the order they run, and the config
+# parameters each one depends on besides the ones of the stages before it
+STAGE_PARAMS = [("meraculous_import",   ["no_read_validation"]),
+                ("meraculous_mercount", ["mer_size", "num_prefix_blocks"]),
+                ("meraculous_mergraph", ["min_depth_cutoff"]),
+                ("meraculous_ufx",      []),
+                ("meraculous_contigs",  [])]
+
+#the lib_seq fields that the cached stages depend on. The insert sizes and the
+# scaffolding and gap closing settings only matter to the later stages.
+LIB_FIELDS = ["name", "avgReadLn", "hasInnieArtifact", "isRevComped",
+              "useForContiging", "5p_wiggleRoom", "3p_wiggleRoom"]
+
+def stage_keys(params, fingerprints):
+    """Returns a list of (stage, key) for the cacheable stages of a run.
+    params is the params dict of a ConfigParse object, and fingerprints is a
+    dict of the fingerprint of each read file by its absolute path."""
+    libs = []
+    for lib_seq in params["lib_seq"]:
+        libs.append({"fields": {x: str(lib_seq[x]) for x in LIB_FIELDS},
+                     "reads": [[fingerprints[os.path.abspath(x)] for x in pair]
+                               for pair in lib_seq["pairs"]]})
+    key = json.dumps(libs, sort_keys=True)
+    keys = []
+    for stage, names in STAGE_PARAMS:
+        inputs = {x: str(params.get(x)) for x in names}
+        key = hashlib.sha256("{}\n{}\n{}".format(
+            key, stage, json.dumps(inputs, sort_keys=True)).encode()).hexdigest()
+        keys.append((stage, key))
+    return keys
+
+def link_tree(source, dest):
+    """copies a directory tree with hard links, or real copies where the
+    files can't be linked"""
+    def link_or_copy(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    shutil.copytree(source, dest, symlinks=True, copy_function=link_or_copy)
+
+def is_cleaned(stageDir):
+    """returns True if Meraculous deleted the intermediate files of a stage"""
+    return any(x.startswith("CLEANED-UP") for x in os.listdir(stageDir))
+
+class StageCache:
+    """
+    This class stores and restores Meraculous stage directories.
+
+    Useage example:
+    cache = StageCache("gloTK_cache")
+    keys = stage_keys(merparser.params, fingerprints)
+    restored = cache.restore(keys, assemblyDir)
+    ...run Meraculous with -resume if anything was restored...
+    cache.store(keys, assemblyDir)
+
+    Each cached stage is kept in <cacheDir>/<stage>/<key>, which holds the
+    stage directory and its checkpoint files. Entries are written to a
+    temporary directory of their own and renamed into place, so several runs
+    can store stages at the same time, from threads of the same process too.
+    The run that renames first wins and the others throw their copy away.
+    """
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+
+    def entry(self, stage, key):
+        return os.path.join(self.cacheDir, stage, key)
+
+    def cached(self, keys):
+        """returns the stages at the start of keys that are all cached"""
+        stages = []
+        for stage, key in keys:
+            if not os.path.isdir(self.entry(stage, key)):
+                break
+            stages.append(stage)
+        return stages
+
+    def restore(self, keys, assemblyDir, procs=None):
+        """Copies the cached stages at the start of keys into a new assembly
+        directory along with their checkpoints, and returns the list of the
+        stages that were restored. If procs is given, it replaces
+        local_num_procs in the restored stage parameters."""
+        stages = self.cached(keys)
+        if not stages:
+            return []
+        checkpoints = os.path.join(assemblyDir, "checkpoints")
+        os.makedirs(checkpoints, exist_ok=True)
+        for stage, key in keys[:len(stages)]:
+            entry = self.entry(stage, key)
+            link_tree(os.path.join(entry, stage), os.path.join(assemblyDir, stage))
+            for name in os.listdir(os.path.join(entry, "checkpoints")):
+                dest = os.path.join(checkpoints, name)
+                shutil.copy2(os.path.join(entry, "checkpoints", name), dest)
+                if procs and name.endswith(".local.params"):
+                    set_local_procs(dest, procs)
+        return stages
+
+    def store(self, keys, assemblyDir):
+        """Caches the finished stages of an assembly directory that aren't
+        cached yet, stopping at the first stage that isn't finished or was
+        cleaned up. Returns the list of the stages that were stored."""
+        stored = []
+        checkpoints = os.path.join(assemblyDir, "checkpoints")
+        for stage, key in keys:
+            stageDir = os.path.join(assemblyDir, stage)
+            checkpoint = os.path.join(checkpoints, stage + ".ckpt")
+            if not (os.path.exists(checkpoint) and os.path.isdir(stageDir)) or \
+               is_cleaned(stageDir):
+                break
+            entry = self.entry(stage, key)
+            if os.path.isdir(entry):
+                continue
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            tmpEntry = tempfile.mkdtemp(prefix=key + ".tmp",
+                                        dir=os.path.dirname(entry))
+            os.chmod(tmpEntry, 0o755)
+            link_tree(stageDir, os.path.join(tmpEntry, stage))
+            os.makedirs(os.path.join(tmpEntry, "checkpoints"))
+            for name in os.listdir(checkpoints):
+                if name.startswith(stage + "."):
+                    shutil.copy2(os.path.join(checkpoints, name),
+                                 os.path.join(tmpEntry, "checkpoints", name))
+            try:
+                os.rename(tmpEntry, entry)
+                stored.append(stage)
+            except OSError:
+                #another run stored the same stage first
+                shutil.rmtree(tmpEntry, ignore_errors=True)
+                if not os.path.isdir(entry):
+                    raise
+        return stored
+
+def set_local_procs(paramsPath, procs):
+    """sets local_num_procs in a Meraculous .local.params checkpoint file"""
+    with open(paramsPath, "r") as f:
+        lines = f.readlines()
+    with open(paramsPath, "w") as f:
+        for line in lines:
+            if line.split()[:1] == ["local_num_procs"]:
+                line = "local_num_procs\t{}\n".format(procs)
+            f.write(line)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: sweepstate.py
+authr: darrin schultz
+
+This module:
+  - keeps the state of a glotk-sweep in gloTK_info/sweep_state.yaml, so a
+    sweep that was killed can be started again with the same command
+  - sorts the runs of a sweep into complete ones that are skipped, partial
+    ones that are resumed from their last finished stage with
+    run_meraculous.sh -resume, and untouched ones that are started from the
+    beginning
+
+A run is complete when the state file says it finished successfully and
+Meraculous wrote the checkpoint of its last stage. Any other run with an
+assembly directory is partial, and Meraculous decides where to pick it up
+from its checkpoints/<stage>.ckpt files.
+
+The date in the run names is kept in the state file too. A sweep restarted on
+another day gives its runs the same names, so they can be found again.
+"""
+
+import os
+import threading
+import time
+
+import yaml
+
+#the Meraculous stages in the order they run
+STAGES = ["meraculous_import",
+          "meraculous_mercount",
+          "meraculous_mergraph",
+          "meraculous_ufx",
+          "meraculous_contigs",
+          "meraculous_bubble",
+          "meraculous_merblast",
+          "meraculous_ono",
+          "meraculous_gap_closure",
+          "meraculous_final_results"]
+
+def finished_stages(assemblyDir):
+    """returns the list of stages that have a checkpoint in a Meraculous
+    assembly directory"""
+    checkpoints = os.path.join(assemblyDir, "checkpoints")
+    return [x for x in STAGES
+            if os.path.exists(os.path.join(checkpoints, x + ".ckpt"))]
+
+class SweepState:
+    """
+    This class keeps track of which runs of a sweep have started and
+    finished.
+
+    Useage example:
+    state = SweepState("gloTK_info/sweep_state.yaml")
+    complete, partial, untouched = state.sort(runs)
+    state.mark(runName, "running")
+
+    The yaml file holds the date used in the run names and a dict of runs,
+    each with its status ("running", "complete", "failed", "stopped" or
+    "interrupted", when glotk-sweep was killed while it ran), the time it
+    changed and any other information passed to mark(). It can be updated
+    from several threads at once.
+    """
+    def __init__(self, statePath):
+        self.statePath = statePath
+        self.date = None
+        self.runs = {}
+        self._lock = threading.Lock()
+        if os.path.exists(statePath):
+            with open(statePath) as f:
+                saved = yaml.safe_load(f) or {}
+            self.date = saved.get("date")
+            self.runs = saved.get("runs", {})
+
+    def status(self, runName, assemblyDir):
+        """returns "complete", "partial" or "untouched" for one run. Runs that
+        were stopped early (see earlystop.py) count as complete so that they
+        aren't picked up again."""
+        record = self.runs.get(runName, {})
+        if record.get("status") == "stopped":
+            return "complete"
+        if (record.get("status") == "complete") and \
+           (STAGES[-1] in finished_stages(assemblyDir)):
+            return "complete"
+        if os.path.isdir(assemblyDir):
+            return "partial"
+        return "untouched"
+
+    def sort(self, runs):
+        """Sorts a dict of {runName: assemblyDir} into (complete, partial,
+        untouched) lists of run names, keeping their order"""
+        groups = {"complete": [], "partial": [], "untouched": []}
+        for runName in runs:
+            groups[self.status(runName, runs[runName])].append(runName)
+        return (groups["complete"], groups["partial"], groups["untouched"])
+
+    def mark(self, runName, status, **info):
+        """records the status of a run and saves the state"""
+        with self._lock:
+            record = self.runs.setdefault(runName, {})
+            record.update(info)
+            record["status"] = status
+            record["time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            self.save()
+
+    def save(self):
+        """writes the state, replacing the old file only once it is complete"""
+        tmpPath = self.statePath + ".tmp"
+        with open(tmpPath, "w") as f:
+            f.write(yaml.safe_dump({"date": self.date, "runs": self.runs},
+                                   default_flow_style=False))
+        os.replace(tmpPath, self.statePath)
@@ -0,0 +1,45 @@
+"""The shared parts of the fake sbatch, squeue and scancel in this directory.
+They run the jobs on this machine so that executors.SlurmExecutor can be
+tested without a cluster. The jobs are kept in $FAKE_SLURM_DIR."""
+
+import fcntl
+import os
+
+def state_dir():
+    path = os.environ.get("FAKE_SLURM_DIR", "/tmp/fake_slurm")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def next_job_id():
+    counterPath = os.path.join(state_dir(), "last_job_id")
+    with open(counterPath + ".lock", "w") as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        jobId = 1
+        if os.path.exists(counterPath):
+            with open(counterPath) as f:
+                jobId = int(f.read()) + 1
+        with open(counterPath, "w") as f:
+            f.write(str(jobId))
+    return str(jobId)
+
+def job_pid(jobId):
+    """returns the pid of a job, or None if there is no such job"""
+    pidPath = os.path.join(state_dir(), "{}.pid".format(jobId))
+    if not os.path.exists(pidPath):
+        return None
+    with open(pidPath) as f:
+        return int(f.read())
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    #a finished job that nothing has reaped yet
+    statPath = "/proc/{}/stat".format(pid)
+    if os.path.exists(statPath):
+        with open(statPath) as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    return True
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for accounting.py
+"""
+
+import unittest
+from gloTK import accounting
+from gloTK.accounting import UsageStore
+from gloTK.wrappers import BaseWrapper
+
+import os
+import shutil
+import tempfile
+import threading
+
+class ShellWrapper(BaseWrapper):
+    """runs a shell command line"""
+    def __init__(self, command, **kwargs):
+        self.init("shell", **kwargs)
+        self.args = [command]
+        self.run()
+
+class accounting_test_case(unittest.TestCase):
+    """Tests recording what commands cost"""
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+        self.storePath = os.path.join(self.outDir, "resource_usage.yaml")
+
+    def tearDown(self):
+        accounting.set_default_store(None)
+        shutil.rmtree(self.outDir)
+
+    def test_wrapper(self):
+        """Wrappers record their usage and exit status to the store they are
+        given, or to the default store"""
+        store = UsageStore(self.storePath)
+        ShellWrapper("python -c 'sum(range(3000000))'", outDir=self.outDir,
+                     usageStore=store, procs=2)
+        accounting.set_default_store(store)
+        ShellWrapper("exit 3", outDir=self.outDir, return_ok=None)
+        records = UsageStore(self.storePath).records
+        self.assertEqual([(x["kind"], x["name"], x["returncode"]) for x in records],
+                         [("wrapper", "shell", 0), ("wrapper", "shell", 3)])
+        self.assertTrue(records[0]["user_s"] > 0)
+        self.assertTrue(records[0]["wall_s"] > 0)
+        self.assertTrue(records[0]["peak_rss_gb"] > 0)
+        self.assertEqual(records[0]["procs"], 2)
+        self.assertEqual(records[0]["cwd"], self.outDir)
+
+    def test_threads_and_summary(self):
+        """Records from many threads and from two stores on the same file
+        are all kept, and are summarized"""
+        stores = [UsageStore(self.storePath), UsageStore(self.storePath)]
+        usage = {"wall_s": 10.0, "user_s": 15.0, "sys_s": 5.0,
+                 "peak_rss_gb": 1.5, "returncode": 0}
+        threads = [threading.Thread(target=stores[i % 2].record,
+                                    args=("meraculous", "run{}".format(i), usage),
+                                    kwargs={"procs": 4})
+                   for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stores[0].record("wrapper", "bowtie2", dict(usage, returncode=1))
+        store = UsageStore(self.storePath)
+        self.assertEqual(len(store.records), 21)
+        summary = store.summary("meraculous")
+        self.assertEqual((summary["runs"], summary["failed"]), (20, 0))
+        self.assertAlmostEqual(summary["cpu_efficiency"], 0.5)
+        self.assertAlmostEqual(summary["cpu_hours"], 20 * 20 / 3600)
+        self.assertEqual(store.summary()["failed"], 1)
+        self.assertEqual(store.summary("wrapper")["cpu_efficiency"], None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for bgzf.py
+"""
+
+import unittest
+from gloTK import bgzf, fastq
+from gloTK.readprep import ReadPipeline
+
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+
+class bgzf_test_case(unittest.TestCase):
+    """Tests writing and reading BGZF files"""
+    def setUp(self):
+        self.readPath = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test/reads/")
+        self.forwardPath = os.path.join(self.readPath, "SRR353630_2500_1.fastq.gz")
+        self.reversePath = os.path.join(self.readPath, "SRR353630_2500_2.fastq.gz")
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_blocks(self):
+        """Every block holds at most 64 KB and records its own size, and the
+        empty EOF block is the same as the one htslib writes"""
+        data = os.urandom(100000) * 3
+        blocks = bgzf.compress(data)
+        pos = 0
+        sizes = []
+        while pos < len(blocks):
+            sizes.append(bgzf.block_size(blocks, pos))
+            pos += sizes[-1]
+        self.assertEqual(pos, len(blocks))
+        self.assertEqual(len(sizes), 5)
+        self.assertTrue(max(sizes) <= 65536)
+        self.assertEqual(bgzf.compress_block(b""), bgzf.EOF_BLOCK)
+        self.assertEqual(bgzf.decompress_blocks(blocks), data)
+
+    def test_recompress(self):
+        """A recompressed file is still gzip and reads back the same in
+        parallel. A symlink is replaced and its target left alone."""
+        link = os.path.join(self.outDir, "reads.fastq.gz")
+        os.symlink(self.forwardPath, link)
+        self.assertFalse(bgzf.is_bgzf(link))
+        bgzf.recompress(link, threads=3)
+        self.assertFalse(os.path.islink(link))
+        self.assertTrue(bgzf.is_bgzf(link))
+        self.assertFalse(bgzf.is_bgzf(self.forwardPath))
+        with gzip.open(self.forwardPath, "rb") as f:
+            original = f.read()
+        with gzip.open(link, "rb") as f:
+            self.assertEqual(f.read(), original)
+        self.assertEqual(b"".join(bgzf.read_blocks(link, threads=3)), original)
+        with open(link, "rb") as f:
+            self.assertTrue(f.read().endswith(bgzf.EOF_BLOCK))
+        records = sum(len(x) for x in fastq.line_chunks(link, 4000)) // 4
+        self.assertEqual(records, 2500)
+
+    def test_corrupt(self):
+        """Truncated files and bad blocks are errors"""
+        path = os.path.join(self.outDir, "reads.fastq.gz")
+        bgzf.recompress(self.forwardPath, path)
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[:-100])
+        with self.assertRaises(ValueError):
+            list(bgzf.read_blocks(path))
+        size = bgzf.block_size(data, 0)
+        crc = struct.unpack_from("<I", data, size - 8)[0]
+        bad = data[:size - 8] + struct.pack("<I", crc ^ 1) + data[size - 4:]
+        with self.assertRaises(ValueError):
+            bgzf.decompress_blocks(bad)
+
+    def test_pipeline_output(self):
+        """The ReadPipeline writes BGZF"""
+        outputs = [os.path.join(self.outDir, "out_{}.fastq.gz".format(x)) for x in [1, 2]]
+        ReadPipeline([], batchSize=700).run(self.forwardPath, self.reversePath, *outputs)
+        self.assertTrue(bgzf.is_bgzf(outputs[0]))
+        with gzip.open(self.forwardPath, "rb") as f:
+            original = f.read()
+        self.assertEqual(b"".join(bgzf.read_blocks(outputs[0])), original)
+
+if __name__ == '__main__':
+    unittest.main()
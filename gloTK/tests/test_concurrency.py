@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests that the runners, wrappers and config parsing of gloTK can
+be used from many threads at once without changing the working directory
+"""
+
+import unittest
+from gloTK.libseq import LibSeq
+from gloTK.scripts.glotk_sweep import MerRunner
+from gloTK.wrappers import BaseWrapper
+
+import os
+import shutil
+import tempfile
+import threading
+
+#the number of each kind of job that runs at the same time
+THREADS = 12
+
+class PwdWrapper(BaseWrapper):
+    """writes the directory that the command ran in to pwd.txt"""
+    def __init__(self, outDir):
+        self.init("pwd", outDir=outDir)
+        self.args = ["sleep", "0.05;", "pwd", ">", "pwd.txt;", "true"]
+        self.run()
+
+class concurrency_test_case(unittest.TestCase):
+    """Runs many runners, wrappers and LibSeq parsers at the same time"""
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+        self.readDir = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                                    "phix174Test", "reads")
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.outDir)
+
+    def test_stress(self):
+        """Every command runs in its own directory, relative read paths are
+        found next to their config file, and the directory of the process is
+        never changed"""
+        sweepDirs = [os.path.join(self.outDir, "sweep{}".format(i)) for i in range(THREADS)]
+        wrapperDirs = [os.path.join(self.outDir, "wrapper{}".format(i)) for i in range(THREADS)]
+        configDir = os.path.dirname(self.readDir)
+        line = "lib_seq reads/SRR353630_2500_1.fastq.gz,reads/SRR353630_2500_2.fastq.gz " \
+               "SRR353630 300 50 150 0 0 1 1 1 0 0"
+        runners = []
+        for sweepDir in sweepDirs:
+            os.makedirs(os.path.join(sweepDir, "assemblies"))
+            with open(os.path.join(sweepDir, "run.config"), "w") as f:
+                print("local_num_procs 8", file=f)
+            runner = MerRunner("run", "run.config", 0, cwd=sweepDir)
+            runner.callString = "sleep 0.05; pwd > pwd.txt; true"
+            runner._generate_report = lambda: None
+            runners.append(runner)
+        libSeqs = []
+        errors = []
+        def guard(target, *args):
+            def run():
+                try:
+                    target(*args)
+                except Exception as e:
+                    errors.append(e)
+            return run
+        def parse():
+            libSeqs.append(LibSeq(line, os.path.join(configDir, "test.config")))
+        threads = [threading.Thread(target=guard(x.meraculous_runner, 1)) for x in runners]
+        threads += [threading.Thread(target=guard(PwdWrapper, x)) for x in wrapperDirs]
+        threads += [threading.Thread(target=guard(parse)) for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([repr(x) for x in errors], [])
+        self.assertEqual(os.getcwd(), self.cwd)
+        for runner in runners:
+            self.assertEqual(runner.returncode, 0)
+            with open(runner.configPath) as f:
+                self.assertEqual(f.read(), "local_num_procs 1\n")
+            with open(os.path.join(runner.allAssembliesDir, "pwd.txt")) as f:
+                self.assertEqual(os.path.realpath(f.read().strip()),
+                                 os.path.realpath(runner.allAssembliesDir))
+        for wrapperDir in wrapperDirs:
+            with open(os.path.join(wrapperDir, "pwd.txt")) as f:
+                self.assertEqual(os.path.realpath(f.read().strip()),
+                                 os.path.realpath(wrapperDir))
+        self.assertEqual(len(libSeqs), THREADS)
+        for libSeq in libSeqs:
+            self.assertEqual(libSeq["pairs"],
+                             [(os.path.join(self.readDir, "SRR353630_2500_1.fastq.gz"),
+                               os.path.join(self.readDir, "SRR353630_2500_2.fastq.gz"))])
+
+if __name__ == '__main__':
+    unittest.main()
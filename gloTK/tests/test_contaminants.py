@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for contaminants.py
+"""
+
+import unittest
+from gloTK import ConfigParse
+from gloTK.contaminants import BloomFilter, ContaminantFilter, read_fasta, screen_config
+from gloTK.diginorm import kmer_codes
+from gloTK.tests.test_readprep import make_pair
+
+import os
+import random
+import shutil
+import tempfile
+
+class contaminant_test_case(unittest.TestCase):
+    """Tests the Bloom filter and the contaminant screen"""
+    def setUp(self):
+        self.testDir = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test")
+        self.fasta = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                                  "meraculousTestRun/meraculous_contigs/UUtigs.fa")
+        self.contig = next(read_fasta(self.fasta))[1].decode()
+        random.seed(0)
+        self.clean = ["".join(random.choice("ACGT") for i in range(100))
+                      for j in range(50)]
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_bloom(self):
+        """Every k-mer added is found, also after saving and loading"""
+        bloom = BloomFilter.from_fasta(self.fasta, ksize=25)
+        path = os.path.join(self.outDir, "contaminants.bloom.npz")
+        bloom.save(path)
+        loaded = BloomFilter.load(path)
+        self.assertEqual(loaded.ksize, 25)
+        pair = make_pair([self.contig[:100]], [self.contig[200:300]])
+        kmers, valid = kmer_codes(pair.forward, 25)
+        self.assertTrue(loaded.contains(kmers[valid]).all())
+
+    def test_filter(self):
+        """Contaminant pairs are dropped, or tagged and kept"""
+        bloom = BloomFilter.from_fasta(self.fasta)
+        contaminated = [self.contig[i:i + 100] for i in range(0, 500, 50)]
+        forwards = contaminated + self.clean[:10]
+        reverses = self.clean[10:20] + self.clean[20:30]
+        pair = make_pair(forwards, reverses)
+        ContaminantFilter(bloom)(pair)
+        self.assertEqual(pair.stats["contaminantPairs"], 10)
+        self.assertEqual(len(pair), 10)
+        pair = make_pair(forwards, reverses)
+        ContaminantFilter(bloom, tag=True)(pair)
+        self.assertEqual(len(pair), 20)
+        self.assertTrue(pair.reverse.names[0].endswith(b" contaminant"))
+        self.assertFalse(pair.reverse.names[10].endswith(b" contaminant"))
+
+    def test_screen_config(self):
+        """The contaminant fraction is reported for each library"""
+        config = ConfigParse(os.path.join(self.testDir, "phix174.config"))
+        newConfig, fractions = screen_config(config, self.fasta, self.outDir,
+                                             procs=2, batchSize=500)
+        self.assertEqual(list(fractions), ["SRR353630"])
+        self.assertTrue(0 <= fractions["SRR353630"] <= 1)
+        forward = newConfig.params["lib_seq"][0]["pairs"][0][0]
+        self.assertTrue(os.path.exists(forward))
+
+if __name__ == '__main__':
+    unittest.main()
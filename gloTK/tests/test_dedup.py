@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for dedup.py
+"""
+
+import unittest
+from gloTK.dedup import Dedup
+
+import gzip
+import os
+import shutil
+import tempfile
+
+class dedup_test_case(unittest.TestCase):
+    """Tests that duplicate pairs are removed, in memory and on disk"""
+    def setUp(self):
+        self.readPath = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test/reads/")
+        self.outDir = tempfile.mkdtemp()
+        #write every pair of the test reads twice
+        self.inputs = []
+        for mate in ["1", "2"]:
+            path = os.path.join(self.readPath, "SRR353630_2500_{}.fastq.gz".format(mate))
+            with gzip.open(path, "rb") as f:
+                data = f.read()
+            doubled = os.path.join(self.outDir, "doubled_{}.fastq.gz".format(mate))
+            with gzip.open(doubled, "wb") as f:
+                f.write(data + data)
+            self.inputs.append(doubled)
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def dedup(self, name, **kwargs):
+        dedup = Dedup(forwardPath    = self.inputs[0],
+                      reversePath    = self.inputs[1],
+                      forwardOutFile = name + "_1.fastq.gz",
+                      reverseOutFile = name + "_2.fastq.gz",
+                      outDir         = self.outDir,
+                      batchSize      = 400,
+                      **kwargs)
+        pairs = []
+        with gzip.open(dedup.forwardOutFile, "rb") as f1, \
+             gzip.open(dedup.reverseOutFile, "rb") as f2:
+            lines1 = f1.read().split(b"\n")
+            lines2 = f2.read().split(b"\n")
+        for i in range(0, len(lines1) - 1, 4):
+            pairs.append((lines1[i + 1], lines2[i + 1]))
+        return dedup, pairs
+
+    def test_in_memory(self):
+        """Every duplicated pair is removed and the rate is reported"""
+        dedup, pairs = self.dedup("memory")
+        self.assertEqual(dedup.stats["pairsIn"], 5000)
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertTrue(len(pairs) <= 2500)
+        self.assertEqual(dedup.stats["pairsOut"], len(pairs))
+        self.assertTrue(dedup.duplicationRate >= 0.5)
+        with open(os.path.join(self.outDir, "glotk_dedup.log")) as f:
+            self.assertTrue("duplicationRate" in f.read())
+
+    def test_spill(self):
+        """Spilling to disk keeps the same pairs as deduplicating in memory"""
+        memory, memoryPairs = self.dedup("memory", procs=2)
+        spill, spillPairs = self.dedup("spill", maxPairs=1000, procs=2)
+        self.assertEqual(sorted(memoryPairs), sorted(spillPairs))
+        self.assertEqual(memory.stats["duplicatePairs"],
+                         spill.stats["duplicatePairs"])
+        #the spilled partitions are cleaned up
+        self.assertEqual([x for x in os.listdir(self.outDir)
+                          if x.startswith("glotk_dedup_")], [])
+
+if __name__ == '__main__':
+    unittest.main()
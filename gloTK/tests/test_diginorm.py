@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for diginorm.py
+"""
+
+import unittest
+from gloTK import ConfigParse
+from gloTK.diginorm import CountMinSketch, kmer_codes, normalize_config, Normalizer
+from gloTK.tests.test_readprep import make_pair
+
+import gzip
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+SEQ = "GATTACACATTAGGCCTTAAGGCTAGCTAGGATCCATGCATCGA"
+REVCOMP = "TCGATGCATGGATCCTAGCTAGCCTTAAGGCCTAATGTGTAATC"
+
+class kmer_test_case(unittest.TestCase):
+    """Tests the k-mer encoding and counting"""
+
+    def test_canonical(self):
+        """A read and its reverse complement have the same k-mers, and k-mers
+        with an N or past the end of the read are not valid"""
+        pair = make_pair([SEQ, REVCOMP, SEQ[:10] + "N" + SEQ[11:]], [SEQ] * 3)
+        pair.forward.lengths[0] = 30
+        kmers, valid = kmer_codes(pair.forward, 15)
+        self.assertEqual(valid[0].sum(), 16)
+        self.assertEqual(valid[1].sum(), len(SEQ) - 14)
+        self.assertEqual(set(kmers[0][valid[0]].tolist()) -
+                         set(kmers[1][valid[1]].tolist()), set())
+        self.assertFalse(valid[2][:11].any())
+        self.assertTrue(valid[2][11:].all())
+
+    def test_sketch(self):
+        """The sketch counts repeated k-mers and never underestimates"""
+        sketch = CountMinSketch(width=1000, depth=3)
+        kmers = np.array([1, 2, 2, 3, 3, 3], dtype=np.uint64)
+        sketch.add(kmers)
+        estimates = sketch.query(np.array([1, 2, 3], dtype=np.uint64))
+        self.assertTrue((estimates >= [1, 2, 3]).all())
+        self.assertEqual(estimates.tolist(), [1, 2, 3])
+
+class normalize_test_case(unittest.TestCase):
+    """Tests that high coverage reads are normalized"""
+    def setUp(self):
+        self.testDir = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test")
+        self.readPath = os.path.join(self.testDir, "reads")
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_normalize_phix(self):
+        """The phix reads are about 75x coverage, so normalizing to 10x drops
+        most of them"""
+        norm = Normalizer(forwardPath    = os.path.join(self.readPath, "SRR353630_2500_1.fastq.gz"),
+                          reversePath    = os.path.join(self.readPath, "SRR353630_2500_2.fastq.gz"),
+                          forwardOutFile = "norm_1.fastq.gz",
+                          reverseOutFile = "norm_2.fastq.gz",
+                          outDir         = self.outDir,
+                          cutoff         = 10,
+                          chunkSize      = 20,
+                          batchSize      = 500,
+                          procs          = 2)
+        self.assertEqual(norm.stats["pairsIn"], 2500)
+        self.assertTrue(norm.keptFraction < 0.5)
+        with gzip.open(norm.forwardOutFile, "rb") as f:
+            self.assertEqual(f.read().count(b"\n"), 4 * norm.stats["pairsOut"])
+
+    def test_normalize_config(self):
+        """The derived config points to the normalized reads"""
+        config = ConfigParse(os.path.join(self.testDir, "phix174.config"))
+        yamlOut = os.path.join(self.outDir, "reads1.yaml")
+        newConfig = normalize_config(config, self.outDir, yamlOut, cutoff=10)
+        pairs = newConfig.params["lib_seq"][0]["pairs"]
+        self.assertEqual(pairs, [(os.path.join(self.outDir, "SRR353630_2500_1.fastq.gz"),
+                                  os.path.join(self.outDir, "SRR353630_2500_2.fastq.gz"))])
+        self.assertTrue(all(os.path.exists(x) for x in pairs[0]))
+        self.assertTrue(os.path.exists(yamlOut))
+        #the original config is unchanged
+        self.assertEqual(os.path.dirname(config.params["lib_seq"][0]["pairs"][0][0]),
+                         self.readPath)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for earlystop.py
+"""
+
+import unittest
+from gloTK.earlystop import RunWatcher, STAGE, stage_n50
+from gloTK.scripts.glotk_sweep import MerRunner
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+class FakeRunner:
+    """stands in for a MerRunner"""
+    def __init__(self, runName, assemblyDir, running=True):
+        self.runName = runName
+        self.thisAssemblyDir = assemblyDir
+        self.running = running
+        self.stopped = False
+
+    def is_running(self):
+        return self.running
+
+    def stop(self):
+        self.stopped = True
+
+class run_watcher_test_case(unittest.TestCase):
+    """Tests that runs far behind the others are stopped"""
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def make_run(self, name, uutigLength, finished=True):
+        """makes an assembly directory with a UUtigs.fa of one sequence"""
+        runDir = os.path.join(self.outDir, name)
+        os.makedirs(os.path.join(runDir, STAGE))
+        os.makedirs(os.path.join(runDir, "checkpoints"))
+        with open(os.path.join(runDir, STAGE, "UUtigs.fa"), "w") as f:
+            print(">UUtig1\n{}".format("A" * uutigLength), file=f)
+        if finished:
+            open(os.path.join(runDir, "checkpoints", STAGE + ".ckpt"), "w").close()
+        return runDir
+
+    def test_stage_n50(self):
+        """The N50 is only measured once the stage is finished"""
+        self.assertEqual(stage_n50(self.make_run("done", 500)), 500)
+        self.assertEqual(stage_n50(self.make_run("writing", 500, finished=False)), None)
+
+    def test_check(self):
+        """Only running runs below the margin are stopped, and nothing is
+        stopped until there are enough measured runs"""
+        watcher = RunWatcher(0.5, minRuns=3)
+        runners = [FakeRunner("best", self.make_run("best", 1000), running=False),
+                   FakeRunner("good", self.make_run("good", 600)),
+                   FakeRunner("bad", self.make_run("bad", 100))]
+        for runner in runners[1:]:
+            watcher.add(runner)
+        self.assertEqual(watcher.check(), [])
+        watcher.add(runners[0])
+        self.assertEqual(watcher.check(), ["bad"])
+        self.assertEqual([x.stopped for x in runners], [False, False, True])
+        #a finished run is never stopped
+        watcher.add(FakeRunner("done", self.make_run("done", 10), running=False))
+        self.assertEqual(watcher.check(), [])
+        with self.assertRaises(ValueError):
+            RunWatcher(1.5)
+
+    def test_stop_runner(self):
+        """Stopping a MerRunner kills the children of run_meraculous.sh
+        too, and no report is made"""
+        cwd = os.getcwd()
+        os.chdir(self.outDir)
+        try:
+            os.makedirs("assemblies")
+            runner = MerRunner("test", "test.config", 0)
+            childPath = os.path.join(self.outDir, "child.pid")
+            runner.callString = "sleep 60 & echo $! > {}; wait".format(childPath)
+            thread = threading.Thread(target=runner.meraculous_runner)
+            thread.start()
+            while not os.path.exists(childPath) or not open(childPath).read():
+                time.sleep(0.05)
+            start = time.time()
+            runner.stop()
+            thread.join(10)
+            self.assertFalse(thread.is_alive())
+            self.assertTrue(time.time() - start < 10)
+            self.assertTrue(runner.returncode != 0)
+            with open(childPath) as f:
+                childPid = int(f.read())
+            #the child was killed, so it is gone or a zombie
+            try:
+                with open("/proc/{}/stat".format(childPid)) as f:
+                    self.assertEqual(f.read().rsplit(")", 1)[1].split()[0], "Z")
+            except FileNotFoundError:
+                pass
+            self.assertFalse(os.path.exists("reports"))
+        finally:
+            os.chdir(cwd)
+
+    def test_interrupt_runner(self):
+        """An interrupted MerRunner is killed without a report and isn't
+        marked as stopped early, and one interrupted before it starts never
+        starts"""
+        os.makedirs(os.path.join(self.outDir, "assemblies"))
+        runner = MerRunner("test", "test.config", 0, cwd=self.outDir)
+        runner.callString = "sleep 60"
+        thread = threading.Thread(target=runner.meraculous_runner)
+        thread.start()
+        while not runner.is_running():
+            time.sleep(0.05)
+        runner.interrupt()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(runner.returncode != 0)
+        self.assertFalse(runner.stopped)
+        self.assertFalse(os.path.exists(os.path.join(self.outDir, "reports")))
+        late = MerRunner("late", "late.config", 0, cwd=self.outDir)
+        late.interrupt()
+        late.meraculous_runner()
+        self.assertEqual((late.process, late.returncode), (None, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for errcorrect.py
+"""
+
+import unittest
+from gloTK.diginorm import CountMinSketch
+from gloTK.errcorrect import correct_block, Corrector
+from gloTK.tests.test_readprep import make_pair
+
+import gzip
+import os
+import random
+import shutil
+import tempfile
+
+class correct_test_case(unittest.TestCase):
+    """Tests that errors are corrected from a simulated genome"""
+    def setUp(self):
+        random.seed(1)
+        self.genome = "".join(random.choice("ACGT") for i in range(3000))
+        self.outDir = tempfile.mkdtemp()
+        self.truth = []
+        reads = [[], []]
+        for i in range(600):
+            start = random.randrange(len(self.genome) - 300)
+            forward = self.genome[start:start + 100]
+            reverse = self.genome[start + 200:start + 300]
+            self.truth.append((forward, reverse))
+            for mate, seq in enumerate([forward, reverse]):
+                seq = list(seq)
+                #every fifth read gets one error
+                if i % 5 == 0:
+                    pos = random.randrange(100)
+                    seq[pos] = random.choice([x for x in "ACGT" if x != seq[pos]])
+                reads[mate].append("".join(seq))
+        self.paths = []
+        for mate in [0, 1]:
+            path = os.path.join(self.outDir, "sim_{}.fastq.gz".format(mate + 1))
+            with gzip.open(path, "wt") as f:
+                for j, seq in enumerate(reads[mate]):
+                    print("@read{}\n{}\n+\n{}".format(j, seq, "I" * len(seq)), file=f)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def read_output(self, path):
+        with gzip.open(path, "rt") as f:
+            return f.read().split("\n")[1::4]
+
+    def test_correct(self):
+        """Nearly all of the errors are fixed and no correct read is changed"""
+        for procs in [1, 2]:
+            correct = Corrector(forwardPath    = self.paths[0],
+                                reversePath    = self.paths[1],
+                                forwardOutFile = "out{}_1.fastq.gz".format(procs),
+                                reverseOutFile = "out{}_2.fastq.gz".format(procs),
+                                outDir         = self.outDir,
+                                ksize          = 21,
+                                sketchWidth    = 2**16,
+                                procs          = procs,
+                                batchSize      = 100)
+            forwards = self.read_output(correct.forwardOutFile)
+            wrong = sum(seq != truth[0] for seq, truth in zip(forwards, self.truth))
+            self.assertEqual(correct.stats["pairsOut"], 600)
+            self.assertTrue(correct.stats["forwardBasesCorrected"] >= 110)
+            self.assertTrue(wrong <= 5)
+
+    def test_no_solid_kmers(self):
+        """Reads are left alone when none of their k-mers can be trusted"""
+        pair = make_pair([self.genome[:50]], [self.genome[:50]])
+        corrections = correct_block(CountMinSketch(1000, 2), pair.forward, k=21)
+        self.assertEqual(corrections.tolist(), [0])
+
+if __name__ == '__main__':
+    unittest.main()
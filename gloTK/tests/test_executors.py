@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for executors.py
+"""
+
+import unittest
+from gloTK.executors import CANCELLED, LocalExecutor, SgeExecutor, SlurmExecutor
+from gloTK.scripts.glotk_sweep import MerRunner
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+FAKE_SLURM = os.path.join(os.path.abspath(os.path.dirname(__file__)), "fake_slurm")
+
+class slurm_test_case(unittest.TestCase):
+    """Tests SlurmExecutor with the fake slurm commands in tests/fake_slurm"""
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+        self.oldEnv = {x: os.environ.get(x) for x in ["PATH", "FAKE_SLURM_DIR"]}
+        os.environ["PATH"] = FAKE_SLURM + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_SLURM_DIR"] = os.path.join(self.outDir, "slurm")
+        self.executor = SlurmExecutor(os.path.join(self.outDir, "jobs"),
+                                      queue="long", extraArgs="--time=1:00:00",
+                                      pollInterval=0.1)
+        self.logs = (os.path.join(self.outDir, "out.log"),
+                     os.path.join(self.outDir, "err.log"))
+
+    def tearDown(self):
+        for key, value in self.oldEnv.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        shutil.rmtree(self.outDir)
+
+    def test_exit_code(self):
+        """The exit status and output of a job come back, and the job script
+        asks for the processors and memory of the run"""
+        returncode, rusage, peakRss = self.executor.run(
+            "job1", "pwd; echo oops >&2; exit 3", self.outDir, self.logs,
+            procs=4, memGB=1.5)
+        self.assertEqual(returncode, 3)
+        self.assertEqual((rusage, peakRss), (None, None))
+        with open(self.logs[0]) as f:
+            self.assertEqual(f.read().strip(), os.path.realpath(self.outDir))
+        with open(self.logs[1]) as f:
+            self.assertEqual(f.read().strip(), "oops")
+        with open(os.path.join(self.outDir, "jobs", "job1.sh")) as f:
+            script = f.read()
+        for option in ["--cpus-per-task=4", "--mem=1536M", "--partition=long",
+                       "--time=1:00:00", "--job-name=job1"]:
+            self.assertIn("#SBATCH {}\n".format(option), script)
+
+    def test_cancel(self):
+        """A cancelled job is killed and run() returns"""
+        jobs = []
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.executor.run(
+            "job2", "sleep 60", self.outDir, self.logs, started=jobs.append)))
+        thread.start()
+        while not jobs:
+            time.sleep(0.05)
+        start = time.time()
+        self.executor.cancel(jobs[0])
+        thread.join(20)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(time.time() - start < 20)
+        self.assertEqual(result[0][0], CANCELLED)
+
+    def test_attach(self):
+        """A restarted sweep can wait for a job that is still running, or get
+        the exit status of one that finished while it was gone"""
+        jobs = []
+        thread = threading.Thread(target=self.executor.run, args=(
+            "job3", "sleep 1; exit 5", self.outDir, self.logs),
+            kwargs={"started": jobs.append})
+        thread.start()
+        while not jobs:
+            time.sleep(0.05)
+        self.assertEqual(self.executor.attach("job3", jobs[0].jobId)[0], 5)
+        thread.join(20)
+        self.assertEqual(self.executor.attach("job3", jobs[0].jobId)[0], 5)
+        #a job that is gone without an exit status can't be attached to
+        os.remove(os.path.join(self.outDir, "jobs", "job3.exit"))
+        self.assertEqual(self.executor.attach("job3", jobs[0].jobId), None)
+
+    def test_mer_runner(self):
+        """A MerRunner with a batch executor runs in allAssembliesDir and
+        records its exit status"""
+        os.makedirs(os.path.join(self.outDir, "assemblies"))
+        runner = MerRunner("test", "test.config", 0, cwd=self.outDir,
+                           executor=self.executor)
+        runner.callString = "pwd; exit 2"
+        #there is no assembly to report on
+        runner._generate_report = lambda: None
+        runner.meraculous_runner()
+        self.assertEqual(runner.returncode, 2)
+        self.assertEqual(runner.peakGB, None)
+        with open(runner.stdoutLog) as f:
+            self.assertIn(os.path.join(os.path.realpath(self.outDir), "assemblies"),
+                          f.read())
+        #a runner with the job of an earlier sweep waits for it instead of
+        # submitting the run again
+        started = []
+        again = MerRunner("test", "test.config", 0, cwd=self.outDir,
+                          executor=self.executor, onStart=started.append)
+        again._generate_report = lambda: None
+        again.jobId = runner.process.jobId
+        again.meraculous_runner()
+        self.assertEqual(again.returncode, 2)
+        self.assertEqual(started, [again])
+        self.assertEqual(again.process.jobId, runner.process.jobId)
+        with open(os.path.join(os.environ["FAKE_SLURM_DIR"], "last_job_id")) as f:
+            self.assertEqual(f.read(), runner.process.jobId)
+
+class executor_test_case(unittest.TestCase):
+    """Tests the local executor and the sge job scripts"""
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_local(self):
+        """The local executor measures what it runs"""
+        logs = (os.path.join(self.outDir, "out.log"),
+                os.path.join(self.outDir, "err.log"))
+        returncode, rusage, peakRss = LocalExecutor().run(
+            "local", "echo hi; exit 1", self.outDir, logs)
+        self.assertEqual(returncode, 1)
+        self.assertTrue(rusage is not None)
+        with open(logs[0]) as f:
+            self.assertEqual(f.read(), "hi\n")
+
+    def test_sge_script(self):
+        """SGE scripts ask for memory per slot in a parallel environment and
+        write the exit status"""
+        executor = SgeExecutor(self.outDir, queue="all.q", peName="threads")
+        scriptPath, exitPath = executor.write_script(
+            "job", "run_meraculous.sh", "/data/sweep", ("o.log", "e.log"),
+            procs=4, memGB=8)
+        with open(scriptPath) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "#!/bin/sh")
+        for line in ["#$ -pe threads 4", "#$ -l h_vmem=2048M", "#$ -q all.q",
+                     "#$ -wd /data/sweep", "cd /data/sweep", "run_meraculous.sh",
+                     "echo $? > {}".format(exitPath)]:
+            self.assertIn(line, lines)
+
+if __name__ == '__main__':
+    unittest.main()
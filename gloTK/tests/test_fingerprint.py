@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for fingerprint.py
+"""
+
+import unittest
+import gloTK.fingerprint
+from gloTK.fingerprint import fingerprint_files, FingerprintStore
+
+import os
+import shutil
+import tempfile
+
+class fingerprint_test_case(unittest.TestCase):
+    """Tests the read file fingerprints and the fingerprint store"""
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+        self.chunkSize = gloTK.fingerprint.CHUNK_SIZE
+        #small chunks so that the test files have several of them
+        gloTK.fingerprint.CHUNK_SIZE = 1000
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.outDir, "reads{}.fastq".format(i))
+            with open(path, "wb") as f:
+                f.write(bytes(range(256)) * (20 + i))
+            self.paths.append(path)
+
+    def tearDown(self):
+        gloTK.fingerprint.CHUNK_SIZE = self.chunkSize
+        shutil.rmtree(self.outDir)
+
+    def test_parallel(self):
+        """The fingerprints don't depend on the number of processes, and
+        different files have different fingerprints"""
+        serial = fingerprint_files(self.paths)
+        parallel = fingerprint_files(self.paths, procs=3)
+        self.assertEqual(serial, parallel)
+        self.assertEqual(len(set(serial.values())), 3)
+
+    def test_store(self):
+        """Files are only rehashed when their size or mtime changes"""
+        storePath = os.path.join(self.outDir, "read_fingerprints.yaml")
+        first = FingerprintStore(storePath).fingerprints(self.paths)
+        store = FingerprintStore(storePath)
+        self.assertTrue(all(store.is_current(x) for x in self.paths))
+        with open(self.paths[0], "ab") as f:
+            f.write(b"more")
+        self.assertFalse(store.is_current(self.paths[0]))
+        self.assertTrue(store.is_current(self.paths[1]))
+        second = store.fingerprints(self.paths)
+        self.assertNotEqual(first[self.paths[0]], second[self.paths[0]])
+        self.assertEqual(first[self.paths[1]], second[self.paths[1]])
+
+    def test_changed_while_hashing(self):
+        """A file with an old fingerprint that changes while it is hashed
+        again raises an error instead of returning the old fingerprint"""
+        storePath = os.path.join(self.outDir, "read_fingerprints.yaml")
+        FingerprintStore(storePath).fingerprints(self.paths)
+        with open(self.paths[0], "ab") as f:
+            f.write(b"more")
+        def append_while_hashing(paths, procs=1):
+            results = fingerprint_files(paths, procs)
+            with open(self.paths[0], "ab") as f:
+                f.write(b"even more")
+            return results
+        gloTK.fingerprint.fingerprint_files = append_while_hashing
+        try:
+            with self.assertRaises(ValueError):
+                FingerprintStore(storePath).fingerprints(self.paths)
+        finally:
+            gloTK.fingerprint.fingerprint_files = fingerprint_files
+        #the next try hashes it again
+        store = FingerprintStore(storePath)
+        self.assertFalse(store.is_current(self.paths[0]))
+        self.assertEqual(store.fingerprints(self.paths)[self.paths[0]],
+                         fingerprint_files([self.paths[0]])[self.paths[0]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for insertsize.py
+"""
+
+import unittest
+from gloTK import ConfigParse
+from gloTK.insertsize import estimate_insert_size, fit_insert_sizes, \
+     insert_config, sam_insert_sizes
+
+import numpy as np
+import os
+import shutil
+import tempfile
+
+class insert_size_test_case(unittest.TestCase):
+    """Tests estimating insert sizes from reads"""
+    def setUp(self):
+        self.testDir = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test")
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_fit(self):
+        """Outliers like chimeras don't change the fit"""
+        rng = np.random.RandomState(0)
+        sizes = np.concatenate([rng.normal(300, 30, 5000), [20000] * 50])
+        insertAvg, insertSdev, pairsUsed = fit_insert_sizes(sizes)
+        self.assertTrue(abs(insertAvg - 300) <= 2)
+        self.assertTrue(abs(insertSdev - 30) <= 2)
+        self.assertEqual(pairsUsed, 5000)
+
+    def test_sam(self):
+        """Only the first mate of properly paired, confidently mapped pairs
+        is counted"""
+        lines = ["@HD\tVN:1.0",
+                 "r1\t99\tc\t1\t42\t100M\t=\t201\t300\tA\tI",
+                 "r1\t147\tc\t201\t42\t100M\t=\t1\t-300\tA\tI",
+                 "r2\t83\tc\t301\t42\t100M\t=\t101\t-310\tA\tI",
+                 "r3\t99\tc\t1\t3\t100M\t=\t201\t250\tA\tI",
+                 "r4\t353\tc\t1\t42\t100M\t=\t201\t250\tA\tI"]
+        samPath = os.path.join(self.outDir, "test.sam")
+        with open(samPath, "w") as f:
+            print("\n".join(lines), file=f)
+        self.assertEqual(sam_insert_sizes(samPath).tolist(), [300, 310])
+
+    def test_overlap_fallback(self):
+        """Without a draft, short inserts are estimated from the overlapping
+        pairs and written into the config. Reverse complemented libraries and
+        libraries with too few overlapping pairs keep their values."""
+        config = ConfigParse(os.path.join(self.testDir, "phix174.config"))
+        lib_seq = config.params["lib_seq"][0]
+        self.assertIsNone(estimate_insert_size(lib_seq, self.outDir))
+        estimates = insert_config(config, self.outDir, minOverlapFraction=0.1)
+        estimate = estimates[lib_seq["name"]]
+        self.assertEqual(estimate["method"], "overlap")
+        self.assertTrue(100 < estimate["insertAvg"] < 300)
+        self.assertEqual(lib_seq["insertAvg"], str(estimate["insertAvg"]))
+        self.assertEqual(str(lib_seq).split()[2], str(estimate["insertAvg"]))
+        self.assertTrue(os.path.exists(os.path.join(self.outDir, "insert_sizes.yaml")))
+        lib_seq["isRevComped"] = "1"
+        self.assertIsNone(estimate_insert_size(lib_seq, self.outDir,
+                                               minOverlapFraction=0.1))
+
+    @unittest.skipIf(shutil.which("bowtie2") is None, "bowtie2 is not installed")
+    def test_draft(self):
+        """Reads are mapped to a draft assembly when there is one"""
+        reference = os.path.join(os.path.dirname(self.testDir), "meraculousTestRun",
+                                 "meraculous_gap_closure", "final.scaffolds.fa")
+        config = ConfigParse(os.path.join(self.testDir, "phix174.config"))
+        lib_seq = config.params["lib_seq"][0]
+        estimates = insert_config(config, self.outDir, draftPath=reference)
+        self.assertEqual(estimates[lib_seq["name"]]["method"], "bowtie2")
+
+if __name__ == '__main__':
+    unittest.main()
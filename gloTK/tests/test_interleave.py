@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for interleave.py
+"""
+
+import unittest
+from gloTK.interleave import check_names, deinterleave, interleave
+
+import gzip
+import os
+import shutil
+import tempfile
+
+class interleave_test_case(unittest.TestCase):
+    """Tests interleaving and deinterleaving read files"""
+    def setUp(self):
+        self.readPath = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test/reads/")
+        self.forwardPath = os.path.join(self.readPath, "SRR353630_2500_1.fastq.gz")
+        self.reversePath = os.path.join(self.readPath, "SRR353630_2500_2.fastq.gz")
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_round_trip(self):
+        """Interleaving and then deinterleaving gives back the same reads"""
+        interleaved = os.path.join(self.outDir, "interleaved.fastq.gz")
+        self.assertEqual(interleave(self.forwardPath, self.reversePath,
+                                    interleaved, threads=3, batchSize=300), 2500)
+        with gzip.open(interleaved, "rb") as f:
+            lines = f.read().split(b"\n")
+        with gzip.open(self.forwardPath, "rb") as f:
+            forward = f.read()
+        with gzip.open(self.reversePath, "rb") as f:
+            reverse = f.read()
+        self.assertEqual(lines[0:4], forward.split(b"\n")[0:4])
+        self.assertEqual(lines[4:8], reverse.split(b"\n")[0:4])
+        outputs = [os.path.join(self.outDir, "split_{}.fastq".format(x)) for x in [1, 2]]
+        self.assertEqual(deinterleave(interleaved, *outputs, batchSize=700), 2500)
+        with open(outputs[0], "rb") as f:
+            self.assertEqual(f.read(), forward)
+        with open(outputs[1], "rb") as f:
+            self.assertEqual(f.read(), reverse)
+
+    def test_names(self):
+        """Mates are matched with /1 and /2 suffixes and Casava comments, and
+        mismatched mates raise an error"""
+        check_names([b"@r1/1", b"@r2 1:N:0:1"], [b"@r1/2", b"@r2 2:N:0:1"])
+        with self.assertRaises(ValueError):
+            check_names([b"@r1/1", b"@r2/1"], [b"@r1/2", b"@r3/2"])
+
+    def test_mismatched_files(self):
+        """Files with different numbers of reads raise an error"""
+        short = os.path.join(self.outDir, "short.fastq")
+        with open(short, "w") as f:
+            print("@r1\nACGT\n+\nIIII", file=f)
+        with self.assertRaises(ValueError):
+            interleave(self.forwardPath, short,
+                       os.path.join(self.outDir, "out.fastq"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for ksearch.py
+"""
+
+import unittest
+from gloTK.ksearch import KSearch
+
+import math
+
+def peak(center):
+    """returns an objective with one peak at center"""
+    return lambda k: 10000 * math.exp(-((k - center) / 20) ** 2)
+
+def run_search(search, objective):
+    """runs a search to the end and returns the batches it made"""
+    batches = []
+    batch = search.next_batch()
+    while batch:
+        batches.append(batch)
+        search.record({k: objective(k) for k in batch})
+        batch = search.next_batch()
+    return batches
+
+class ksearch_test_case(unittest.TestCase):
+    """Tests that the k search finds the best k with few assemblies"""
+
+    def test_finds_peak(self):
+        """The peak is found with batches of one or several k values, at
+        either end of the range, with far fewer assemblies than a grid"""
+        for center in [29, 57, 109]:
+            for batchSize in [2, 4]:
+                search = KSearch(21, 127, batchSize=batchSize, minImprovement=0)
+                batches = run_search(search, peak(center))
+                self.assertTrue(abs(search.best - center) <= 1)
+                self.assertTrue(len(search.results) < 54 / 3)
+                self.assertTrue(all(len(x) <= batchSize for x in batches))
+                self.assertTrue(all(k % 2 for x in batches for k in x))
+
+    def test_threshold(self):
+        """The search stops once the objective stops improving, and failed
+        assemblies are never the best k"""
+        flat = lambda k: 1000 + k / 100
+        search = KSearch(21, 127, batchSize=2, minImprovement=0.01)
+        run_search(search, flat)
+        self.assertEqual(len(search.history), 4)
+        self.assertIn("improved", search.stopReason)
+        search = KSearch(20, 30, batchSize=2)
+        self.assertEqual((search.kMin, search.kMax), (21, 29))
+        search.record({23: None, 27: 5})
+        self.assertEqual(search.best, 27)
+        with self.assertRaises(ValueError):
+            KSearch(22, 22)
+
+if __name__ == '__main__':
+    unittest.main()
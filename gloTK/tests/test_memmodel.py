@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for memmodel.py
+"""
+
+import unittest
+from gloTK import ConfigParse
+from gloTK.memmodel import MemoryModel, file_bases, model_gb, read_bases
+from gloTK.scheduler import Job, ResourceScheduler
+
+import os
+import shutil
+import tempfile
+
+class memory_model_test_case(unittest.TestCase):
+    """Tests predicting and learning the memory of Meraculous runs"""
+    def setUp(self):
+        self.testDir = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test")
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_read_bases(self):
+        """Bases are counted exactly for small files and estimated from a
+        sample for large ones"""
+        path = os.path.join(self.testDir, "reads", "SRR353630_2500_1.fastq.gz")
+        self.assertEqual(file_bases(path), 375000)
+        self.assertTrue(abs(file_bases(path, sampleBytes=200000) - 375000) < 40000)
+        config = ConfigParse(os.path.join(self.testDir, "phix174.config"))
+        self.assertEqual(read_bases(config.params["lib_seq"]), 750000)
+
+    def test_model(self):
+        """Memory grows with the genome, the mer size and the reads"""
+        small = model_gb(0.1, 21, 10**9)
+        self.assertTrue(model_gb(1.0, 21, 10**9) > small)
+        self.assertTrue(model_gb(0.1, 41, 10**9) > small)
+        self.assertTrue(model_gb(0.1, 21, 10**11) > small)
+
+    def test_learning(self):
+        """Predictions are scaled by the observed peaks, and the history is
+        saved"""
+        historyPath = os.path.join(self.outDir, "memory_history.yaml")
+        model = MemoryModel(historyPath)
+        before = model.predict(1.0, 51, 10**10)
+        model.observe("run1", 1.0, 51, 10**10, 2 * model_gb(1.0, 51, 10**10))
+        self.assertAlmostEqual(model.factor(), 2.0)
+        self.assertAlmostEqual(model.predict(1.0, 51, 10**10), 2 * before)
+        self.assertAlmostEqual(MemoryModel(historyPath).factor(), 2.0)
+
+    def test_admission(self):
+        """The scheduler re-estimates waiting jobs, so a lower estimate lets a
+        job start alongside another one"""
+        model = MemoryModel(os.path.join(self.outDir, "memory_history.yaml"))
+        peak = model_gb(0.5, 21, 0)
+        #two runs don't fit before anything is learned
+        budget = 2 * peak * 1.1
+        running = []
+        def run(name):
+            def job(procs):
+                running.append(name)
+                if name == "first":
+                    model.observe(name, 0.5, 21, 0, 0.5 * peak)
+            return job
+        scheduler = ResourceScheduler(4, maxMem=budget)
+        scheduler.run([Job(x, run(x), estimate=lambda: model.predict(0.5, 21, 0))
+                       for x in ["first", "second", "third"]])
+        self.assertEqual(scheduler.launched[0], ("first", 4))
+        #after learning, the last two fit together and share the processors
+        self.assertEqual([x[1] for x in scheduler.launched[1:]], [2, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,6 +22,7 @@ This class tests the methods for the MerRunAnalyzer class. Important things to
 test include if the class correctly moves files and generates a readable output.
 """
 from gloTK import MerRunAnalyzer
+from gloTK.merrunanalyzer import n50
 
 import unittest
 import argparse
@@ -119,5 +120,19 @@ class merParse_test_case(unittest.TestCase):
         #everything is removed with the tearDown() method. No need to modify
         # here.
 
+    def test_stats(self):
+        """The N50s of the assembly files are measured, preferring the final
+        results over the gap closure output"""
+        self.assertEqual(n50([10, 2, 3, 5]), 10)
+        self.assertEqual(n50([4, 4, 3, 3, 2]), 4)
+        self.assertEqual(n50([]), 0)
+        reporter = MerRunAnalyzer(self.testRunDir, self.outputParentDir,
+                                  self.censor)
+        stats = reporter.stats()
+        self.assertEqual(sorted(stats), ["contig_n50", "contig_total",
+                                         "scaffold_n50", "scaffold_total",
+                                         "uutig_n50", "uutig_total"])
+        self.assertTrue(stats["scaffold_n50"] > 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for preflight.py
+"""
+
+import unittest
+from gloTK.preflight import plan_stages, Preprocessor, ReadProfile
+from gloTK.readprep import AdapterTrimmer, LengthFilter
+
+import os
+import shutil
+import tempfile
+
+import yaml
+
+class preflight_test_case(unittest.TestCase):
+    """Tests the read profiler and the plans it makes"""
+    def setUp(self):
+        self.readPath = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test/reads/")
+        self.pairs = [(os.path.join(self.readPath, "SRR353630_2500_1.fastq.gz"),
+                       os.path.join(self.readPath, "SRR353630_2500_2.fastq.gz"))]
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_profile(self):
+        """The phix reads have adapters, and the profile is the same with
+        several processes"""
+        profile = ReadProfile(self.pairs, sampleSize=2000, batchSize=300)
+        self.assertEqual(profile.sampled, 2100)
+        self.assertTrue(profile.adapterRate > 0.01)
+        self.assertTrue(profile.plan["trim"])
+        self.assertEqual(len(profile.meanQuality), 150)
+        parallel = ReadProfile(self.pairs, sampleSize=2000, batchSize=300, procs=2)
+        self.assertEqual(profile.report(), parallel.report())
+        outFile = os.path.join(self.outDir, "profile.yaml")
+        profile.save_yaml(outFile)
+        with open(outFile) as f:
+            self.assertEqual(yaml.safe_load(f)["plan"], profile.plan)
+
+    def test_plan_stages(self):
+        """Only the steps in the plan are run"""
+        self.assertEqual(plan_stages({"trim": False, "qualityTrim": False,
+                                      "merge": True, "dedup": False},
+                                     merging=False), [])
+        stages = plan_stages({"trim": True})
+        self.assertEqual([type(x) for x in stages], [AdapterTrimmer, LengthFilter])
+
+    def test_preprocessor(self):
+        """The preprocessor profiles the reads when it isn't given a plan"""
+        prep = Preprocessor(forwardPath    = self.pairs[0][0],
+                            reversePath    = self.pairs[0][1],
+                            forwardOutFile = "prep_1.fastq.gz",
+                            reverseOutFile = "prep_2.fastq.gz",
+                            outDir         = self.outDir,
+                            sampleSize     = 1000)
+        self.assertTrue(prep.plan["trim"])
+        self.assertTrue(prep.stats["forwardAdapterTrimmed"] > 0)
+        self.assertEqual(prep.mergedOutFile, None)
+
+    def test_preprocessor_settings(self):
+        """The reads are profiled with the same settings the steps use, so a
+        window quality that no read drops below doesn't plan quality
+        trimming, and a longer overlapMin doesn't plan merging"""
+        prep = Preprocessor(forwardPath    = self.pairs[0][0],
+                            reversePath    = self.pairs[0][1],
+                            forwardOutFile = "prep_1.fastq.gz",
+                            reverseOutFile = "prep_2.fastq.gz",
+                            mergedOutFile  = "prep_merged.fastq.gz",
+                            outDir         = self.outDir,
+                            sampleSize     = 1000,
+                            windowQual     = 2,
+                            overlapMin     = 140)
+        self.assertFalse(prep.plan["qualityTrim"])
+        self.assertFalse(prep.plan["merge"])
+        self.assertEqual(prep.mergedOutFile, None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,6 +28,9 @@ import shutil
 
 #call the assembly with the shell
 import subprocess
+import yaml
+
+from gloTK.bgzf import is_bgzf
 
 class assembly_test_case(unittest.TestCase):
     """Tests a swept assembly"""
@@ -120,6 +123,116 @@ class assembly_test_case(unittest.TestCase):
         for each in [os.path.join(self.gloTKDir, x) for x in fileList]:
             self.assertTrue(os.path.exists(each))
 
+    def test_resume(self):
+        """An interrupted setup is picked up again by running glotk-project
+        in the same directory, but a finished project is never set up
+        twice"""
+        if not os.path.exists(self.gloTKDir):
+            os.makedirs(self.gloTKDir)
+        os.chdir(self.gloTKDir)
+        callString = ["glotk-project",
+                      "-i", self.goodConfigDir,
+                      "-g", "pleurobrachia",
+                      "-s", "bachei",
+                      "-m", "copy"]
+        p = subprocess.run(callString, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        self.assertFalse("ValueError" in p.stderr)
+        #pretend the import was interrupted after the first read file
+        readPath = os.path.join(self.gloTKDir, "gloTK_reads/reads0/SRR353630_2500_2.fastq.gz")
+        os.remove(readPath)
+        with open(os.path.join(self.gloTKDir, "gloTK_info/project_init_state.yaml"), "w") as f:
+            print("inputConfig: {}\nstatus: importing".format(self.goodConfigDir), file=f)
+        p = subprocess.run(callString, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        self.assertFalse("ValueError" in p.stderr)
+        self.assertTrue(os.path.exists(readPath))
+        p = subprocess.run(callString, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        self.assertTrue("gloTK project directory already" in p.stderr)
+
+    def interrupt(self, done):
+        """rewrites the saved state as if the setup stopped after `done`"""
+        statePath = os.path.join(self.gloTKDir, "gloTK_info/project_init_state.yaml")
+        with open(statePath, "w") as f:
+            f.write(yaml.safe_dump({"inputConfig": self.goodConfigDir,
+                                    "status": "importing",
+                                    "done": done}))
+
+    def test_resume_bgzf(self):
+        """A setup that stopped after recompressing one read file picks up
+        with the next one"""
+        if not os.path.exists(self.gloTKDir):
+            os.makedirs(self.gloTKDir)
+        os.chdir(self.gloTKDir)
+        callString = ["glotk-project",
+                      "-i", self.goodConfigDir,
+                      "-g", "pleurobrachia",
+                      "-s", "bachei",
+                      "-z"]
+        p = subprocess.run(callString, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        self.assertFalse("ValueError" in p.stderr)
+        reads0 = os.path.join(self.gloTKDir, "gloTK_reads/reads0")
+        first = os.path.join(reads0, "SRR353630_2500_1.fastq.gz")
+        second = os.path.join(reads0, "SRR353630_2500_2.fastq.gz")
+        #put back the symlink of the file that was not recompressed yet
+        os.remove(second)
+        os.symlink(os.path.join(self.testRunDir, "reads/SRR353630_2500_2.fastq.gz"),
+                   second)
+        self.interrupt({"bgzf": [first]})
+        p = subprocess.run(callString, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        self.assertFalse("ValueError" in p.stderr)
+        for path in [first, second]:
+            self.assertFalse(os.path.islink(path))
+            self.assertTrue(is_bgzf(path))
+
+    def test_resume_bin(self):
+        """A setup that stopped while binning a pair writes that pair again,
+        and skips the pairs that were binned"""
+        if not os.path.exists(self.gloTKDir):
+            os.makedirs(self.gloTKDir)
+        os.chdir(self.gloTKDir)
+        callString = ["glotk-project",
+                      "-i", self.goodConfigDir,
+                      "-g", "pleurobrachia",
+                      "-s", "bachei",
+                      "-b"]
+        p = subprocess.run(callString, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        self.assertFalse("ValueError" in p.stderr)
+        readPath = os.path.join(self.gloTKDir, "gloTK_reads/reads0/SRR353630_2500_2.fastq.gz")
+        with open(readPath, "rb") as f:
+            binned = f.read()
+        #cut the pair off halfway through
+        with open(readPath, "wb") as f:
+            f.write(binned[:len(binned)//2])
+        self.interrupt({})
+        p = subprocess.run(callString, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        self.assertFalse("ValueError" in p.stderr)
+        with open(readPath, "rb") as f:
+            self.assertEqual(f.read(), binned)
+        #and once it is recorded as done, it is left alone
+        with open(os.path.join(self.gloTKDir, "gloTK_info/project_init_state.yaml")) as f:
+            done = yaml.safe_load(f)["done"]
+        self.assertTrue(readPath in done["bin"])
+        self.interrupt(done)
+        mtime = os.stat(readPath).st_mtime_ns
+        p = subprocess.run(callString, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        self.assertFalse("ValueError" in p.stderr)
+        self.assertEqual(os.stat(readPath).st_mtime_ns, mtime)
+
     def tearDown(self):
         #delete the test files once done
         os.chdir(self.testRunDir)
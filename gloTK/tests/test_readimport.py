@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for readimport.py
+"""
+
+import unittest
+from gloTK import ConfigParse
+from gloTK.readimport import import_file, import_reads
+
+import filecmp
+import os
+import shutil
+import tempfile
+
+class readimport_test_case(unittest.TestCase):
+    """Tests the read import strategies"""
+    def setUp(self):
+        self.testDir = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test")
+        self.readPath = os.path.join(self.testDir, "reads")
+        self.sources = [os.path.join(self.readPath, "SRR353630_2500_{}.fastq.gz".format(x))
+                        for x in [1, 2]]
+        self.outDir = tempfile.mkdtemp()
+        self.dests = [os.path.join(self.outDir, os.path.basename(x)) for x in self.sources]
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_strategies(self):
+        """Every strategy makes a file with the same contents, and running
+        the import again skips the files that are done"""
+        for strategy in ["symlink", "hardlink", "reflink", "copy"]:
+            outDir = os.path.join(self.outDir, strategy)
+            os.mkdir(outDir)
+            jobs = [(x, os.path.join(outDir, os.path.basename(x))) for x in self.sources]
+            try:
+                actions = import_reads(jobs, strategy, procs=2)
+            except ValueError:
+                #hardlinks don't work across filesystems
+                self.assertEqual(strategy, "hardlink")
+                continue
+            for source, dest in jobs:
+                self.assertTrue(filecmp.cmp(source, dest, shallow=False))
+                self.assertTrue(actions[dest].endswith("ed"))
+            self.assertEqual(set(import_reads(jobs, strategy).values()), {"skipped"})
+
+    def test_resume(self):
+        """A partial copy is finished, and a bad one is caught"""
+        with open(self.sources[0], "rb") as f:
+            data = f.read()
+        with open(self.dests[0] + ".part", "wb") as f:
+            f.write(data[:1000])
+        self.assertEqual(import_file((self.sources[0], self.dests[0], "copy", True))[1:],
+                         ("copied", None))
+        self.assertTrue(filecmp.cmp(self.sources[0], self.dests[0], shallow=False))
+        self.assertFalse(os.path.exists(self.dests[0] + ".part"))
+        with open(self.dests[1] + ".part", "wb") as f:
+            f.write(b"x" * 1000)
+        dest, action, error = import_file((self.sources[1], self.dests[1], "copy", True))
+        self.assertTrue("did not match" in error)
+        self.assertFalse(os.path.exists(self.dests[1]))
+
+    def test_duplicates(self):
+        """Importing two files to the same place is an error"""
+        with self.assertRaises(ValueError):
+            import_reads([(self.sources[0], self.dests[0])] * 2, "copy")
+
+    def test_config(self):
+        """sym_reads_new_config copies the reads and updates the config"""
+        config = ConfigParse(os.path.join(self.testDir, "phix174.config"))
+        newConfig = config.sym_reads_new_config(self.outDir, strategy="copy", procs=2)
+        self.assertEqual(newConfig.params["lib_seq"][0]["pairs"][0], self.dests)
+        self.assertTrue(all(os.path.isfile(x) and not os.path.islink(x)
+                            for x in self.dests))
+
+if __name__ == '__main__':
+    unittest.main()
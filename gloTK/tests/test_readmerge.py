@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for readmerge.py
+"""
+
+import unittest
+from gloTK import fastq
+from gloTK.readmerge import PairMerger
+from gloTK.readprep import Trimmer
+
+import gzip
+import os
+import random
+import shutil
+import tempfile
+
+def revcomp(seq):
+    return seq[::-1].translate(str.maketrans("ACGT", "TGCA"))
+
+def make_pair(records):
+    """makes a PairBlock from a list of (forward, forwardQual, reverse,
+    reverseQual) tuples"""
+    forward = "".join("@read{}/1\n{}\n+\n{}\n".format(i, r[0], r[1])
+                      for i, r in enumerate(records)).encode()
+    reverse = "".join("@read{}/2\n{}\n+\n{}\n".format(i, r[2], r[3])
+                      for i, r in enumerate(records)).encode()
+    return fastq.PairBlock.from_bytes(forward, reverse)
+
+class merge_test_case(unittest.TestCase):
+    """Tests that overlapping pairs are merged correctly"""
+    def setUp(self):
+        rand = random.Random(100)
+        self.insert = "".join(rand.choice("ACGT") for i in range(200))
+        self.other = "".join(rand.choice("ACGT") for i in range(400))
+
+    def test_merge_overlap(self):
+        """A 200bp insert read with 150bp reads merges back into the insert,
+        and a pair from a long insert is left alone."""
+        r1 = self.insert[:150]
+        r2 = revcomp(self.insert)[:150]
+        pair = make_pair([(r1, "I" * 150, r2, "I" * 150),
+                          (self.other[:150], "I" * 150,
+                           revcomp(self.other)[:150], "I" * 150)])
+        PairMerger(overlapMin=30)(pair)
+        self.assertEqual(len(pair), 1)
+        self.assertEqual(pair.forward.names, [b"read1/1"])
+        self.assertEqual(len(pair.merged), 1)
+        self.assertEqual(pair.merged.to_bytes().split(b"\n")[1],
+                         self.insert.encode())
+        self.assertEqual(pair.hists["insertSize"][200], 1)
+
+    def test_quality_consensus(self):
+        """A low quality error in one read is fixed by the other read"""
+        r1 = list(self.insert[:150])
+        r1[120] = "A" if r1[120] != "A" else "C"
+        q1 = "I" * 120 + "#" + "I" * 29
+        r2 = revcomp(self.insert)[:150]
+        pair = make_pair([("".join(r1), q1, r2, "I" * 150)])
+        PairMerger(overlapMin=30)(pair)
+        lines = pair.merged.to_bytes().split(b"\n")
+        self.assertEqual(lines[1], self.insert.encode())
+        self.assertTrue(lines[3][120] < ord("I"))
+
+    def test_short_insert(self):
+        """Inserts shorter than the reads are cut to the insert"""
+        short = self.insert[:100]
+        pair = make_pair([(short + "AGATCGGAAGAGCACACGTCTGAACTCCAGTCAC",
+                           "I" * 134,
+                           revcomp(short) + "AGATCGGAAGAGCGTCGTGTAGGGAAAGAGTG",
+                           "I" * 132)])
+        PairMerger(overlapMin=30)(pair)
+        self.assertEqual(pair.merged.to_bytes().split(b"\n")[1],
+                         short.encode())
+
+class trimmer_merge_test_case(unittest.TestCase):
+    """Tests that Trimmer writes the merged output like Seqprep"""
+    def setUp(self):
+        self.readPath = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test/reads/")
+        self.forwardPath = os.path.join(self.readPath, "SRR353630_2500_1.fastq.gz")
+        self.reversePath = os.path.join(self.readPath, "SRR353630_2500_2.fastq.gz")
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_merged_phix(self):
+        trim = Trimmer(forwardPath    = self.forwardPath,
+                       reversePath    = self.reversePath,
+                       forwardOutFile = "out_forward.fastq.gz",
+                       reverseOutFile = "out_reverse.fastq.gz",
+                       mergedOutFile  = "out_merged.fastq.gz",
+                       prettyOutFile  = "pretty.txt.gz",
+                       outDir         = self.outDir,
+                       procs          = 2,
+                       batchSize      = 500)
+        self.assertTrue(trim.stats["pairsMerged"] > 0)
+        self.assertEqual(trim.insertSizes.sum(), trim.stats["pairsMerged"])
+        with gzip.open(trim.mergedOutFile, "rb") as f:
+            self.assertEqual(f.read().count(b"\n"), 4 * trim.stats["mergedOut"])
+        self.assertTrue(os.path.exists(
+            os.path.join(self.outDir, "glotk_trim.insert_sizes.txt")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for readprep.py
+"""
+
+import unittest
+from gloTK import fastq
+from gloTK.readprep import AdapterTrimmer, LengthFilter, QualityBinner, QualityTrimmer, \
+     ReadPipeline, Trimmer
+
+import gzip
+import os
+import shutil
+import tempfile
+
+ADAPTER = "AGATCGGAAGAGCACACGTC"
+INSERT = "GATTACACATTAGGCCTTAAGGCTAGCTAGGATCCATGCATCGA"
+
+def make_pair(forwardSeqs, reverseSeqs, qual="I"):
+    """makes a PairBlock from lists of sequences"""
+    def raw(seqs):
+        return "".join("@read{}\n{}\n+\n{}\n".format(i, s, qual * len(s))
+                       for i, s in enumerate(seqs)).encode()
+    return fastq.PairBlock.from_bytes(raw(forwardSeqs), raw(reverseSeqs))
+
+class adapter_test_case(unittest.TestCase):
+    """Tests that adapters are found and trimmed correctly"""
+
+    def test_full_adapter(self):
+        """An adapter in the middle of the read is trimmed along with
+        everything after it."""
+        pair = make_pair([INSERT + ADAPTER + "TTTT", INSERT + "TTTT"],
+                         [INSERT, INSERT])
+        AdapterTrimmer()(pair)
+        self.assertEqual(pair.forward.lengths.tolist(),
+                         [len(INSERT), len(INSERT) + 4])
+        self.assertEqual(pair.stats["forwardAdapterTrimmed"], 1)
+        self.assertEqual(pair.stats["reverseAdapterTrimmed"], 0)
+
+    def test_partial_adapter_with_mismatch(self):
+        """A prefix of the adapter running off the 3' end is trimmed, even with
+        a mismatch, but a short run of bases is not mistaken for adapter."""
+        partial = ADAPTER[:12]
+        mismatched = partial[:5] + "T" + partial[6:]
+        pair = make_pair([INSERT + partial, INSERT + mismatched, INSERT + "CCCCCC"],
+                         [INSERT] * 3)
+        AdapterTrimmer(minOverlap=10)(pair)
+        self.assertEqual(pair.forward.lengths.tolist(),
+                         [len(INSERT), len(INSERT), len(INSERT) + 6])
+
+    def test_length_filter(self):
+        """Pairs are dropped if either mate is too short"""
+        pair = make_pair([INSERT, INSERT[:10], INSERT],
+                         [INSERT, INSERT, INSERT[:29]])
+        LengthFilter(30)(pair)
+        self.assertEqual(len(pair), 1)
+        self.assertEqual(pair.stats["pairsTooShort"], 2)
+
+class quality_test_case(unittest.TestCase):
+    """Tests that the sliding window quality trimming works correctly"""
+
+    def test_sliding_window(self):
+        """Reads are cut at the first low quality window, keeping the good
+        bases at the start of it. Reads without a bad window are untouched."""
+        pair = make_pair([INSERT] * 3, [INSERT] * 3)
+        quals = ["I" * 30 + "5###" + "I" * 10,
+                 "I" * 40 + "####",
+                 "I" * 44]
+        for i, qual in enumerate(quals):
+            pair.forward.qual[i, :len(qual)] = list(qual.encode())
+        QualityTrimmer(windowSize=4, windowQual=20)(pair)
+        self.assertEqual(pair.forward.lengths.tolist(), [31, 40, 44])
+        self.assertEqual(pair.stats["forwardQualityTrimmed"], 2)
+        self.assertEqual(pair.stats["reverseQualityTrimmed"], 0)
+
+    def test_after_adapter(self):
+        """Quality trimming only looks at the bases left by adapter trimming"""
+        pair = make_pair([INSERT + ADAPTER + "TTTT"], [INSERT])
+        pair.forward.qual[0, -4:] = ord("#")
+        AdapterTrimmer()(pair)
+        QualityTrimmer(windowSize=4, windowQual=20)(pair)
+        self.assertEqual(pair.forward.lengths.tolist(), [len(INSERT)])
+        self.assertEqual(pair.stats["forwardQualityTrimmed"], 0)
+
+class binning_test_case(unittest.TestCase):
+    """Tests the Illumina 8-level quality binning"""
+
+    def test_bins(self):
+        """Every quality is replaced by its bin and low qualities are kept"""
+        pair = make_pair(["ACGTACGTA"], ["ACGTACGTA"])
+        pair.forward.qual[0] = [ord(x) for x in "!#+5:>CHI"]
+        QualityBinner()(pair)
+        self.assertEqual(pair.forward.qual[0].tobytes(), b"!'07<<BFI")
+        self.assertEqual(pair.reverse.qual[0].tobytes(), b"IIIIIIIII")
+
+    def test_smaller_output(self):
+        """Binned reads compress to fewer bytes"""
+        readPath = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test/reads/")
+        outDir = tempfile.mkdtemp()
+        sizes = []
+        for stages in [[], [QualityBinner()]]:
+            outputs = [os.path.join(outDir, "out{}_{}.fastq.gz".format(len(stages), x))
+                       for x in [1, 2]]
+            ReadPipeline(stages).run(os.path.join(readPath, "SRR353630_2500_1.fastq.gz"),
+                                     os.path.join(readPath, "SRR353630_2500_2.fastq.gz"),
+                                     *outputs)
+            sizes.append(os.path.getsize(outputs[0]))
+        shutil.rmtree(outDir)
+        self.assertTrue(sizes[1] < 0.9 * sizes[0])
+
+class trimmer_test_case(unittest.TestCase):
+    """Tests that Trimmer writes Seqprep-style output files"""
+    def setUp(self):
+        self.readPath = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test/reads/")
+        self.forwardPath = os.path.join(self.readPath, "SRR353630_2500_1.fastq.gz")
+        self.reversePath = os.path.join(self.readPath, "SRR353630_2500_2.fastq.gz")
+        self.outDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def test_trim_phix(self):
+        """Trimming is the same with one or several processes, both output
+        files have the same number of reads, and the log is written."""
+        outputs = []
+        for procs in [1, 3]:
+            trim = Trimmer(forwardPath    = self.forwardPath,
+                           reversePath    = self.reversePath,
+                           forwardOutFile = "out_forward{}.fastq.gz".format(procs),
+                           reverseOutFile = "out_reverse{}.fastq.gz".format(procs),
+                           outDir         = self.outDir,
+                           procs          = procs,
+                           batchSize      = 300)
+            self.assertEqual(trim.stats["pairsIn"], 2500)
+            self.assertTrue(trim.stats["forwardAdapterTrimmed"] > 0)
+            with gzip.open(trim.forwardOutFile, "rb") as f:
+                forward = f.read()
+            with gzip.open(trim.reverseOutFile, "rb") as f:
+                reverse = f.read()
+            self.assertEqual(forward.count(b"\n"), reverse.count(b"\n"))
+            self.assertEqual(forward.count(b"\n"), 4 * trim.stats["pairsOut"])
+            outputs.append(forward)
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertTrue(os.path.exists(os.path.join(self.outDir, "glotk_trim.log")))
+
+    def test_quality_chained(self):
+        """Quality trimming happens in the same pass as adapter trimming"""
+        trim = Trimmer(forwardPath    = self.forwardPath,
+                       reversePath    = self.reversePath,
+                       forwardOutFile = "out_forward.fastq.gz",
+                       reverseOutFile = "out_reverse.fastq.gz",
+                       outDir         = self.outDir,
+                       windowQual     = 20)
+        self.assertTrue(trim.stats["forwardQualityTrimmed"] > 0)
+        self.assertTrue(trim.stats["forwardAdapterTrimmed"] > 0)
+        with gzip.open(trim.forwardOutFile, "rb") as f:
+            self.assertEqual(f.read().count(b"\n"), 4 * trim.stats["pairsOut"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for scheduler.py
+"""
+
+import unittest
+from gloTK.scheduler import Job, ResourceScheduler
+
+import threading
+
+class scheduler_test_case(unittest.TestCase):
+    """Tests that jobs are started as soon as there are resources for them"""
+
+    def test_backfill(self):
+        """A short job finishing lets the next job start while a long job is
+        still running"""
+        longDone = threading.Event()
+        started = []
+        def long_job(procs):
+            started.append("long")
+            #the long job only finishes once the last job has started
+            self.assertTrue(longDone.wait(10))
+        def short_job(name):
+            def run(procs):
+                started.append(name)
+                if name == "last":
+                    longDone.set()
+                return procs
+            return run
+        scheduler = ResourceScheduler(4, maxJobs=2)
+        scheduler.run([Job("long", long_job), Job("short", short_job("short")),
+                       Job("last", short_job("last"))])
+        self.assertEqual(started, ["long", "short", "last"])
+        self.assertEqual(scheduler.launched, [("long", 2), ("short", 2), ("last", 2)])
+        self.assertEqual(scheduler.freeProcs, 4)
+
+    def test_memory(self):
+        """A job that doesn't fit in memory waits, a smaller job behind it
+        starts first, and waiting jobs don't hold on to processors"""
+        bigDone = threading.Event()
+        def big_job(procs):
+            self.assertTrue(bigDone.wait(10))
+        def small_job(procs):
+            bigDone.set()
+        scheduler = ResourceScheduler(8, maxMem=10)
+        scheduler.run([Job("big1", big_job, mem=6), Job("big2", big_job, mem=6),
+                       Job("small", small_job, mem=2)])
+        self.assertEqual([x[0] for x in scheduler.launched], ["big1", "small", "big2"])
+        self.assertEqual(scheduler.launched[0][1], 4)
+        self.assertEqual(scheduler.usedMem, 0)
+
+    def test_fewer_jobs_more_procs(self):
+        """When there are fewer jobs than slots they share all of the
+        processors, and no job gets more than its maximum"""
+        scheduler = ResourceScheduler(8, maxJobs=4)
+        results = scheduler.run([Job(x, lambda procs: procs) for x in "abc"])
+        self.assertEqual(sum(results.values()), 8)
+        self.assertEqual(sorted(results.values()), [2, 3, 3])
+        scheduler = ResourceScheduler(200, maxJobs=2)
+        results = scheduler.run([Job(x, lambda procs: procs) for x in "ab"])
+        self.assertEqual(list(results.values()), [50, 50])
+
+    def test_errors(self):
+        """A failed job is recorded and the other jobs still run. Jobs that can
+        never fit are run by themselves."""
+        def fail(procs):
+            raise RuntimeError("failed")
+        scheduler = ResourceScheduler(2, maxMem=1)
+        results = scheduler.run([Job("fail", fail), Job("huge", lambda procs: procs, mem=5)])
+        self.assertIn("fail", scheduler.errors)
+        self.assertEqual(results, {"huge": 2})
+
+    def test_after(self):
+        """A job waits for the jobs it runs after even when there are free
+        processors, and jobs waiting on each other are an error"""
+        order = []
+        def job(name):
+            def run(procs):
+                order.append(name)
+            return run
+        scheduler = ResourceScheduler(8, maxJobs=4)
+        scheduler.run([Job("follower", job("follower"), after=["leader"]),
+                       Job("leader", job("leader")),
+                       Job("other", job("other"), after=["missing"])])
+        self.assertEqual(order[-1], "follower")
+        scheduler = ResourceScheduler(8)
+        with self.assertRaises(ValueError):
+            scheduler.run([Job("a", job("a"), after=["b"]),
+                           Job("b", job("b"), after=["a"])])
+
+if __name__ == '__main__':
+    unittest.main()
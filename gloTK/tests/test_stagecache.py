@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for stagecache.py
+"""
+
+import unittest
+from gloTK.stagecache import StageCache, stage_keys
+
+import os
+import shutil
+import tempfile
+import threading
+
+def make_params(**kwargs):
+    """makes the params of a config with one library"""
+    lib_seq = {"name": "lib1", "avgReadLn": 100, "hasInnieArtifact": 0,
+               "isRevComped": 0, "useForContiging": 1, "5p_wiggleRoom": 0,
+               "3p_wiggleRoom": 0, "insertAvg": 300, "insertSdev": 30,
+               "pairs": [["/reads/lib1_1.fastq.gz", "/reads/lib1_2.fastq.gz"]]}
+    params = {"lib_seq": [lib_seq], "mer_size": 31, "min_depth_cutoff": 0,
+              "num_prefix_blocks": 4, "diploid_mode": 0,
+              "bubble_depth_threshold": 0}
+    params.update(kwargs)
+    return params
+
+FINGERPRINTS = {"/reads/lib1_1.fastq.gz": "aaaa",
+                "/reads/lib1_2.fastq.gz": "bbbb"}
+
+class stage_keys_test_case(unittest.TestCase):
+    """Tests that runs share the keys of the stages they have in common"""
+
+    def test_shared_keys(self):
+        """diploid_mode, bubble_depth_threshold and the insert sizes don't
+        change the keys, but mer_size changes them from mercount on and
+        different reads change all of them"""
+        keys = stage_keys(make_params(), FINGERPRINTS)
+        self.assertEqual(keys, stage_keys(make_params(diploid_mode=1,
+                                                      bubble_depth_threshold=5),
+                                          FINGERPRINTS))
+        otherMer = stage_keys(make_params(mer_size=41), FINGERPRINTS)
+        self.assertEqual(keys[0], otherMer[0])
+        self.assertTrue(all(a != b for a, b in zip(keys[1:], otherMer[1:])))
+        otherReads = stage_keys(make_params(), dict(FINGERPRINTS, **{
+            "/reads/lib1_2.fastq.gz": "cccc"}))
+        self.assertTrue(all(a != b for a, b in zip(keys, otherReads)))
+
+class stage_cache_test_case(unittest.TestCase):
+    """Tests storing stage directories and restoring them into new runs"""
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+        self.cache = StageCache(os.path.join(self.outDir, "gloTK_cache"))
+        self.keys = stage_keys(make_params(), FINGERPRINTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def make_run(self, name, numStages, cleaned=False):
+        """makes an assembly directory where the first numStages stages
+        finished"""
+        runDir = os.path.join(self.outDir, name)
+        os.makedirs(os.path.join(runDir, "checkpoints"))
+        for stage, key in self.keys[:numStages]:
+            os.makedirs(os.path.join(runDir, stage))
+            with open(os.path.join(runDir, stage, "output.txt"), "w") as f:
+                print(stage, file=f)
+            if cleaned:
+                open(os.path.join(runDir, stage, "CLEANED-UP"), "w").close()
+            open(os.path.join(runDir, "checkpoints", stage + ".ckpt"), "w").close()
+            with open(os.path.join(runDir, "checkpoints", stage + ".local.params"), "w") as f:
+                print("local_num_procs\t8", file=f)
+        return runDir
+
+    def test_roundtrip(self):
+        """The finished stages are stored and restored with their
+        checkpoints, and the restored runs use their own processors"""
+        runDir = self.make_run("run1", 3)
+        stored = self.cache.store(self.keys, runDir)
+        self.assertEqual(stored, [x[0] for x in self.keys[:3]])
+        self.assertEqual(self.cache.store(self.keys, runDir), [])
+        newDir = os.path.join(self.outDir, "run2")
+        restored = self.cache.restore(self.keys, newDir, procs=2)
+        self.assertEqual(restored, stored)
+        for stage in stored:
+            with open(os.path.join(newDir, stage, "output.txt")) as f:
+                self.assertEqual(f.read().strip(), stage)
+            self.assertTrue(os.path.exists(os.path.join(newDir, "checkpoints",
+                                                        stage + ".ckpt")))
+            with open(os.path.join(newDir, "checkpoints", stage + ".local.params")) as f:
+                self.assertEqual(f.read().split(), ["local_num_procs", "2"])
+        #the params in the cache weren't changed by the restore
+        with open(os.path.join(self.cache.entry(*self.keys[0]), "checkpoints",
+                               self.keys[0][0] + ".local.params")) as f:
+            self.assertEqual(f.read().split(), ["local_num_procs", "8"])
+        otherKeys = stage_keys(make_params(mer_size=41), FINGERPRINTS)
+        self.assertEqual(self.cache.restore(otherKeys, os.path.join(self.outDir, "run3")),
+                         [self.keys[0][0]])
+
+    def test_cleaned(self):
+        """Stages that Meraculous cleaned up are not cached"""
+        runDir = self.make_run("run1", 5, cleaned=True)
+        self.assertEqual(self.cache.store(self.keys, runDir), [])
+        self.assertEqual(self.cache.restore(self.keys, os.path.join(self.outDir, "run2")), [])
+        self.assertFalse(os.path.exists(os.path.join(self.outDir, "run2")))
+
+    def test_threaded_store(self):
+        """Runs in threads of one process can store the same stages at once.
+        Each stage is stored by one of them and no temporary copies are left
+        behind."""
+        runDirs = [self.make_run("run{}".format(i), 5) for i in range(8)]
+        barrier = threading.Barrier(len(runDirs))
+        stored = []
+        errors = []
+        def store(runDir):
+            barrier.wait()
+            try:
+                stored.extend(self.cache.store(self.keys, runDir))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=store, args=(x,)) for x in runDirs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(stored), sorted(x[0] for x in self.keys))
+        for stage, key in self.keys:
+            self.assertEqual(os.listdir(os.path.dirname(self.cache.entry(stage, key))),
+                             [key])
+
+if __name__ == '__main__':
+    unittest.main()
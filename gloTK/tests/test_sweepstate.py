@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for sweepstate.py
+"""
+
+import unittest
+from gloTK.sweepstate import STAGES, SweepState, finished_stages
+
+import os
+import shutil
+import tempfile
+
+class sweep_state_test_case(unittest.TestCase):
+    """Tests sorting the runs of a restarted sweep"""
+    def setUp(self):
+        self.testDir = os.path.join(os.path.abspath(os.path.dirname(__file__)),"meraculousTestRun")
+        self.outDir = tempfile.mkdtemp()
+        self.statePath = os.path.join(self.outDir, "sweep_state.yaml")
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def make_run(self, name, stages):
+        """makes an assembly directory with checkpoints for `stages`"""
+        checkpoints = os.path.join(self.outDir, name, "checkpoints")
+        os.makedirs(checkpoints)
+        for stage in stages:
+            open(os.path.join(checkpoints, stage + ".ckpt"), "w").close()
+        return os.path.join(self.outDir, name)
+
+    def test_finished_stages(self):
+        """The checkpoints of a finished Meraculous run are all found"""
+        self.assertEqual(finished_stages(self.testDir), STAGES)
+
+    def test_sort(self):
+        """Finished runs are skipped, started runs are resumed, and runs
+        without a directory are untouched. A run only counts as finished if
+        the state file says so, and runs that were stopped early are not
+        resumed."""
+        runs = {"done": self.make_run("done", STAGES),
+                "unrecorded": self.make_run("unrecorded", STAGES),
+                "killed": self.make_run("killed", STAGES[:3]),
+                "new": os.path.join(self.outDir, "new"),
+                "stopped": self.make_run("stopped", STAGES[:5])}
+        state = SweepState(self.statePath)
+        state.date = "20160811"
+        state.mark("done", "complete", returncode=0)
+        state.mark("killed", "running")
+        state.mark("stopped", "stopped")
+        state = SweepState(self.statePath)
+        self.assertEqual(state.date, "20160811")
+        self.assertEqual(state.runs["killed"]["status"], "running")
+        complete, partial, untouched = state.sort(runs)
+        self.assertEqual(complete, ["done", "stopped"])
+        self.assertEqual(partial, ["unrecorded", "killed"])
+        self.assertEqual(untouched, ["new"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -32,6 +32,8 @@ import gzip
 import os
 import shutil
 import subprocess
+import tempfile
+import threading
 
 class utils_test_case(unittest.TestCase):
     """Tests that the functions in utils work correctly"""
@@ -65,17 +67,106 @@ class utils_test_case(unittest.TestCase):
     def test_is_gloTK(self):
         """Tests that gloTK.utils.dir_is_glotk() works by first verifying in the
         negative case, then the positive case. This method cleans up the
-        directories it creates."""
+        directories it creates. The directory that is checked doesn't have
+        to be the current directory."""
         testcwd = os.path.dirname(os.path.abspath(__file__))
-        os.chdir(testcwd)
         testgloTK = os.path.join(testcwd, "gloTK_assemblies")
         if os.path.isdir(testgloTK):
             shutil.rmtree(testgloTK)
         self.assertEqual(False, gloTK.utils.dir_is_glotk(testcwd))
         gloTK.utils.safe_mkdir(testgloTK)
         #IMPORTANT - do not chage testgloTK in shutil.rmtree to another dir
-        self.assertEqual(True, gloTK.utils.dir_is_glotk(testgloTK))
+        self.assertEqual(True, gloTK.utils.dir_is_glotk(testcwd))
+        self.assertEqual(False, gloTK.utils.dir_is_glotk(testgloTK))
         shutil.rmtree(testgloTK)
 
+class prefetch_test_case(unittest.TestCase):
+    """Tests that the prefetch reader thread stops with its consumer"""
+    def reader(self, closed):
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            closed.set()
+
+    def test_stop_early(self):
+        """Closing the consumer or raising in it stops and closes the reader"""
+        closed = threading.Event()
+        items = gloTK.utils.prefetch(self.reader(closed))
+        self.assertEqual(next(items), 0)
+        items.close()
+        self.assertTrue(closed.wait(5))
+        closed = threading.Event()
+        with self.assertRaises(KeyError):
+            for item in gloTK.utils.prefetch(self.reader(closed)):
+                raise KeyError(item)
+        self.assertTrue(closed.wait(5))
+        #a consumer that reads everything still gets every item
+        self.assertEqual(list(gloTK.utils.prefetch(range(10))), list(range(10)))
+
+class rusage_test_case(unittest.TestCase):
+    """Tests running commands and keeping their resource usage"""
+
+    def test_call_with_rusage(self):
+        """The output, exit status and peak memory of the process tree are
+        returned"""
+        cmd = """python -c "x = bytearray(100 * 1024**2); import time; time.sleep(0.5)" """
+        p, rusage, peakRss = gloTK.utils.call_with_rusage(cmd, interval=0.1, shell=True)
+        self.assertEqual(p.returncode, 0)
+        self.assertTrue(peakRss > 100 * 1024**2)
+        self.assertTrue(rusage.ru_utime >= 0)
+        p, rusage, peakRss = gloTK.utils.call_with_rusage(["sh", "-c", "echo out; echo err >&2; exit 3"])
+        self.assertEqual((p.returncode, p.stdout, p.stderr), (3, "out\n", "err\n"))
+
+    def test_streamed_logs(self):
+        """The output can be streamed to rotating logs instead of memory, and
+        the end of a log can be read back"""
+        outDir = tempfile.mkdtemp()
+        logs = (os.path.join(outDir, "run.stdout.log"),
+                os.path.join(outDir, "run.stderr.log"))
+        cmd = "for i in $(seq 1 1000); do echo line$i; done; echo err >&2"
+        p, rusage, peakRss = gloTK.utils.call_with_rusage(cmd, shell=True, logs=logs)
+        self.assertEqual((p.returncode, p.stdout, p.stderr), (0, None, None))
+        self.assertEqual(gloTK.utils.tail_lines(logs[0], 2), ["line999", "line1000"])
+        self.assertEqual(gloTK.utils.tail_lines(logs[1]), ["err"])
+        #a small log rotates and keeps a bounded number of old parts
+        log = gloTK.utils.RotatingLog(os.path.join(outDir, "small.log"),
+                                      maxBytes=100, backups=2)
+        for i in range(100):
+            log.write("line{}\n".format(i))
+        log.close()
+        self.assertEqual(sorted(os.listdir(outDir)),
+                         ["run.stderr.log", "run.stdout.log", "small.log",
+                          "small.log.1", "small.log.2"])
+        self.assertTrue(all(os.path.getsize(os.path.join(outDir, x)) <= 100
+                            for x in os.listdir(outDir) if x.startswith("small")))
+        self.assertEqual(gloTK.utils.tail_lines(os.path.join(outDir, "small.log"), 1),
+                         ["line99"])
+        shutil.rmtree(outDir)
+
+    def test_undecodable_output(self):
+        """Output that isn't UTF-8 is still drained, so a command that writes
+        a bad byte and then fills the pipe doesn't hang"""
+        outDir = tempfile.mkdtemp()
+        logs = (os.path.join(outDir, "run.stdout.log"),
+                os.path.join(outDir, "run.stderr.log"))
+        cmd = "printf '\\377\\n'; head -c 2000000 /dev/zero | tr '\\0' a; printf '\\376' >&2"
+        result = []
+        thread = threading.Thread(target=lambda: result.append(
+            gloTK.utils.call_with_rusage(cmd, shell=True, logs=logs)))
+        thread.daemon = True
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(result[0][0].returncode, 0)
+        with open(logs[0], "rb") as f:
+            self.assertEqual(f.read(2), b"\xff\n")
+        self.assertEqual(os.path.getsize(logs[0]), 2000002)
+        #kept output replaces the bad bytes
+        p, rusage, peakRss = gloTK.utils.call_with_rusage(cmd, shell=True)
+        self.assertEqual(p.stdout[:2], "\ufffd\n")
+        self.assertEqual(p.stderr, "\ufffd")
+        shutil.rmtree(outDir)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""@author Darrin Schultz
+This class tests the classes and methods for verify.py
+"""
+
+import unittest
+from gloTK import ConfigParse
+from gloTK.verify import verify_file, verify_reads
+
+import gzip
+import os
+import shutil
+import tempfile
+
+class verify_test_case(unittest.TestCase):
+    """Tests that broken read files are found"""
+    def setUp(self):
+        self.testDir = os.path.join(os.path.abspath(os.path.dirname(__file__)),"phix174Test")
+        self.forwardPath = os.path.join(self.testDir, "reads/SRR353630_2500_1.fastq.gz")
+        self.outDir = tempfile.mkdtemp()
+        with open(self.forwardPath, "rb") as f:
+            self.compressed = f.read()
+        with gzip.open(self.forwardPath, "rb") as f:
+            self.fastq = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def write(self, name, data):
+        path = os.path.join(self.outDir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_good_files(self):
+        """Intact files pass, including multi-member gzip and plain fastq"""
+        self.assertEqual(verify_file(self.forwardPath), (self.forwardPath, 2500, None))
+        doubled = self.write("doubled.fastq.gz", self.compressed + gzip.compress(self.fastq))
+        self.assertEqual(verify_file(doubled)[1:], (5000, None))
+        plain = self.write("plain.fastq", self.fastq)
+        self.assertEqual(verify_file(plain)[1:], (2500, None))
+
+    def test_gzip_errors(self):
+        """Truncated and corrupted gzip files are found"""
+        truncated = self.write("truncated.fastq.gz", self.compressed[:-100])
+        self.assertTrue("truncated" in verify_file(truncated)[2])
+        corrupt = bytearray(self.compressed)
+        corrupt[-6] ^= 0xFF
+        corrupt = self.write("corrupt.fastq.gz", bytes(corrupt))
+        self.assertTrue("corrupt" in verify_file(corrupt)[2])
+
+    def test_fastq_errors(self):
+        """Bad fastq structure is found with its line number"""
+        lines = self.fastq.split(b"\n")
+        lines[402] = b"-"
+        error = verify_file(self.write("plus.fastq", b"\n".join(lines)))[2]
+        self.assertTrue("line 403" in error)
+        lines = self.fastq.split(b"\n")
+        lines[7] = lines[7][:-1]
+        error = verify_file(self.write("qual.fastq", b"\n".join(lines)))[2]
+        self.assertTrue("lines 6 and" in error)
+        lines = self.fastq.split(b"\n")
+        error = verify_file(self.write("short.fastq", b"\n".join(lines[:-3])))[2]
+        self.assertTrue("middle of a fastq record" in error)
+
+    def test_verify_reads(self):
+        """A config passes when intact and fails when a mate is short"""
+        config = ConfigParse(os.path.join(self.testDir, "phix174.config"))
+        records = verify_reads(config.params["lib_seq"], procs=2)
+        self.assertEqual(set(records.values()), {2500})
+        short = self.write("short.fastq", b"\n".join(self.fastq.split(b"\n")[:400]) + b"\n")
+        config.params["lib_seq"][0]["pairs"] = [(self.forwardPath, short)]
+        with self.assertRaises(ValueError):
+            verify_reads(config.params["lib_seq"], procs=2)
+
+if __name__ == '__main__':
+    unittest.main()
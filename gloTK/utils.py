@@ -27,14 +27,16 @@ This module:
 import inspect
 import gzip
 import os
+import queue
 import subprocess
 import sys
+import threading
 import time
 import warnings
 
 from Bio import SeqIO
 from Bio.SeqUtils import GC
-from collections import Counter
+from collections import Counter, deque
 from traceback import print_stack
 
 
@@ -79,13 +81,14 @@ def safe_mkdir(path):
     return os.path.abspath(path)
 
 def dir_is_glotk(path):
-    """check that the current directory is a glotk project folder"""
+    """check that the directory `path` is a glotk project folder"""
     test_set = set(["gloTK_info", "gloTK_assemblies",
                     "gloTK_configs", "gloTK_reads",
                     "gloTK_fastqc", "gloTK_kmer",
                     "gloTK_reports"])
     #http://stackoverflow.com/questions/11968976/
-    files = set([f for f in os.listdir('.') if os.path.isdir(f)])
+    files = set([f for f in os.listdir(path)
+                 if os.path.isdir(os.path.join(path, f))])
     intersection = test_set.intersection(files)
     if len(intersection) > 0:
         return True
@@ -130,6 +133,254 @@ def die(*messages):
     sys.exit(1)
 
 
+def bounded_imap(pool, func, iterable, window):
+    """
+    Like `pool.imap(func, iterable)`, but never has more than `window` items
+    submitted to the pool at once. Pool.imap reads the whole iterable as fast
+    as it can, which for a 50 GB fastq file means reading the whole thing into
+    memory before the workers catch up.
+
+    Results are yielded in the same order as the input.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def prefetch(iterable, size=2):
+    """
+    Yields the items of `iterable`, which is run in a background thread that
+    stays up to `size` items ahead. This lets a slow reader (like a gzip file,
+    since zlib releases the GIL) run at the same time as whatever uses the
+    items. Exceptions in the reader are raised here.
+
+    If the consumer stops early, by an exception or by closing this
+    generator, the reader thread stops too and closes `iterable` if it is a
+    generator, so its files are closed.
+    """
+    items = queue.Queue(size)
+    done = object()
+    stop = threading.Event()
+    def put(entry):
+        """returns False if the consumer is gone"""
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    def reader():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    break
+            else:
+                put((done, None))
+        except BaseException as e:
+            put((done, e))
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def process_tree_rss(pid):
+    """
+    Returns the resident memory in bytes of a process and all of its
+    descendants, read from /proc. Returns 0 where there is no /proc.
+    """
+    parents = {}
+    rss = {}
+    pageSize = os.sysconf("SC_PAGE_SIZE")
+    try:
+        entries = [x for x in os.listdir("/proc") if x.isdigit()]
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            with open(os.path.join("/proc", entry, "stat"), "r") as f:
+                #the command name can have spaces, so split after it
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents[int(entry)] = int(fields[1])
+        rss[int(entry)] = int(fields[21]) * pageSize
+    tree = {pid}
+    grew = True
+    while grew:
+        new = {x for x in parents if parents[x] in tree} - tree
+        tree |= new
+        grew = bool(new)
+    return sum(rss.get(x, 0) for x in tree)
+
+def spawn_wait4(cmd, cwd=None, env=None, shell="/bin/sh"):
+    """
+    Runs `shell -c cmd` in the directory cwd and waits for it with os.wait4.
+    The directory of this process is never changed, so this is safe to call
+    from several threads at once. Returns (status, rusage) like os.wait4.
+    """
+    p = subprocess.Popen([shell, "-c", cmd], cwd=cwd, env=env)
+    waitPid, status, rusage = os.wait4(p.pid, 0)
+    #the process is already reaped, so Popen must not wait for it again
+    p.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    return (status, rusage)
+
+#run logs are rotated when they reach LOG_MAX_BYTES, keeping LOG_BACKUPS old
+# parts, and lines are read from a pipe at most LOG_READ_SIZE bytes at a
+# time, so a chatty program never fills up memory
+LOG_MAX_BYTES = 50 * 1024**2
+LOG_BACKUPS = 4
+LOG_READ_SIZE = 64 * 1024
+
+class RotatingLog:
+    """
+    This class is an append-only log that rotates like
+    logging.handlers.RotatingFileHandler. `path` always holds the newest
+    output and the older parts are path.1 (newest) to path.<backups>. Lines
+    are written out as soon as they arrive, so `tail -F path` follows the log
+    across rotations. write() takes bytes, which are logged as they are, or
+    text, which is logged as UTF-8.
+    """
+    def __init__(self, path, maxBytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.backups = backups
+        self.handle = open(path, "ab", buffering=0)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        if self.maxBytes and self.handle.tell() + len(data) > self.maxBytes and \
+           self.handle.tell() > 0:
+            self.rotate()
+        self.handle.write(data)
+
+    def rotate(self):
+        """moves path to path.1, path.1 to path.2 and so on, and starts an
+        empty path"""
+        self.handle.close()
+        for i in range(self.backups - 1, 0, -1):
+            older = "{}.{}".format(self.path, i)
+            if os.path.exists(older):
+                os.replace(older, "{}.{}".format(self.path, i + 1))
+        if self.backups:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self.handle = open(self.path, "ab", buffering=0)
+
+    def close(self):
+        self.handle.close()
+
+def tail_lines(path, numLines=20, blockSize=8192):
+    """returns the last numLines lines of a file without reading all of it"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b""
+        while end > 0 and data.count(b"\n") <= numLines:
+            start = max(0, end - blockSize)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    return [x.decode(errors="replace") for x in data.splitlines()[-numLines:]]
+
+def call_with_rusage(args, interval=5, started=None, logs=None, **kwargs):
+    """
+    Runs a command like subprocess.run(args, stdout=PIPE, stderr=PIPE,
+    universal_newlines=True, **kwargs), but waits for it with os.wait4 so the
+    resource usage of the command and its children is kept.
+
+    The memory of the whole process tree is also sampled every `interval`
+    seconds, since programs like Meraculous run several processes at once and
+    ru_maxrss only has the largest single process.
+
+    If `started` is given it is called with the Popen object as soon as the
+    command starts, so that another thread can kill it.
+
+    If `logs` is a (stdoutPath, stderrPath) tuple, the output is streamed to
+    those files as RotatingLogs while the command runs instead of being kept
+    in memory, and the stdout and stderr of completedProcess are None.
+
+    The pipes are read as bytes, since a program can write anything. Kept
+    output is decoded with undecodable bytes replaced, and logged output is
+    written as it came.
+
+    Returns (completedProcess, rusage, peakRss), where peakRss is in bytes.
+    """
+    p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         **kwargs)
+    if started:
+        started(p)
+    outputs = {}
+    logPaths = dict(zip(["stdout", "stderr"], logs)) if logs else {}
+    def drain(name, handle):
+        #the pipe has to be read to the end no matter what, or the command
+        # blocks on a full pipe and never exits
+        log = None
+        chunks = []
+        try:
+            if name in logPaths:
+                log = RotatingLog(logPaths[name])
+        except OSError as e:
+            print("WARNING: could not open {}: {}".format(logPaths[name], e),
+                  file=sys.stderr)
+        for line in iter(lambda: handle.readline(LOG_READ_SIZE), b""):
+            if name not in logPaths:
+                chunks.append(line)
+                continue
+            try:
+                if log:
+                    log.write(line)
+            except Exception as e:
+                print("WARNING: stopped writing {}: {}".format(logPaths[name], e),
+                      file=sys.stderr)
+                log = None
+        if log:
+            log.close()
+        if name not in logPaths:
+            outputs[name] = b"".join(chunks).decode(errors="replace")
+        handle.close()
+    drains = [threading.Thread(target=drain, args=(x, getattr(p, x)), daemon=True)
+              for x in ["stdout", "stderr"]]
+    for thread in drains:
+        thread.start()
+    peak = [0]
+    finished = threading.Event()
+    def monitor():
+        while not finished.wait(interval):
+            peak[0] = max(peak[0], process_tree_rss(p.pid))
+    monitorThread = threading.Thread(target=monitor, daemon=True)
+    monitorThread.start()
+    waitPid, status, rusage = os.wait4(p.pid, 0)
+    finished.set()
+    for thread in drains + [monitorThread]:
+        thread.join()
+    #ru_maxrss is in KB on linux but in bytes on macOS
+    maxrss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    p.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    completed = subprocess.CompletedProcess(args, p.returncode,
+                                            outputs.get("stdout"),
+                                            outputs.get("stderr"))
+    return (completed, rusage, max(maxrss, peak[0]))
+
 def fastx_basename(path):
     split = os.path.splitext(os.path.basename(path))
     noZone = [".fastq",".fq",".fasta", ".fa",
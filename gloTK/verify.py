@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# gloTK - Genomes of Luminous Organisms Toolkit
+# Copyright (c) 2015-2016 Darrin Schultz. All rights reserved.
+#
+# This file is part of gloTK.
+#
+# GloTK is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GloTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GloTK.  If not, see <http://www.gnu.org/licenses/>.
+
+"""title: verify.py
+authr: darrin schultz
+
+This module:
+  - checks that every read file behind every LibSeq pair is intact before an
+    assembly is started, instead of finding out at meraculous_import. Each
+    file is checked in its own worker process:
+      - gzip files are decompressed member by member, which checks the CRC
+        and length of every member, and must not end in the middle of one
+      - the fastq records must have four lines, a header starting with '@',
+        a '+' line and a quality string as long as the sequence
+  - checks that the forward and reverse files of every pair have the same
+    number of records
+
+The first problem found stops the check and raises a ValueError saying which
+file is broken and where.
+"""
+
+import itertools
+import zlib
+from multiprocessing import Pool
+
+from gloTK import fastq
+
+class FastqChecker:
+    """This class checks the fastq structure of a stream of decompressed bytes
+    that are fed to it in blocks of any size."""
+    def __init__(self, path):
+        self.path = path
+        self.tail = b""
+        #lines of a record that was split between blocks
+        self.pending = []
+        #the number of lines of complete records that have been checked
+        self.lines = 0
+
+    def feed(self, data):
+        lines = (self.tail + data).split(b"\n")
+        self.tail = lines.pop()
+        self.check(lines)
+
+    def finish(self):
+        """checks the rest of the file and returns the number of records"""
+        if self.tail:
+            self.check([self.tail])
+            self.tail = b""
+        if self.pending:
+            raise ValueError("""ERROR: {} ends in the middle of a fastq record
+            at line {}. Is the file truncated?""".format(
+                self.path, self.lines + len(self.pending)))
+        return self.lines // 4
+
+    def check(self, lines):
+        lines = self.pending + lines
+        records = len(lines) // 4
+        self.pending = lines[4 * records:]
+        full = lines[:4 * records]
+        for offset, start, what in [(0, b"@", "start with '@'"),
+                                    (2, b"+", "be a '+' line")]:
+            group = full[offset::4]
+            if not all(map(bytes.startswith, group, itertools.repeat(start))):
+                bad = next(i for i, x in enumerate(group) if not x.startswith(start))
+                raise ValueError("""ERROR: line {} of {} should {}, but it is:
+                  {}""".format(self.lines + 4 * bad + offset + 1, self.path,
+                               what, group[bad][:80].decode(errors="replace")))
+        seqs = full[1::4]
+        quals = full[3::4]
+        if list(map(len, seqs)) != list(map(len, quals)):
+            bad = next(i for i, (seq, qual) in enumerate(zip(seqs, quals))
+                       if len(seq) != len(qual))
+            raise ValueError("""ERROR: the sequence and quality on lines {} and
+            {} of {} are not the same length""".format(
+                self.lines + 4 * bad + 2, self.lines + 4 * bad + 4, self.path))
+        self.lines += 4 * records
+
+def gzip_blocks(path):
+    """yields the decompressed data of a gzip file in blocks. zlib checks the
+    CRC and length at the end of each member. Raises an error if the file is
+    empty, isn't gzip, or ends in the middle of a member."""
+    decompressor = zlib.decompressobj(31)
+    started = False
+    position = 0
+    with open(path, "rb") as handle:
+        while True:
+            data = handle.read(fastq.BUFFER_SIZE)
+            if not data:
+                break
+            position += len(data)
+            while data:
+                started = True
+                try:
+                    yield decompressor.decompress(data)
+                except zlib.error as e:
+                    raise ValueError("""ERROR: {} is corrupt in the gzip data
+                    before byte {}: {}""".format(path, position, e))
+                if decompressor.eof:
+                    #another member can follow, or zero padding
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(31)
+                    started = False
+                    if not data.strip(b"\x00"):
+                        data = b""
+                else:
+                    data = b""
+    if position == 0:
+        raise ValueError("ERROR: {} is empty".format(path))
+    if started:
+        raise ValueError("""ERROR: {} is truncated. The gzip data ends before
+        the end of the last member.""".format(path))
+
+def _plain_blocks(path):
+    """yields the data of an uncompressed file in blocks"""
+    with open(path, "rb") as handle:
+        while True:
+            data = handle.read(fastq.BUFFER_SIZE)
+            if not data:
+                break
+            yield data
+
+def verify_file(path):
+    """checks one read file. Returns (path, records, error), where error is
+    None if the file is fine."""
+    try:
+        checker = FastqChecker(path)
+        if path.endswith(".gz"):
+            blocks = gzip_blocks(path)
+        else:
+            blocks = _plain_blocks(path)
+        for block in blocks:
+            checker.feed(block)
+        return (path, checker.finish(), None)
+    except (ValueError, OSError) as e:
+        return (path, 0, str(e))
+
+def verify_reads(libSeqs, procs=1):
+    """Checks every file of every pair in a list of LibSeq objects (like
+    ConfigParse.params["lib_seq"]) in a pool of `procs` processes. Raises a
+    ValueError for the first broken file or mismatched pair found.
+
+    Returns a dict of the number of records in each file."""
+    pairs = [tuple(pair) for lib_seq in libSeqs for pair in lib_seq["pairs"]]
+    paths = sorted(set(itertools.chain.from_iterable(pairs)))
+    records = {}
+    with Pool(max(1, min(procs, len(paths)))) as pool:
+        for path, count, error in pool.imap_unordered(verify_file, paths):
+            if error:
+                pool.terminate()
+                raise ValueError(error)
+            records[path] = count
+    for forward, reverse in pairs:
+        if records[forward] != records[reverse]:
+            raise ValueError("""ERROR: the mates of a pair have different
+            numbers of reads:
+              {} has {}
+              {} has {}""".format(forward, records[forward],
+                                  reverse, records[reverse]))
+    return records
@@ -33,7 +33,7 @@ import time
 
 #from itertools import chain
 
-from gloTK import utils
+from gloTK import accounting, utils
 
 
 #started 4:15PM
@@ -76,10 +76,9 @@ class BaseWrapper:
       unless you specify a different code with `self.return_ok`), optionally
       using the CWD specified in `self.cwd` or the environment specified in
       `self.env`.
-    * parse the stderr of the command to find [biolite.profile] markers and
-      use the rusage values from `utils.safe_call` to populate a profile
-      entity in the diagnostics with walltime, usertime, systime, mem, and
-      vmem attributes.
+    * record the wall time, user and system time, peak memory and exit
+      status of the command from os.wait4 to an accounting.UsageStore
+      (`usageStore`, or the default store of the project).
     """
 
     def __init__(self, name, **kwargs):
@@ -89,13 +88,18 @@ class BaseWrapper:
         self.return_ok = kwargs.get('return_ok', 0)
         self.cwd = kwargs.get('cwd', os.getcwd())
         self.stdout = kwargs.get('stdout')
-        self.outdir = kwargs.get('outDir')
+        #absolute, so that it doesn't depend on the directory of the process
+        self.outdir = os.path.abspath(kwargs['outDir']) if kwargs.get('outDir') else None
         self.gzip = kwargs.get('gzip', None)
         print("init")
         self.stdout_append = kwargs.get('stdout_append')
         self.pipe = kwargs.get('pipe')
         self.env = os.environ.copy()
         self.max_concurrency = kwargs.get('max_concurrency', 1)
+        #the resource usage of the command is recorded to usageStore, or to
+        # accounting.default_store() if it isn't given
+        self.procs = kwargs.get('procs', 1)
+        self.usageStore = kwargs.get('usageStore')
 
 
     init = __init__
@@ -152,6 +156,7 @@ class BaseWrapper:
         """
         Call this function at the end of your class's `__init__` function.
         """
+        utils.safe_mkdir(self.outdir)
         stderr = os.path.abspath(os.path.join(self.outdir, self.name + '.log'))
 
         if self.pipe:
@@ -173,21 +178,22 @@ class BaseWrapper:
         log.write(cmd)
 
         start = time.time()
-        save_cwd = os.getcwd()
         try:
-            utils.safe_mkdir(self.outdir)
-            os.chdir(self.outdir)
-            spawn_pid = os.spawnle(os.P_NOWAIT, self.shell, self.shell, '-c', cmd, self.env)
-            wait_pid, retcode, rusage = os.wait4(spawn_pid, 0)
-            if wait_pid != spawn_pid:
-                utils.die("could not wait for process %d: got %d" % (spawn_pid, wait_pid))
-            os.chdir(save_cwd)
+            #the command runs in outdir without changing the directory of
+            # this process, which other threads may be using
+            retcode, rusage = utils.spawn_wait4(cmd, cwd=self.outdir,
+                                                env=self.env, shell=self.shell)
         except OSError as e:
             utils.info(e)
             utils.die("could not run wrapper for command:\n%s" % cmd)
 
         elapsed = time.time() - start
-        retcode = os.WEXITSTATUS(retcode)
+        retcode = os.WEXITSTATUS(retcode) if os.WIFEXITED(retcode) else -os.WTERMSIG(retcode)
+        store = self.usageStore or accounting.default_store()
+        if store:
+            store.record("wrapper", self.name,
+                         accounting.rusage_record(rusage, elapsed, retcode),
+                         procs=self.procs, command=cmd, cwd=self.outdir)
 
         if (self.return_ok is not None) and (self.return_ok != retcode):
             # Give some context to the non-zero return.
@@ -321,3 +327,61 @@ class Seqtk(BaseWrapper):
                      kwargs["inputPath"],
                      kwargs["readCount"]]
         self.run()
+
+
+class Bowtie2Build(BaseWrapper):
+    """
+    A wrapper for bowtie2-build, adapted from the biolite wrapper.
+
+    Required Arguments:
+      referencePath  <fasta file to index>
+      indexPrefix    <path prefix of the index files>
+      outDir         <directory where the log will be saved>
+
+    Optional Arguments:
+      procs          <number of threads; default = 1>
+    """
+    def __init__(self, **kwargs):
+        self.init('bowtie2-build', **kwargs)
+        self.args = ['bowtie2-build',
+                     '--threads', kwargs.get("procs", 1),
+                     self.check_path(kwargs["referencePath"]),
+                     kwargs["indexPrefix"]]
+        self.run()
+
+
+class Bowtie2(BaseWrapper):
+    """
+    A wrapper for the bowtie2 short-read aligner, adapted from the biolite
+    wrapper. Only paired reads are supported. Unaligned pairs and the SAM
+    header are left out of the output since this is mostly used to look at
+    insert sizes.
+
+    Required Arguments:
+      forwardPath    <first read input fastq filepath>
+      reversePath    <second read input fastq filepath>
+      indexPrefix    <path prefix of a bowtie2-build index>
+      samOutFile     <SAM output filename>
+      outDir         <directory where files will be saved>
+
+    Optional Arguments:
+      maxInsert      <the largest insert size of a concordant pair;
+                       default = 2000>
+      orientation    <"--fr" for paired-end libraries, or "--rf" for
+                       reverse complemented (mate pair) libraries;
+                       default = "--fr">
+      procs          <number of threads; default = 1>
+    """
+    def __init__(self, **kwargs):
+        self.init('bowtie2', **kwargs)
+        self.samOutFile = os.path.join(kwargs["outDir"], kwargs["samOutFile"])
+        self.args = ['bowtie2',
+                     '-x', kwargs["indexPrefix"],
+                     '-1', self.check_path(kwargs["forwardPath"]),
+                     '-2', self.check_path(kwargs["reversePath"]),
+                     '-X', kwargs.get("maxInsert", 2000),
+                     kwargs.get("orientation", "--fr"),
+                     '-p', kwargs.get("procs", 1),
+                     '--no-unal', '--no-hd', '--no-mixed', '--no-discordant',
+                     '-S', self.samOutFile]
+        self.run()
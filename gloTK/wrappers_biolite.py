@@ -217,14 +217,11 @@ class BaseWrapper:
 		diagnostics.log('command', cmd)
 
 		start = time.time()
-		save_cwd = os.getcwd()
 		try:
-			os.chdir(self.cwd)
-			spawn_pid = os.spawnle(os.P_NOWAIT, self.shell, self.shell, '-c', cmd, self.env)
-			wait_pid, retcode, rusage = os.wait4(spawn_pid, 0)
-			if wait_pid != spawn_pid:
-				utils.die("could not wait for process %d: got %d" % (spawn_pid, wait_pid))
-			os.chdir(save_cwd)
+			#run in self.cwd without changing the directory of this process
+			p = subprocess.Popen([self.shell, '-c', cmd], cwd=self.cwd, env=self.env)
+			wait_pid, retcode, rusage = os.wait4(p.pid, 0)
+			p.returncode = os.WEXITSTATUS(retcode)
 		except OSError as e:
 			utils.info(e)
 			utils.die("could not run wrapper for command:\n%s" % cmd)
@@ -38,7 +38,9 @@ setup(name='gloTK',
           #MerRunAnalyzer
           "py_gfm",
           "pymdown-extensions",
-          "markdown"
+          "markdown",
+          #read processing stages
+          "numpy"
       ],
       test_suite='nose.collector',
       tests_require=['nose'],